@@ -0,0 +1,72 @@
+"""Synthetic Toodledo accounts"""
+
+import calendar
+import datetime
+import random
+
+# Maximum number of tasks in a Toodledo account (error 603)
+MAX_TASKS = 20000
+
+_TAGS = ("home", "work", "errands", "calls", "waiting", "someday", "urgent",
+         "reading", "health", "finance")
+_REPEATS = ("FREQ=DAILY", "FREQ=WEEKLY", "FREQ=MONTHLY",
+            "FREQ=WEEKLY;INTERVAL=2", "FREQ=YEARLY")
+_WORDS = ("call", "email", "review", "draft", "plan", "buy", "fix", "book",
+          "renew", "schedule", "the", "quarterly", "report", "dentist",
+          "groceries", "invoice", "meeting", "notes", "car", "insurance")
+
+
+def _Noon(date):
+    return calendar.timegm(date.timetuple()) + 43200
+
+
+def SyntheticTasks(count, seed=0, folders=(), contexts=()):
+    """Generate `count` plausible tasks, as dicts in the form sent to the API.
+
+    Required arguments:
+    count -- number of tasks to generate
+
+    Keyword arguments:
+    seed -- random seed, so that runs are comparable (default: 0)
+    folders -- ids of folders to file the tasks in (default: none)
+    contexts -- ids of contexts to assign to the tasks (default: none)
+    """
+    rng = random.Random(seed)
+    today = datetime.date.today()
+    for i in range(count):
+        task = {
+            "title": f"{i} " + " ".join(
+                rng.choices(_WORDS, k=rng.randint(2, 6))),
+            "tag": ", ".join(sorted(rng.sample(_TAGS, rng.randint(0, 3)))),
+            "priority": rng.randint(-1, 3),
+            "star": int(rng.random() < 0.1),
+            "status": rng.randint(0, 10),
+            "length": rng.choice((0, 0, 15, 30, 60, 120)),
+            "duedatemod": rng.randint(0, 3),
+        }
+        if folders and rng.random() < 0.8:
+            task["folder"] = rng.choice(folders)
+        if contexts and rng.random() < 0.5:
+            task["context"] = rng.choice(contexts)
+        if rng.random() < 0.6:
+            due = today + datetime.timedelta(days=rng.randint(-60, 90))
+            task["duedate"] = _Noon(due)
+            if rng.random() < 0.3:
+                task["startdate"] = _Noon(
+                    due - datetime.timedelta(days=rng.randint(0, 14)))
+        if rng.random() < 0.15:
+            task["repeat"] = rng.choice(_REPEATS)
+        if rng.random() < 0.3:
+            task["note"] = " ".join(rng.choices(_WORDS, k=rng.randint(5, 60)))
+        if rng.random() < 0.4:
+            task["completed"] = _Noon(
+                today - datetime.timedelta(days=rng.randint(0, 365)))
+        yield task
+
+
+def PopulateServer(server, count, seed=0):
+    """Fill a FakeToodledoServer with a synthetic account of `count` tasks,
+    with a few folders and contexts"""
+    folders = [server.AddFolder(f"Folder {i}") for i in range(12)]
+    contexts = [server.AddContext(f"Context {i}") for i in range(6)]
+    server.AddTasks(SyntheticTasks(count, seed, folders, contexts))
@@ -0,0 +1,317 @@
+"""Load test of Toodledo and TaskCache with many concurrent clients.
+
+Starts a FakeToodledoServer per account, with the requested latency and
+rate limits, and runs worker threads against each account for a fixed
+time. Each worker has its own Toodledo object and TaskCache, and the
+workers of an account share its token file, as separate processes would.
+With --shared-cache, the workers of an account also share its cache file,
+in shared mode, so only one of them at a time refreshes it.
+Each worker repeatedly picks an operation at random according to the mix:
+
+refresh -- update the worker's task cache
+edit -- edit a batch of tasks through the cache
+fetch -- fetch all the incomplete tasks directly from the API
+
+For example:
+
+    python -m benchmarks.load --accounts 2 --clients 8 --latency 0.02 \
+        --requests-per-token 100 --output load.json
+
+The throughput and latency percentiles of each operation, the number of
+HTTP requests and 429 errors, and the memory used are reported and written
+to a JSON file.
+"""
+
+import argparse
+from collections import Counter, defaultdict
+import logging
+import math
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from toodledo import (
+    FakeToodledoServer,
+    Task,
+    TaskCache,
+    TokenBucketRateLimiter,
+    TokenStorageFile,
+)
+
+from .accounts import PopulateServer
+from .micro import FIELDS
+from .results import Compare, ReadResults, WriteResults
+
+OPERATIONS = ("refresh", "edit", "fetch")
+
+
+def _Percentile(values, fraction):
+    """Nearest-rank percentile of a sorted list"""
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+def _MaxRss():
+    """Peak resident set size of the process in megabytes"""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes and macOS bytes
+    return rss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+class _Account:  # pylint: disable=too-few-public-methods
+    """A fake server populated with a synthetic account and the token file
+    shared by the workers using it"""
+
+    def __init__(self, index, options, directory):
+        self.server = FakeToodledoServer(
+            latency=options.latency, failureRate=options.failure_rate,
+            requestsPerToken=options.requests_per_token).Start()
+        PopulateServer(self.server, options.tasks, seed=index)
+        self.ids = [task["id"] for task in self.server.Tasks()]
+        self.tokenStorage = TokenStorageFile(
+            os.path.join(directory, f"token-{index}.json"))
+        self.tokenStorage.Save(self.server.IssueToken())
+        self.cachePath = os.path.join(directory, f"cache-account-{index}")
+        self.rateLimiter = TokenBucketRateLimiter(options.rate_limit) \
+            if options.rate_limit else None
+
+    def Close(self):
+        self.server.Stop()
+
+
+class _Worker(threading.Thread):
+    def __init__(self, index, account, options, directory):
+        super().__init__(name=f"worker-{index}")
+        self.account = account
+        self.options = options
+        self.deadline = None
+        self.random = random.Random(index)
+        self.latencies = defaultdict(list)
+        self.errors = Counter()
+        self.toodledo = account.server.Client(
+            tokenStorage=account.tokenStorage,
+            rateLimiter=account.rateLimiter,
+            pageConcurrency=options.page_concurrency,
+            writeConcurrency=options.write_concurrency,
+            poolSize=max(options.page_concurrency or 0,
+                         options.write_concurrency or 0) or None)
+        started = time.perf_counter()
+        path = account.cachePath if options.shared_cache else \
+            os.path.join(directory, f"cache-{index}")
+        self.cache = TaskCache(
+            self.toodledo, path, fields=FIELDS, autosave=options.autosave,
+            shared=options.shared_cache)
+        self.latencies["init"].append(time.perf_counter() - started)
+
+    def Refresh(self):
+        self.cache.update()
+
+    def Edit(self):
+        ids = self.random.sample(self.account.ids, self.options.write_size)
+        self.cache.EditTasks(
+            [Task(id_=id_, note=f"{self.name} {self.random.random()}")
+             for id_ in ids])
+
+    def Fetch(self):
+        self.toodledo.GetTasks(comp=0, fields=FIELDS)
+
+    def run(self):
+        operations = {"refresh": self.Refresh, "edit": self.Edit,
+                      "fetch": self.Fetch}
+        names = list(self.options.mix)
+        weights = [self.options.mix[name] for name in names]
+        while time.monotonic() < self.deadline:
+            name = self.random.choices(names, weights)[0]
+            started = time.perf_counter()
+            try:
+                operations[name]()
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                self.errors[f"{name}: {type(e).__name__}"] += 1
+                continue
+            self.latencies[name].append(time.perf_counter() - started)
+
+
+def _ParseMix(mix):
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"unknown operation {name}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def Run(options):  # pylint: disable=too-many-locals
+    """Run the load test described by the parsed command-line options and
+    return the result records"""
+    if options.tracemalloc:
+        tracemalloc.start()
+    rssBefore = _MaxRss()
+    with tempfile.TemporaryDirectory() as directory:
+        accounts = [_Account(i, options, directory)
+                    for i in range(options.accounts)]
+        try:
+            workers = [_Worker(i, accounts[i % len(accounts)], options,
+                               directory)
+                       for i in range(options.clients)]
+            # The clock starts once all the caches have been loaded.
+            initRequests = sum(sum(account.server.requests.values())
+                               for account in accounts)
+            started = time.monotonic()
+            deadline = started + options.duration
+            for worker in workers:
+                worker.deadline = deadline
+                worker.start()
+            for worker in workers:
+                worker.join()
+            elapsed = time.monotonic() - started
+        finally:
+            for account in accounts:
+                account.Close()
+    latencies = defaultdict(list)
+    errors = Counter()
+    refreshes = 0
+    for worker in workers:
+        for name, values in worker.latencies.items():
+            latencies[name].extend(values)
+        errors.update(worker.errors)
+        refreshes += sum(metrics.refreshes for metrics in
+                         worker.toodledo.metrics.Snapshot().values())
+    results = []
+    for name in ("init",) + OPERATIONS:
+        values = sorted(latencies[name])
+        if not values:
+            continue
+        results.append({
+            "benchmark": f"load_{name}",
+            "tasks": options.tasks,
+            "operations": len(values),
+            # Caches are initialized before the clock starts
+            "throughput": None if name == "init" else len(values) / elapsed,
+            "mean": sum(values) / len(values),
+            "p50": _Percentile(values, 0.50),
+            "p90": _Percentile(values, 0.90),
+            "p99": _Percentile(values, 0.99),
+            "max": values[-1],
+        })
+    requests = sum(sum(account.server.requests.values())
+                   for account in accounts) - initRequests
+    summary = {
+        "benchmark": "load_total",
+        "tasks": options.tasks,
+        "operations": sum(len(latencies[name]) for name in OPERATIONS),
+        "throughput": sum(len(latencies[name]) for name in OPERATIONS) /
+        elapsed,
+        "requests": requests,
+        "requests_per_second": requests / elapsed,
+        "token_refreshes": refreshes,
+        "errors": dict(errors),
+        "seconds": elapsed,
+        "peak_rss_mb": _MaxRss(),
+        "rss_growth_mb": _MaxRss() - rssBefore,
+    }
+    if options.tracemalloc:
+        summary["traced_peak_mb"] = \
+            tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+    results.append(summary)
+    return results
+
+
+def _Report(results):
+    for result in results:
+        if result["benchmark"] == "load_total":
+            print(f"total: {result['operations']} operations, "
+                  f"{result['throughput']:.1f}/s; "
+                  f"{result['requests']} requests, "
+                  f"{result['requests_per_second']:.1f}/s; "
+                  f"{result['token_refreshes']} token refreshes after 429 "
+                  f"errors; "
+                  f"peak RSS {result['peak_rss_mb']:.0f} MB")
+            for error, count in sorted(result["errors"].items()):
+                print(f"  {count} errors in {error}")
+            continue
+        throughput = "" if result["throughput"] is None else \
+            f"{result['throughput']:8.1f}/s"
+        print(f"{result['benchmark']:<13} {result['operations']:>6} ops "
+              f"{throughput:>10}  p50 {result['p50'] * 1000:8.1f} ms  "
+              f"p90 {result['p90'] * 1000:8.1f} ms  "
+              f"p99 {result['p99'] * 1000:8.1f} ms")
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__.split("\n", maxsplit=1)[0])
+    parser.add_argument("--accounts", type=int, default=1,
+                        help="number of accounts (default: %(default)s)")
+    parser.add_argument("--clients", type=int, default=4,
+                        help="number of concurrent clients, spread over the "
+                        "accounts (default: %(default)s)")
+    parser.add_argument("--tasks", type=int, default=5000,
+                        help="tasks per account (default: %(default)s)")
+    parser.add_argument("--duration", type=float, default=10,
+                        help="seconds to run for (default: %(default)s)")
+    parser.add_argument("--mix", type=_ParseMix,
+                        default="refresh=6,edit=3,fetch=1",
+                        help="relative frequencies of the operations "
+                        "(default: %(default)s)")
+    parser.add_argument("--write-size", type=int, default=100,
+                        help="tasks per edit (default: %(default)s)")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="server latency per request in seconds "
+                        "(default: %(default)s)")
+    parser.add_argument("--requests-per-token", type=int,
+                        help="requests the server allows per access token "
+                        "(default: unlimited)")
+    parser.add_argument("--failure-rate", type=float, default=0.0,
+                        help="fraction of requests the server fails with "
+                        "429 errors (default: %(default)s)")
+    parser.add_argument("--rate-limit", type=float,
+                        help="requests per second allowed by a client-side "
+                        "rate limiter shared by each account's clients "
+                        "(default: no limit)")
+    parser.add_argument("--page-concurrency", type=int,
+                        help="pageConcurrency of the clients")
+    parser.add_argument("--write-concurrency", type=int,
+                        help="writeConcurrency of the clients")
+    parser.add_argument("--autosave", action="store_true",
+                        help="save the caches to disk after each refresh")
+    parser.add_argument("--shared-cache", action="store_true",
+                        help="have each account's clients share one cache "
+                        "file in shared mode, which is always saved")
+    parser.add_argument("--tracemalloc", action="store_true",
+                        help="also measure peak Python heap usage, which "
+                        "slows everything down")
+    parser.add_argument("--output", default="benchmark-load.json",
+                        help="results file (default: %(default)s)")
+    parser.add_argument("--compare", metavar="BASELINE",
+                        help="results file to check for p99 latency "
+                        "regressions against")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="fraction by which the p99 latency can grow "
+                        "before it's a regression (default: %(default)s)")
+    options = parser.parse_args(args)
+    # 429 errors are expected and counted, so don't log them.
+    logging.basicConfig(level=logging.ERROR)
+
+    results = Run(options)
+    _Report(results)
+    settings = {name: value for name, value in vars(options).items()
+                if name not in ("output", "compare", "threshold")}
+    WriteResults(options.output, "load", results, **settings)
+    if not options.compare:
+        return 0
+    regressions = Compare(ReadResults(options.compare), results,
+                          options.threshold, metric="p99")
+    for name, size, before, after in regressions:
+        print(f"REGRESSION {name} with {size} tasks: p99 "
+              f"{before * 1000:.1f} ms -> {after * 1000:.1f} ms")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
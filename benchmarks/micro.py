@@ -0,0 +1,336 @@
+"""Microbenchmarks of task decoding, the task cache and cache persistence.
+
+Each benchmark runs against a synthetic account of each of the requested
+sizes, served by a FakeToodledoServer, and the results are written to a
+JSON file. For example:
+
+    python -m benchmarks.micro --tasks 1000,20000 --output new.json \
+        --compare old.json
+
+exits with status 1 if any benchmark got more than 25% slower than it was
+in old.json.
+"""
+
+import argparse
+import gc
+import os
+import random
+import sys
+import tempfile
+import time
+
+from toodledo import (
+    FakeToodledoServer,
+    JournaledTaskStore,
+    SqliteTaskStore,
+    Task,
+    TaskCache,
+)
+from toodledo.task import (
+    _DumpTaskList,
+    _LoadLazyTasks,
+    _TASK_CODEC,
+    _TaskSchema,
+)
+from toodledo.task_columns import numpy
+
+from .accounts import MAX_TASKS, PopulateServer
+from .results import Compare, ReadResults, Summary, WriteResults
+
+# Fields cached by the benchmarked task caches; the same as the tests use
+FIELDS = ("folder,context,duedate,duedatemod,length,note,parent,priority,"
+          "repeat,star,startdate,status,tag")
+# Number of tasks changed by the update and edit benchmarks, i.e. one write
+CHANGED = 50
+
+_BENCHMARKS = {}
+
+
+def _Benchmark(name):
+    """Register a benchmark.
+
+    The decorated function is called before each repetition with the
+    _Account to run against, and returns the function to time."""
+    def register(func):
+        _BENCHMARKS[name] = func
+        return func
+    return register
+
+
+class _Account:
+    """A synthetic account served by a fake server, with a task cache of it"""
+
+    def __init__(self, count, directory):
+        self.server = FakeToodledoServer().Start()
+        PopulateServer(self.server, count)
+        self.toodledo = self.server.Client()
+        self.cache = TaskCache(
+            self.toodledo, os.path.join(directory, f"cache-{count}"),
+            autosave=False, fields=FIELDS)
+        # The tasks as the API returns them with all their fields
+        self.raw = self.server.Tasks()
+        schema = _TaskSchema()
+        self.tasks = [schema.load(dict(raw)) for raw in self.raw]
+        self.random = random.Random(count)
+        self.directory = directory
+        self.caches = {}
+
+    def Changes(self):
+        """Return edits of a random selection of the tasks"""
+        ids = self.random.sample([task.id_ for task in self.tasks], CHANGED)
+        return [Task(id_=id_, note=f"changed {self.random.random()}")
+                for id_ in ids]
+
+    def OtherCache(self, name, **kwargs):
+        """Return another task cache of the account, created the first time
+        with extra keyword arguments"""
+        if name not in self.caches:
+            self.caches[name] = TaskCache(
+                self.toodledo,
+                os.path.join(self.directory, f"{name}-{len(self.tasks)}"),
+                autosave=False, fields=FIELDS, **kwargs)
+        return self.caches[name]
+
+    def Close(self):
+        self.server.Stop()
+
+
+@_Benchmark("task_schema_load")
+def _TaskSchemaLoad(account):
+    schema = _TaskSchema()
+    return lambda: [schema.load(raw) for raw in account.raw]
+
+
+@_Benchmark("task_schema_dump")
+def _TaskSchemaDump(account):
+    schema = _TaskSchema()
+    return lambda: [schema.dump(task) for task in account.tasks]
+
+
+@_Benchmark("task_codec_load")
+def _TaskCodecLoad(account):
+    return lambda: _TASK_CODEC.LoadMany(account.raw)
+
+
+@_Benchmark("task_lazy_scan")
+def _TaskLazyScan(account):
+    # Lazy tasks use up their raw data, so each run needs a fresh copy.
+    raw = [dict(task) for task in account.raw]
+    return lambda: [(task.id_, task.title, getattr(task, "dueDate", None))
+                    for task in _LoadLazyTasks(raw)]
+
+
+@_Benchmark("task_codec_dump")
+def _TaskCodecDump(account):
+    return lambda: _TASK_CODEC.DumpMany(account.tasks)
+
+
+@_Benchmark("dump_task_list")
+def _DumpTaskListChunks(account):
+    # In 50-task chunks, as AddTasks and EditTasks do
+    tasks = account.tasks
+    return lambda: [_DumpTaskList(tasks[start:start + 50])
+                    for start in range(0, len(tasks), 50)]
+
+
+@_Benchmark("cache_filter_tasks")
+def _CacheFilterTasks(account):
+    cache = account.cache
+    return lambda: list(
+        cache._filter_tasks({"comp": 0}))  # pylint: disable=protected-access
+
+
+@_Benchmark("cache_get_tasks")
+def _CacheGetTasks(account):
+    account.cache.read_only = False
+    return account.cache.GetTasks
+
+
+@_Benchmark("cache_get_tasks_read_only")
+def _CacheGetTasksReadOnly(account):
+    # With all the cached fields, so that the tasks needn't be copied
+    cache = account.cache
+    cache.read_only = True
+    return lambda: cache.GetTasks(fields=cache.fields)
+
+
+@_Benchmark("cache_get_tasks_fields")
+def _CacheGetTasksFields(account):
+    account.cache.read_only = False
+    return lambda: account.cache.GetTasks(fields="duedate,tag")
+
+
+@_Benchmark("cache_get_task_by_id")
+def _CacheGetTaskById(account):
+    cache = account.cache
+    cache.read_only = True
+    ids = [task.id_ for task in account.tasks[::100]]
+    return lambda: [cache.GetTasks(id_=id_, fields=cache.fields)
+                    for id_ in ids]
+
+
+def _QueryTasks(account, cache):
+    # The tasks modified in the second half of the account's history, with
+    # all the cached fields so that they needn't be copied
+    cache.read_only = True
+    modified = sorted(task.modified for task in account.tasks)
+    after = modified[len(modified) // 2]
+    return lambda: cache.GetTasks(after=after, fields=cache.fields)
+
+
+def _SortedTasks(cache):
+    cache.read_only = True
+    return lambda: cache.GetSortedTasks("dueDate", fields=cache.fields)
+
+
+@_Benchmark("cache_query_tasks")
+def _CacheQueryTasks(account):
+    return _QueryTasks(account, account.cache)
+
+
+@_Benchmark("cache_sorted_tasks")
+def _CacheSortedTasks(account):
+    return _SortedTasks(account.cache)
+
+
+def _Columnar(account):
+    return account.OtherCache("columnar", columnar=True)
+
+
+if numpy is not None:
+    @_Benchmark("cache_query_tasks_columnar")
+    def _CacheQueryTasksColumnar(account):
+        return _QueryTasks(account, _Columnar(account))
+
+    @_Benchmark("cache_sorted_tasks_columnar")
+    def _CacheSortedTasksColumnar(account):
+        return _SortedTasks(_Columnar(account))
+
+    @_Benchmark("cache_update_columnar")
+    def _CacheUpdateColumnar(account):
+        account.toodledo.EditTasks(account.Changes())
+        return _Columnar(account).update
+
+
+@_Benchmark("cache_update")
+def _CacheUpdate(account):
+    account.toodledo.EditTasks(account.Changes())
+    return account.cache.update
+
+
+@_Benchmark("cache_edit_tasks")
+def _CacheEditTasks(account):
+    changes = account.Changes()
+    return lambda: account.cache.EditTasks(changes)
+
+
+@_Benchmark("cache_edit_tasks_journaled")
+def _CacheEditTasksJournaled(account):
+    # Including journaling the edits
+    cache = account.OtherCache("journaled", store=JournaledTaskStore())
+    changes = account.Changes()
+    return lambda: cache.EditTasks(changes)
+
+
+@_Benchmark("cache_save")
+def _CacheSave(account):
+    return account.cache.save
+
+
+@_Benchmark("cache_load")
+def _CacheLoad(account):
+    account.cache.save()
+    return account.cache.load_from_path
+
+
+@_Benchmark("cache_save_sqlite")
+def _CacheSaveSqlite(account):
+    # Saving after an edit only writes the edited tasks
+    cache = account.OtherCache("sqlite", store=SqliteTaskStore())
+    cache.save()
+    cache.EditTasks(account.Changes())
+    return cache.save
+
+
+@_Benchmark("cache_load_sqlite")
+def _CacheLoadSqlite(account):
+    cache = account.OtherCache("sqlite", store=SqliteTaskStore())
+    cache.save()
+    return cache.load_from_path
+
+
+def Run(sizes, repeat, names=None, log=None):
+    """Run the benchmarks and return their result records.
+
+    Required arguments:
+    sizes -- numbers of tasks in the accounts to run the benchmarks against
+    repeat -- number of times to run each benchmark
+
+    Keyword arguments:
+    names -- names of the benchmarks to run (default: all of them)
+    log -- function to call with each result record as it's produced
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            account = _Account(size, directory)
+            try:
+                for name, benchmark in _BENCHMARKS.items():
+                    if names and name not in names:
+                        continue
+                    times = []
+                    for _ in range(repeat):
+                        func = benchmark(account)
+                        gc.collect()
+                        started = time.perf_counter()
+                        func()
+                        times.append(time.perf_counter() - started)
+                    results.append(Summary(name, size, times))
+                    if log:
+                        log(results[-1])
+            finally:
+                account.Close()
+    return results
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__.split("\n", maxsplit=1)[0])
+    parser.add_argument(
+        "--tasks", default=f"1000,5000,{MAX_TASKS}",
+        help="comma-separated account sizes (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="repetitions of each benchmark "
+                        "(default: %(default)s)")
+    parser.add_argument("--benchmark", action="append",
+                        choices=sorted(_BENCHMARKS),
+                        help="benchmark to run (default: all)")
+    parser.add_argument("--output", default="benchmark-micro.json",
+                        help="results file (default: %(default)s)")
+    parser.add_argument("--compare", metavar="BASELINE",
+                        help="results file to check for regressions against")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="fraction by which the minimum time can grow "
+                        "before it's a regression (default: %(default)s)")
+    args = parser.parse_args(args)
+
+    def log(result):
+        print(f"{result['benchmark']:<24} {result['tasks']:>6} tasks  "
+              f"min {result['min'] * 1000:10.2f} ms  "
+              f"median {result['median'] * 1000:10.2f} ms", flush=True)
+
+    sizes = [int(size) for size in args.tasks.split(",")]
+    results = Run(sizes, args.repeat, args.benchmark, log)
+    WriteResults(args.output, "micro", results, tasks=sizes,
+                 repeat=args.repeat)
+    if not args.compare:
+        return 0
+    regressions = Compare(ReadResults(args.compare), results, args.threshold)
+    for name, size, before, after in regressions:
+        print(f"REGRESSION {name} with {size} tasks: "
+              f"{before * 1000:.2f} ms -> {after * 1000:.2f} ms")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
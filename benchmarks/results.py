@@ -0,0 +1,79 @@
+"""Machine-readable benchmark results"""
+
+import datetime
+from importlib import metadata
+import json
+import os
+import platform
+import statistics
+import subprocess
+
+
+def Environment():
+    """Describe what the benchmarks ran on, for the results file"""
+    try:
+        version = metadata.version("toodledo")
+    except metadata.PackageNotFoundError:
+        version = None
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, check=True,
+            text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "version": version,
+        "commit": commit,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "time": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+    }
+
+
+def Summary(name, tasks, times, **extra):
+    """Return the result record for a benchmark that took `times` seconds
+    on each repetition"""
+    return {
+        "benchmark": name,
+        "tasks": tasks,
+        "repeat": len(times),
+        "min": min(times),
+        "median": statistics.median(times),
+        "mean": statistics.fmean(times),
+        "max": max(times),
+        **extra,
+    }
+
+
+def WriteResults(path, suite, results, **settings):
+    """Write the results of a benchmark suite to a JSON file"""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"suite": suite, "environment": Environment(),
+                   "settings": settings, "results": results}, f, indent=2)
+        f.write("\n")
+
+
+def ReadResults(path):
+    """Read a results file written by WriteResults"""
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def Compare(baseline, results, threshold, metric="min"):
+    """Return the results that are more than `threshold` (a fraction) worse
+    than the matching ones in the baseline results file contents.
+
+    Each regression is returned as a (benchmark, tasks, baseline value,
+    value) tuple. Lower values of `metric` are assumed to be better."""
+    before = {(r["benchmark"], r["tasks"]): r[metric]
+              for r in baseline["results"] if metric in r}
+    regressions = []
+    for result in results:
+        key = (result["benchmark"], result["tasks"])
+        if key in before and metric in result and \
+           result[metric] > before[key] * (1 + threshold):
+            regressions.append(key + (before[key], result[metric]))
+    return regressions
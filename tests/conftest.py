@@ -4,7 +4,13 @@ from tempfile import NamedTemporaryFile
 
 from pytest import fixture
 
-from toodledo import TokenStorageFile, Toodledo, TaskCache
+from toodledo import (
+    AsyncToodledo,
+    FakeToodledoServer,
+    TokenStorageFile,
+    Toodledo,
+    TaskCache,
+)
 
 
 class TokenReadOnly:
@@ -24,17 +30,32 @@ class TokenReadOnly:
         return loads(os.environ[self.name])
 
 
-@fixture(scope='session', params=['cached', 'direct'])
-def toodledo(request):
+def _Api(request, cls):
+    """Return an API object for the live API if it's configured, otherwise
+    for the fake server"""
+    if "TOODLEDO_CLIENT_ID" not in os.environ:
+        fake = request.getfixturevalue('fake_server')
+        return (fake.AsyncClient if cls is AsyncToodledo else fake.Client)()
     if "TOODLEDO_TOKEN_STORAGE" in os.environ:
         tokenStorage = TokenStorageFile(os.environ["TOODLEDO_TOKEN_STORAGE"])
     else:
         # for travis
         tokenStorage = TokenReadOnly("TOODLEDO_TOKEN_READONLY")
-    session = Toodledo(clientId=os.environ["TOODLEDO_CLIENT_ID"],
-                       clientSecret=os.environ["TOODLEDO_CLIENT_SECRET"],
-                       tokenStorage=tokenStorage,
-                       scope="basic tasks notes folders write")
+    return cls(clientId=os.environ["TOODLEDO_CLIENT_ID"],
+               clientSecret=os.environ["TOODLEDO_CLIENT_SECRET"],
+               tokenStorage=tokenStorage,
+               scope="basic tasks notes folders write")
+
+
+@fixture(scope='session')
+def fake_server():
+    with FakeToodledoServer() as server:
+        yield server
+
+
+@fixture(scope='session', params=['cached', 'direct'])
+def toodledo(request):
+    session = _Api(request, Toodledo)
     with NamedTemporaryFile() as cache_file:
         if request.param == 'cached':
             os.unlink(cache_file.name)
@@ -48,15 +69,7 @@ def toodledo(request):
 
 @fixture(scope='session', params=[None, 0, 1])
 def cache(request):
-    if "TOODLEDO_TOKEN_STORAGE" in os.environ:
-        tokenStorage = TokenStorageFile(os.environ["TOODLEDO_TOKEN_STORAGE"])
-    else:
-        # for travis
-        tokenStorage = TokenReadOnly("TOODLEDO_TOKEN_READONLY")
-    session = Toodledo(clientId=os.environ["TOODLEDO_CLIENT_ID"],
-                       clientSecret=os.environ["TOODLEDO_CLIENT_SECRET"],
-                       tokenStorage=tokenStorage,
-                       scope="basic tasks notes folders write")
+    session = _Api(request, Toodledo)
     with NamedTemporaryFile() as cache_file:
         os.unlink(cache_file.name)
         session = TaskCache(
@@ -65,3 +78,8 @@ def cache(request):
             'status,tag', comp=request.param)
         session._paranoid = True  # pylint: disable=protected-access
         yield session
+
+
+@fixture
+def async_toodledo(request):
+    return _Api(request, AsyncToodledo)
@@ -0,0 +1,108 @@
+# pylint: disable=protected-access
+import asyncio
+from contextlib import contextmanager
+import threading
+from uuid import uuid4
+
+import aiohttp
+import pytest
+
+from toodledo import FakeToodledoServer, Task
+from toodledo.account import _Account
+from toodledo.async_transport import AsyncToodledoSession
+
+
+def test_async_get_account_and_tasks(async_toodledo):
+    async def run():
+        async with async_toodledo:
+            return await asyncio.gather(async_toodledo.GetAccount(),
+                                        async_toodledo.GetTasks())
+    account, tasks = asyncio.run(run())
+    assert isinstance(account, _Account)
+    assert isinstance(tasks, list)
+
+
+def test_async_add_edit_delete(async_toodledo):
+    async def run():
+        async with async_toodledo:
+            added = await async_toodledo.AddTasks([Task(title=str(uuid4()))])
+            edited = await async_toodledo.EditTasks(
+                [Task(id_=added[0].id_, note="async")])
+            await async_toodledo.DeleteTasks(added)
+            return added, edited
+    added, edited = asyncio.run(run())
+    assert edited[0].id_ == added[0].id_
+
+
+def test_async_refresh_recorded():
+    with FakeToodledoServer(requestsPerToken=1) as server:
+        toodledo = server.AsyncClient(historyCount=10)
+
+        async def run():
+            async with toodledo:
+                await toodledo.GetAccount()
+                await toodledo.GetAccount()
+                # The refresh token has been used up, so this refresh fails
+                toodledo._session.token["refresh_token"] = "stale"
+                with pytest.raises(aiohttp.ClientResponseError):
+                    await toodledo.GetAccount()
+        asyncio.run(run())
+        assert [(record.url.rpartition("/3/")[2], record.status)
+                for record in reversed(toodledo._history)] == [
+            ("account/get.php", 200), ("account/token.php", 200),
+            ("account/get.php", 200), ("account/token.php", 400)]
+        metrics = toodledo.metrics.Snapshot()["account/token.php"]
+        assert metrics.requests == 2
+        assert metrics.errors == 1
+
+
+class _BlockingStorage:
+    """Token storage whose lock is held by the test until it lets go"""
+
+    def __init__(self):
+        self.held = threading.Lock()
+        self.held.acquire()  # pylint: disable=consider-using-with
+        self.entered = threading.Event()
+        self.exited = threading.Event()
+        self.locks = []
+
+    def Load(self):
+        return None
+
+    def Save(self, token):
+        pass
+
+    def Lock(self):
+        # Kept, so that the lock isn't released by garbage collection
+        self.locks.append(self._Lock())
+        return self.locks[-1]
+
+    @contextmanager
+    def _Lock(self):
+        with self.held:
+            self.entered.set()
+            try:
+                yield
+            finally:
+                self.exited.set()
+
+
+def test_async_refresh_cancelled_releases_lock():
+    # Cancelled while waiting for the storage lock, the refresh still
+    # releases the lock once the executor gets it.
+    storage = _BlockingStorage()
+    session = AsyncToodledoSession("id", "secret", {"access_token": "a"},
+                                   storage.Save, tokenStorage=storage)
+
+    async def run():
+        refresh = asyncio.create_task(session.refresh_token())
+        await asyncio.sleep(0.05)
+        refresh.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await refresh
+        storage.held.release()
+        while not storage.exited.is_set():
+            await asyncio.sleep(0.01)
+    asyncio.run(asyncio.wait_for(run(), 5))
+    assert storage.entered.is_set()
+    assert not storage.held.locked()
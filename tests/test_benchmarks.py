@@ -0,0 +1,42 @@
+# pylint: disable=protected-access
+import json
+
+from benchmarks import load, micro
+from benchmarks.results import Compare
+
+
+def test_micro_benchmarks(tmp_path):
+    output = tmp_path / "micro.json"
+    assert micro.main(["--tasks", "60", "--repeat", "1",
+                       "--output", str(output)]) == 0
+    results = json.loads(output.read_text())
+    assert results["suite"] == "micro"
+    assert sorted(r["benchmark"] for r in results["results"]) == \
+        sorted(micro._BENCHMARKS)
+    assert all(r["tasks"] == 60 and r["min"] > 0
+               for r in results["results"])
+
+
+def test_load_harness(tmp_path):
+    output = tmp_path / "load.json"
+    assert load.main(["--tasks", "120", "--clients", "3", "--accounts", "2",
+                      "--duration", "0.5", "--write-size", "60",
+                      "--requests-per-token", "5",
+                      "--output", str(output)]) == 0
+    results = {r["benchmark"]: r
+               for r in json.loads(output.read_text())["results"]}
+    assert results["load_init"]["operations"] == 3
+    total = results["load_total"]
+    assert total["operations"] > 0 and total["errors"] == {}
+    assert total["token_refreshes"] > 0
+    assert all(results[name]["p50"] <= results[name]["p99"]
+               for name in results if name != "load_total")
+
+
+def test_compare():
+    baseline = {"results": [{"benchmark": "a", "tasks": 10, "min": 1.0},
+                            {"benchmark": "b", "tasks": 10, "min": 1.0}]}
+    results = [{"benchmark": "a", "tasks": 10, "min": 1.2},
+               {"benchmark": "b", "tasks": 10, "min": 1.3},
+               {"benchmark": "b", "tasks": 20, "min": 9.0}]
+    assert Compare(baseline, results, 0.25) == [("b", 10, 1.0, 1.3)]
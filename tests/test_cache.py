@@ -1,9 +1,30 @@
 import datetime
+import fcntl
+import pickle
+import threading
 from uuid import uuid4
 
 import pytest
 
-from toodledo import Task
+from benchmarks.accounts import PopulateServer
+from toodledo import (
+    FakeToodledoServer,
+    JournaledTaskStore,
+    Priority,
+    ReadOnlyTask,
+    SqliteTaskStore,
+    Task,
+    TaskCache,
+)
+from toodledo import task_cache, task_columns
+from toodledo.task_columns import _TaskColumns, numpy
+
+
+class _OldTask:  # pylint: disable=too-few-public-methods
+    """A Task as it was before it had slots"""
+
+    def __init__(self, **data):
+        self.__dict__.update(data)
 
 
 def test_cache_reschedule(cache):
@@ -82,3 +103,359 @@ def test_cache_preserve_fields(cache):
     cache.EditTasks([Task(id_=added_task.id_, note="bar")])
     cached_task = cache.GetTasks(id_=added_task.id_, comp=comp)[0]
     assert cached_task.meta == "foo"
+
+
+def test_cache_read_only(tmp_path):
+    with FakeToodledoServer() as server:
+        server.AddTasks({"title": f"task {i}"} for i in range(5))
+        cache = TaskCache(server.Client(), str(tmp_path / "cache"),
+                          read_only=True)
+        tasks = cache.GetTasks(fields="repeat")
+        assert all(isinstance(t, ReadOnlyTask) for t in tasks)
+        assert tasks[0] is cache[0]
+        with pytest.raises(AttributeError):
+            tasks[0].title = "changed"
+        task = tasks[0].Copy()
+        task.title = "changed"
+        cache.EditTasks([task])
+        assert tasks[0].title == "task 0"
+        assert cache.GetTasks(id_=task.id_)[0].title == "changed"
+        # Without read_only the cache hands out copies that can be changed
+        cache = TaskCache(server.Client(), str(tmp_path / "cache"))
+        task = cache[0]
+        assert type(task) is Task  # pylint: disable=unidiomatic-typecheck
+        task.title = "changed again"
+        assert cache[0].title != task.title
+
+
+def _CheckIndex(cache):
+    # pylint: disable=protected-access
+    assert list(cache._index.values()) == cache.cache["tasks"]
+    assert all(id_ == t.id_ for id_, t in cache._index.items())
+
+
+def test_cache_index(tmp_path, monkeypatch):
+    with FakeToodledoServer() as server:
+        PopulateServer(server, 50)
+        toodledo = server.Client()
+        cache = TaskCache(toodledo, str(tmp_path / "cache"), comp=0,
+                          fields="note")
+        _CheckIndex(cache)
+
+        def Get(id_):
+            return cache.GetTasks(id_=id_, comp=0, fields="note")
+
+        tasks = list(cache)
+        assert Get(tasks[3].id_)[0].id_ == tasks[3].id_
+        assert not Get(-1)
+        added = cache.AddTasks([Task(title="new")])[0]
+        cache.EditTasks([Task(id_=tasks[0].id_, note="changed"),
+                         Task(id_=tasks[1].id_,
+                              completedDate=datetime.date.today())])
+        cache.DeleteTasks([tasks[2]])
+        _CheckIndex(cache)
+        # Edited tasks stay where they were
+        assert cache[0].note == "changed"
+        assert tasks[1].id_ not in _Ids(cache)
+        assert Get(added.id_)[0].title == "new"
+        assert not Get(tasks[2].id_)
+
+        # The cache is left alone when updating it fails part way
+        server.Client().DeleteTasks([tasks[3]])
+        server.Client().EditTasks([Task(id_=tasks[4].id_, note="edited")])
+        with monkeypatch.context() as patch:
+            patch.setattr(toodledo, "GetTasks", None)
+            with pytest.raises(TypeError):
+                cache.update()
+        assert Get(tasks[3].id_)
+        _CheckIndex(cache)
+        cache.update()
+        _CheckIndex(cache)
+        assert not Get(tasks[3].id_)
+        assert Get(tasks[4].id_)[0].note == "edited"
+        reopened = TaskCache(toodledo, str(tmp_path / "cache"), comp=0,
+                             fields="note", update=False)
+        _CheckIndex(reopened)
+        assert _Ids(reopened) == _Ids(cache)
+
+
+def test_cache_task_list(tmp_path):
+    # pylint: disable=protected-access
+    with FakeToodledoServer() as server:
+        PopulateServer(server, 20)
+        cache = TaskCache(server.Client(), str(tmp_path / "cache"),
+                          autosave=False)
+        tasks = list(cache)
+        # Changes only update the index; the list is built when needed
+        cache.EditTasks([Task(id_=tasks[0].id_, title="edited")])
+        assert cache.cache["tasks"]._tasks is None
+        assert len(cache) == 20
+        assert cache.GetTasks(id_=tasks[0].id_)[0].title == "edited"
+        assert cache.cache["tasks"]._tasks is None
+        assert cache[0].title == "edited"
+        assert cache.cache["tasks"]._tasks is not None
+        # The cache can be changed while iterating over it
+        for task in cache:
+            cache.DeleteTasks([task])
+        assert len(cache) == 0
+        cache.AddTasks([Task(title="new")])
+        cache.save()
+        with open(str(tmp_path / "cache"), "rb") as f:
+            saved = pickle.load(f)["tasks"]
+        assert type(saved) is list  # pylint: disable=unidiomatic-typecheck
+        assert [t.title for t in saved] == ["new"]
+
+
+def test_cache_modified_index(tmp_path):
+    with FakeToodledoServer() as server:
+        # Each batch of tasks is added with a different modified time
+        for i in range(20):
+            server.AddTasks({"title": f"task {i}.{j}"} for j in range(10))
+        toodledo = server.Client()
+        cache = TaskCache(toodledo, str(tmp_path / "cache"), fields="note")
+
+        def Check():
+            # pylint: disable=protected-access
+            assert cache._modified == sorted(
+                (t.modified, t.id_) for t in cache)
+            times = sorted({t.modified for t in cache})
+            for before, after in ((times[-1], times[0]), (None, times[5]),
+                                  (times[-5], None), (times[3], times[3]),
+                                  (times[4], times[2])):
+                expected = sorted(
+                    (t for t in cache
+                     if (before is None or t.modified < before) and
+                     (after is None or t.modified > after)),
+                    key=lambda t: (t.modified, t.id_))
+                assert _Ids(cache.GetTasks(before=before, after=after,
+                                           fields="note")) == \
+                    _Ids(expected)
+            assert _Ids(cache.GetTasks(before=times[4].timestamp(),
+                                       fields="note")) == \
+                _Ids(cache.GetTasks(before=times[4], fields="note"))
+
+        Check()
+        tasks = list(cache)
+        # Small changes are made to the index in place, and big ones by
+        # sorting it again.
+        cache.EditTasks([Task(id_=tasks[0].id_, note="changed")])
+        Check()
+        added = cache.AddTasks([Task(title="new")])
+        cache.DeleteTasks([tasks[1]] + added)
+        Check()
+        toodledo.EditTasks([Task(id_=t.id_, note="edited")
+                            for t in tasks[2:50]])
+        cache.update()
+        Check()
+        with cache.caching_everything():
+            cache.EditTasks([Task(id_=tasks[2].id_, note="again")])
+        Check()
+        cache.save()
+        reopened = TaskCache(toodledo, str(tmp_path / "cache"),
+                             fields="note", update=False)
+        assert _Ids(reopened.GetTasks(after=tasks[0].modified)) == \
+            _Ids(cache.GetTasks(after=tasks[0].modified))
+
+
+def _Ids(tasks):
+    return [task.id_ for task in tasks]
+
+
+def _CheckColumns(cache):
+    # pylint: disable=protected-access
+    columns = cache._columns
+    rows = columns.Select({})
+    tasks = columns.Tasks(rows)
+    assert len(tasks) == len(cache.cache["tasks"])
+    assert all(a is b for a, b in zip(tasks, cache.cache["tasks"]))
+    assert all(columns.rows[task.id_] == row
+               for task, row in zip(tasks, rows.tolist()))
+    expected = _TaskColumns()
+    expected.Sync(cache.cache["tasks"])
+    for attribute, column in expected.columns.items():
+        assert numpy.array_equal(columns.columns[attribute][rows], column)
+
+
+@pytest.mark.skipif(numpy is None, reason="numpy is not installed")
+def test_cache_columnar(tmp_path):
+    # pylint: disable=protected-access
+    fields = "folder,context,duedate,length,parent,priority,star,startdate"
+    with FakeToodledoServer() as server:
+        PopulateServer(server, 300)
+        plain = TaskCache(server.Client(), str(tmp_path / "plain"),
+                          fields=fields)
+        cache = TaskCache(server.Client(), str(tmp_path / "columnar"),
+                          fields=fields, columnar=True)
+        _CheckColumns(cache)
+        middle = sorted(t.modified for t in plain)[150]
+        for kwargs in ({}, {"comp": 0}, {"comp": 1}, {"after": middle},
+                       {"before": middle, "comp": 0, "fields": "star"},
+                       {"after": middle.timestamp()}, {"id_": plain[7].id_},
+                       {"id_": -1}):
+            assert _Ids(cache.GetTasks(**kwargs)) == \
+                _Ids(plain.GetTasks(**kwargs))
+        for sort_by in ("dueDate", "priority", "star", "modified", "parent",
+                        "title"):
+            for reverse in (False, True):
+                assert _Ids(cache.GetSortedTasks(sort_by, reverse)) == \
+                    _Ids(plain.GetSortedTasks(sort_by, reverse))
+        tasks = plain.GetSortedTasks("dueDate", comp=0, fields="duedate")
+        assert all(a.dueDate <= b.dueDate for a, b in zip(tasks, tasks[1:])
+                   if a.dueDate and b.dueDate)
+        assert plain.GetSortedTasks("priority", reverse=True,
+                                    fields="priority")[0].priority == \
+            Priority.TOP
+
+        # The columns follow changes to the cache
+        added = cache.AddTasks([Task(title="new", priority=Priority.TOP),
+                                Task(title="newer")])
+        _CheckColumns(cache)
+        cache.EditTasks([Task(id_=added[1].id_, star=True),
+                         Task(id_=plain[3].id_,
+                              completedDate=datetime.date.today())])
+        _CheckColumns(cache)
+        cache.DeleteTasks(added[:1] + plain[4:6])
+        _CheckColumns(cache)
+        server.Client().EditTasks([Task(id_=plain[8].id_, length=5)])
+        cache.update()
+        _CheckColumns(cache)
+        assert cache.GetTasks(id_=plain[8].id_, fields="length")[0] \
+            .length == 5
+        # Only the changed rows are updated, until most of them are deleted
+        rows = dict(cache._columns.rows)
+        cache.DeleteTasks(plain[10:100])
+        cache.AddTasks([Task(title="newest", star=True)])
+        _CheckColumns(cache)
+        assert all(cache._columns.rows[t.id_] == rows[t.id_]
+                   for t in plain[100:])
+        cache.DeleteTasks(plain[100:250])
+        _CheckColumns(cache)
+        assert len(cache._columns.tasks) == len(cache)
+        reopened = TaskCache(server.Client(), str(tmp_path / "columnar"),
+                             fields=fields, columnar=True)
+        _CheckColumns(reopened)
+        assert _Ids(reopened.GetSortedTasks("star", reverse=True)) == \
+            _Ids(TaskCache(server.Client(), str(tmp_path / "columnar"),
+                           fields=fields).GetSortedTasks("star", True))
+
+
+@pytest.mark.parametrize("columnar", [
+    False,
+    pytest.param(True, marks=pytest.mark.skipif(
+        numpy is None, reason="numpy is not installed"))])
+def test_cache_sorted_unset_values(tmp_path, columnar):
+    # Unset values sort before the others, so they're first in ascending
+    # order and last in descending order; ties stay in cache order.
+    today = datetime.date.today()
+    with FakeToodledoServer() as server:
+        toodledo = server.Client()
+        added = toodledo.AddTasks([
+            Task(title="a", dueDate=today, note="x"),
+            Task(title="b"),
+            Task(title="c", dueDate=today - datetime.timedelta(days=1),
+                 note="y"),
+            Task(title="d"),
+            Task(title="e", dueDate=today, note="x")])
+        cache = TaskCache(toodledo, str(tmp_path / "cache"),
+                          fields="duedate,note", columnar=columnar)
+        a, b, c, d, e = _Ids(added)
+        assert _Ids(cache.GetSortedTasks("dueDate")) == [b, d, c, a, e]
+        assert _Ids(cache.GetSortedTasks("dueDate", reverse=True)) == \
+            [a, e, c, b, d]
+        assert _Ids(cache.GetSortedTasks("note")) == [b, d, a, e, c]
+        assert _Ids(cache.GetSortedTasks("note", reverse=True)) == \
+            [c, a, e, b, d]
+
+
+def test_cache_columnar_without_numpy(monkeypatch, tmp_path):
+    monkeypatch.setattr(task_columns, "numpy", None)
+    with pytest.raises(ImportError):
+        TaskCache(None, str(tmp_path / "cache"), columnar=True)
+
+
+class _Fcntl:
+    """Wraps fcntl to tell when a thread is waiting for a cache's lock"""
+    LOCK_EX = fcntl.LOCK_EX
+    LOCK_UN = fcntl.LOCK_UN
+
+    def __init__(self):
+        self.waiting = threading.Event()
+
+    def flock(self, f, operation):
+        if threading.current_thread() is not threading.main_thread():
+            self.waiting.set()
+        fcntl.flock(f, operation)
+
+    def Start(self, target):
+        """Start a thread and return it once it's waiting for a lock"""
+        self.waiting.clear()
+        thread = threading.Thread(target=target)
+        thread.start()
+        self.waiting.wait()
+        return thread
+
+
+@pytest.mark.parametrize("store", [None, SqliteTaskStore,
+                                   JournaledTaskStore])
+def test_cache_shared(tmp_path, monkeypatch, store):
+    # pylint: disable=protected-access
+    wrapper = _Fcntl()
+    monkeypatch.setattr(task_cache, "fcntl", wrapper)
+    path = str(tmp_path / "cache")
+    with FakeToodledoServer() as server:
+        server.AddTasks({"title": f"task {i}"} for i in range(10))
+
+        def Open(**kwargs):
+            return TaskCache(server.Client(), path, autosave=False,
+                             shared=True, store=store and store(), **kwargs)
+
+        first = Open()
+        second = Open(update=False)
+        fetches = server.requests["tasks/get.php"]
+        # While one cache updates, another one waiting to update uses what
+        # it saved.
+        server.Client().AddTasks([Task(title="new")])
+        with first._locked():
+            waiting = wrapper.Start(second.update)
+            first.update()
+        waiting.join()
+        assert server.requests["tasks/get.php"] == fetches + 1
+        assert len(second) == len(first) == 11
+        # A cache that was saved by another process isn't overwritten
+        server.Client().DeleteTasks([first[0]])
+        second.update()
+        assert len(second) == 10
+        first.save()
+        assert len(Open(update=False)) == 10
+        first.update()
+        assert len(first) == 10
+        assert server.requests["tasks/get.php"] == fetches + 3
+        # Caches opened while another one is updating use its update
+        with first._locked():
+            opening = wrapper.Start(Open)
+            server.Client().AddTasks([Task(title="newer")])
+            first.update()
+        opening.join()
+        assert server.requests["tasks/get.php"] == fetches + 4
+
+
+def test_task_unset_fields():
+    # pylint: disable=no-member
+    task = Task(title="x", note=None)
+    assert task.note is None
+    assert not hasattr(task, "dueDate")
+    assert task.AsDict() == {"title": "x", "note": None}
+    del task.note
+    assert task.AsDict() == {"title": "x"}
+    with pytest.raises(AttributeError):
+        Task(unknown=1)
+
+
+def test_task_old_pickle():
+    # Caches saved by older versions contain pickled tasks with a __dict__
+    data = pickle.dumps(_OldTask(id_=1, title="x", meta=None), protocol=0)
+    data = data.replace(f"{__name__}\n_OldTask".encode(),
+                        b"toodledo.task\nTask")
+    task = pickle.loads(data)
+    assert type(task) is Task  # pylint: disable=unidiomatic-typecheck
+    assert task.AsDict() == {"id_": 1, "title": "x", "meta": None}
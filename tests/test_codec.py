@@ -0,0 +1,134 @@
+# pylint: disable=protected-access
+import datetime
+import json
+
+from marshmallow import ValidationError
+import pytest
+
+from benchmarks.accounts import PopulateServer
+from toodledo import (
+    FakeToodledoServer,
+    LazyTask,
+    Priority,
+    ReadOnlyTask,
+    Status,
+    Task,
+    TaskCache,
+)
+from toodledo.task import _LoadLazyTasks, _TASK_CODEC, _TaskSchema
+
+
+def _Same(raw):
+    """Assert that the codec loads and dumps raw like the schema does"""
+    task = _TASK_CODEC.Load(dict(raw))
+    expected = _TaskSchema().load(dict(raw))
+    assert [(name, type(value), value) for name, value in
+            task.AsDict().items()] == \
+        [(name, type(value), value) for name, value in
+         expected.AsDict().items()]
+    assert json.dumps(_TASK_CODEC.Dump(task)) == \
+        json.dumps(_TaskSchema().dump(expected))
+
+
+def test_codec_synthetic_tasks():
+    with FakeToodledoServer() as server:
+        PopulateServer(server, 300)
+        raws = server.Tasks()
+    for raw in raws:
+        _Same(raw)
+    # A different set of fields for each request
+    for fields in (("id",), ("id", "title", "duedate", "tag"),
+                   ("completed", "star", "meta", "parent", "remind")):
+        for raw in raws[:20]:
+            _Same({key: raw.get(key, 0) for key in fields})
+
+
+@pytest.mark.parametrize("raw", [
+    {"id": 1, "title": "x", "duetime": 1700000000.5, "starttime": 0,
+     "modified": 1700000000, "meta": None, "tag": ""},
+    {"id": "12"},
+    {"id": 1.5, "title": b"bytes"},
+    {"star": True, "priority": True},
+    {"parent": "7", "remind": 15, "reschedule": 1},
+    {"duedate": "1700000000"},
+])
+def test_codec_unusual_values(raw):
+    _Same(raw)
+
+
+@pytest.mark.parametrize("raw", [
+    {"title": "x" * 256},
+    {"title": None},
+    {"id": None},
+    {"id": True},
+    {"unknown": 1},
+    {"note": 5},
+])
+def test_codec_invalid_values(raw):
+    with pytest.raises(ValidationError) as expected:
+        _TaskSchema().load(dict(raw))
+    with pytest.raises(ValidationError) as e:
+        _TASK_CODEC.Load(dict(raw))
+    assert e.value.messages == expected.value.messages
+
+
+def test_codec_assertions():
+    for raw in ({"star": 2}, {"priority": 4}, {"folder": "1"}):
+        with pytest.raises(AssertionError):
+            _TASK_CODEC.Load(raw)
+
+
+def test_codec_dump_unusual_values():
+    for task in (
+            Task(title="x", dueDate=datetime.datetime(2024, 1, 1, 5),
+                 priority=Priority.HIGH, status=Status.HOLD),
+            ReadOnlyTask(id_=1, title="read-only", star=False),
+            Task(folderId=True, length=2.0, remind=30),
+            Task(tags=["b", "a"], parent=None, startDate=None)):
+        assert json.dumps(_TASK_CODEC.Dump(task)) == \
+            json.dumps(_TaskSchema().dump(task))
+    with pytest.raises(AssertionError):
+        _TASK_CODEC.Dump(Task(star=1))
+
+
+def test_lazy_tasks():
+    with FakeToodledoServer() as server:
+        PopulateServer(server, 100)
+        raws = server.Tasks()
+    tasks = _LoadLazyTasks([dict(raw) for raw in raws])
+    assert all(isinstance(task, LazyTask) for task in tasks)
+    task = tasks[0]
+    assert task.title == raws[0]["title"]
+    # Only the field that was accessed has been decoded
+    assert "title" not in task._raw and "tag" in task._raw
+    assert [t.AsDict() for t in tasks] == \
+        [t.AsDict() for t in _TASK_CODEC.LoadMany(raws)]
+    assert not task._raw
+
+    task = _LoadLazyTasks([{"id": 1, "title": "x" * 256, "note": "a"}])[0]
+    assert task.id_ == 1
+    assert not hasattr(task, "dueDate")
+    with pytest.raises(ValidationError):
+        task.title  # pylint: disable=pointless-statement
+    del task.note
+    assert not hasattr(task, "note")
+    task.title = "y"
+    task.star = True
+    assert task.Copy().AsDict() == {"id_": 1, "title": "y", "star": True}
+    with pytest.raises(ValidationError):
+        _LoadLazyTasks([{"id": 1, "unknown": 1}])
+
+
+def test_lazy_tasks_client(tmp_path):
+    with FakeToodledoServer() as server:
+        server.AddTasks({"title": f"task {i}", "tag": "a, b"}
+                        for i in range(5))
+        toodledo = server.Client(lazyTasks=True)
+        tasks = toodledo.GetTasks(fields="tag")
+        assert all(isinstance(task, LazyTask) for task in tasks)
+        assert [task.tags for task in tasks] == [["a", "b"]] * 5
+        cache = TaskCache(toodledo, str(tmp_path / "cache"), fields="tag")
+        assert {type(task) for task in cache.cache["tasks"]} == \
+            {ReadOnlyTask}
+        assert cache[0].AsDict() == server.Client().GetTasks(
+            fields="repeat,tag")[0].AsDict()
@@ -0,0 +1,122 @@
+# pylint: disable=protected-access
+import asyncio
+import math
+
+import pytest
+
+from toodledo import (
+    FakeToodledoServer,
+    Task,
+    ToodledoBulkError,
+    ToodledoError,
+)
+from toodledo.transport import _TaskPageOffsets
+
+
+@pytest.fixture(name="server")
+def fixture_server():
+    with FakeToodledoServer() as fake:
+        yield fake
+
+
+def _GetAsync(server, **kwargs):
+    async def run():
+        async with server.AsyncClient(**kwargs) as toodledo:
+            tasks = await toodledo.GetTasks()
+            iterated = [task async for task in toodledo.IterTasks()]
+            return tasks, iterated
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("count", [1000, 2000, 2500])
+@pytest.mark.parametrize("pageConcurrency", [None, 2])
+def test_page_concurrency(server, count, pageConcurrency):
+    # Exactly one request per page, in parallel or not; serially, paging
+    # stops at the total rather than fetching an empty page after a full
+    # one.
+    server.AddTasks({"title": f"task {i}"} for i in range(count))
+    titles = [f"task {i}" for i in range(count)]
+    pages = math.ceil(count / 1000)
+    toodledo = server.Client(pageConcurrency=pageConcurrency)
+    assert [t.title for t in toodledo.GetTasks()] == titles
+    assert server.requests["tasks/get.php"] == pages
+    assert [t.title for t in toodledo.IterTasks()] == titles
+    assert server.requests["tasks/get.php"] == 2 * pages
+    tasks, iterated = _GetAsync(server, pageConcurrency=pageConcurrency)
+    assert [t.title for t in tasks] == [t.title for t in iterated] == titles
+    assert server.requests["tasks/get.php"] == 4 * pages
+
+
+def test_page_offsets_without_total():
+    # Without a total, the caller has to keep fetching pages until it gets a
+    # short one.
+    assert _TaskPageOffsets([{"num": 1000}] + [{}] * 1000, 1000) is None
+    assert _TaskPageOffsets([{"num": 10}] + [{}] * 10, 1000) == []
+    assert _TaskPageOffsets([{"num": 1000, "total": 2500}] + [{}] * 1000,
+                            1000) == [1000, 2000]
+
+
+@pytest.mark.parametrize("writeConcurrency", [None, 3])
+def test_write_concurrency(server, writeConcurrency):
+    toodledo = server.Client(writeConcurrency=writeConcurrency)
+    added = toodledo.AddTasks([Task(title=f"task {i}") for i in range(120)])
+    assert [t.title for t in added] == [f"task {i}" for i in range(120)]
+    edited = toodledo.EditTasks([Task(id_=t.id_, note=str(i))
+                                 for i, t in enumerate(reversed(added))])
+    assert [t.id_ for t in edited] == [t.id_ for t in reversed(added)]
+    assert server.requests["tasks/add.php"] == \
+        server.requests["tasks/edit.php"] == 3
+    toodledo.DeleteTasks(added[10:])
+    assert server.requests["tasks/delete.php"] == 3
+    assert [t.id_ for t in toodledo.GetTasks()] == \
+        [t.id_ for t in added[:10]]
+
+
+def test_write_concurrency_async(server):
+    async def run():
+        async with server.AsyncClient(writeConcurrency=3) as toodledo:
+            added = await toodledo.AddTasks(
+                [Task(title=f"task {i}") for i in range(120)])
+            edited = await toodledo.EditTasks(
+                [Task(id_=t.id_, note="x") for t in reversed(added)])
+            await toodledo.DeleteTasks(added)
+            return added, edited
+    added, edited = asyncio.run(run())
+    assert [t.title for t in added] == [f"task {i}" for i in range(120)]
+    assert [t.id_ for t in edited] == [t.id_ for t in reversed(added)]
+    assert not server.Tasks()
+
+
+def _WithUntitledTask():
+    # The second and last chunk, of 21 tasks, fails
+    tasks = [Task(title=f"task {i}") for i in range(71)]
+    tasks[60] = Task(note="no title")
+    return tasks
+
+
+def test_write_concurrency_errors(server):
+    with pytest.raises(ToodledoBulkError) as e:
+        server.Client(writeConcurrency=2).AddTasks(_WithUntitledTask())
+    assert list(e.value.errors) == [50]
+    assert isinstance(e.value.errors[50], ToodledoError)
+    assert e.value.errors[50].args[1] == 601
+    assert e.value.ends == {50: 70}
+    assert "tasks 50-70:" in str(e.value)
+    assert [len(result) if result else result
+            for result in e.value.results] == [50, None]
+
+    async def run():
+        async with server.AsyncClient(writeConcurrency=2) as toodledo:
+            await toodledo.AddTasks(_WithUntitledTask())
+    with pytest.raises(ToodledoBulkError) as e:
+        asyncio.run(run())
+    assert e.value.ends == {50: 70}
+    assert e.value.results[1] is None
+
+
+def test_write_errors_serial(server):
+    # Without writeConcurrency, the error for the chunk is raised as is
+    with pytest.raises(ToodledoError) as e:
+        server.Client().AddTasks(_WithUntitledTask())
+    assert e.type is ToodledoError
+    assert e.value.args[1] == 601
@@ -0,0 +1,126 @@
+# pylint: disable=protected-access
+import datetime
+import threading
+
+import pytest
+
+from toodledo import FakeToodledoServer, RetryPolicy, Task, ToodledoError
+from toodledo.fake_server import _NextDate
+
+
+@pytest.fixture(name="server")
+def fixture_server():
+    with FakeToodledoServer() as fake:
+        yield fake
+
+
+def test_fake_pagination(server):
+    server.AddTasks({"title": f"task {i}"} for i in range(2500))
+    toodledo = server.Client(historyCount=10)
+    tasks = toodledo.GetTasks()
+    assert [t.title for t in tasks] == [f"task {i}" for i in range(2500)]
+    assert [record.start for record in toodledo._history] == [2000, 1000, 0]
+
+
+def test_fake_write_limit(server):
+    toodledo = server.Client()
+    with pytest.raises(ToodledoError) as e:
+        toodledo._PostTasks(toodledo.addTasksUrl,
+                            [{"title": str(i)} for i in range(51)])
+    assert e.value.args[1] == 602
+    added = toodledo.AddTasks([Task(title=str(i)) for i in range(120)])
+    assert len(added) == len(server.Tasks()) == 120
+    assert server.requests["tasks/add.php"] == 4
+    with pytest.raises(ToodledoError) as e:
+        toodledo.AddTasks([Task(note="no title")])
+    assert e.value.args[1] == 601
+
+
+def test_fake_watermarks(server):
+    toodledo = server.Client()
+    account = toodledo.GetAccount()
+    added = toodledo.AddTasks([Task(title="a"), Task(title="b")])
+    assert toodledo.GetAccount().lastEditTask > account.lastEditTask
+    assert [t.id_ for t in toodledo.GetTasks(after=account.lastEditTask)] \
+        == [t.id_ for t in added]
+    toodledo.DeleteTasks(added[:1])
+    deleted = toodledo.GetDeletedTasks(account.lastDeleteTask)
+    assert [t.id_ for t in deleted] == [added[0].id_]
+    assert toodledo.GetAccount().lastDeleteTask == deleted[0].stamp
+
+
+def test_fake_reschedule(server):
+    toodledo = server.Client()
+    due = datetime.date(2024, 1, 31)
+    added = toodledo.AddTasks(
+        [Task(title="rent", dueDate=due, repeat="FREQ=MONTHLY")])
+    edited = toodledo.EditTasks([Task(
+        id_=added[0].id_, completedDate=due, reschedule=1)])
+    assert edited[0].completedDate is None
+    tasks = toodledo.GetTasks(fields="duedate")
+    assert [(t.id_ == added[0].id_, t.dueDate, t.completedDate)
+            for t in tasks] == [
+        (True, datetime.date(2024, 2, 29), None),
+        (False, due, due)]
+
+
+def test_fake_next_date():
+    assert _NextDate("DAILY", datetime.date(2024, 12, 31)) == \
+        datetime.date(2025, 1, 1)
+    assert _NextDate("FREQ=WEEKLY;INTERVAL=2", datetime.date(2024, 1, 1)) \
+        == datetime.date(2024, 1, 15)
+    assert _NextDate("FREQ=YEARLY", datetime.date(2024, 2, 29)) == \
+        datetime.date(2025, 2, 28)
+    assert _NextDate("PARENT", datetime.date(2024, 1, 1)) is None
+
+
+def test_fake_429(server):
+    server.requestsPerToken = 2
+    toodledo = server.Client()
+    oldToken = toodledo._session.token
+    for _ in range(3):
+        toodledo.GetAccount()
+    assert toodledo._session.token["access_token"] != \
+        oldToken["access_token"]
+    assert toodledo.tokenStorage.Load() == toodledo._session.token
+    server.InjectFailures()
+    toodledo.GetAccount()
+    assert toodledo.metrics.Snapshot()["account/get.php"].refreshes == 2
+
+
+def test_fake_injected_errors(server):
+    toodledo = server.Client(retryPolicy=RetryPolicy(backoff=0))
+    server.InjectFailures(status=503, retryAfter=0)
+    server.InjectFailures(status=200, errorCode=4)
+    assert toodledo.GetTasks() == []
+    assert toodledo.retryPolicy.counters["http_503"] == 1
+    assert toodledo.retryPolicy.counters["api_offline"] == 1
+    server.InjectFailures(status=500, count=4)
+    with pytest.raises(Exception):
+        toodledo.GetTasks()
+
+
+def test_fake_latency(server):
+    server.latency = lambda endpoint: 0.2 if endpoint == "tasks/get.php" \
+        else 0
+    toodledo = server.Client()
+    toodledo.GetAccount()
+    toodledo.GetTasks()
+    metrics = toodledo.metrics.Snapshot()
+    assert metrics["account/get.php"].seconds < 0.2
+    assert metrics["tasks/get.php"].seconds >= 0.2
+
+
+def test_fake_request_counts(server):
+    toodledo = server.Client(poolSize=8)
+
+    def GetAccounts():
+        for _ in range(25):
+            toodledo.GetAccount()
+
+    threads = [threading.Thread(target=GetAccounts) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert server.requests["account/get.php"] == 200
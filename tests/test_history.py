@@ -1,4 +1,11 @@
 # pylint: disable=protected-access
+import pytest
+
+from toodledo import FakeToodledoServer, RetryPolicy
+from toodledo.async_transport import AsyncToodledoSession
+from toodledo.history import RequestHistory
+from toodledo.transport import ToodledoSession
+
 
 def test_history(toodledo):
     toodledo._session.toodledo_history_count = 1
@@ -8,3 +15,68 @@ def test_history(toodledo):
     toodledo.GetTasks()
     assert len(history) == 1
     assert history[0][1].endswith('tasks/get.php')
+    assert history[0].status == 200
+    assert history[0].start == 0
+    assert history[0].body is None
+
+
+def test_history_ring_buffer():
+    history = RequestHistory(2)
+    for start in range(3):
+        history.Record("GET", "tasks/get.php", 200, b"[{}]", 0.1,
+                       params={"start": start})
+    assert [record.start for record in history] == [2, 1]
+    assert history[0].bytes == 4
+
+
+@pytest.mark.parametrize("client", ["sync", "async"])
+def test_history_resize(client):
+    if client == "sync":
+        session = ToodledoSession(history_count=5)
+    else:
+        session = AsyncToodledoSession("id", "secret", {}, None,
+                                       historyCount=5)
+    for start in range(5):
+        session.toodledo_history.Record("GET", "tasks/get.php", 200, b"[]",
+                                        0.1, params={"start": start})
+    # Shrinking keeps the most recent records
+    session.toodledo_history_count = 2
+    assert [record.start for record in session.toodledo_history] == [4, 3]
+    session.toodledo_history_count = 4
+    assert [record.start for record in session.toodledo_history] == [4, 3]
+    assert session.toodledo_history_count == 4
+    session.toodledo_history_count = None
+    assert not session.toodledo_history
+
+
+def test_history_failure_bodies():
+    history = RequestHistory(3)
+    history.Record("GET", "account/get.php", 200, b"{}", 0.1)
+    history.Record("GET", "account/get.php", 500, b"oops", 0.1)
+    history.Record("POST", "tasks/add.php", 200, b'{"errorCode": 601}', 0.1)
+    assert [record.body for record in history] == [
+        b'{"errorCode": 601}', b"oops", None]
+    history = RequestHistory(1, bodies=True)
+    history.Record("GET", "account/get.php", 200, b"{}", 0.1)
+    assert history[0].body == b"{}"
+
+
+def test_history_disabled():
+    history = RequestHistory()
+    history.Record("GET", "account/get.php", 200, b"{}", 0.1)
+    assert len(history) == 0
+
+
+def test_history_retries():
+    with FakeToodledoServer() as server:
+        toodledo = server.Client(historyCount=10,
+                                 retryPolicy=RetryPolicy(backoff=0))
+        server.InjectFailures(status=503, count=2)
+        server.InjectFailures(status=429)
+        toodledo.GetAccount()
+    # One record for each attempt; the last one includes refreshing the
+    # token, which is recorded too, and resending the request.
+    assert [(record.url.rpartition("/3/")[2], record.status, record.retries)
+            for record in reversed(toodledo._history)] == [
+        ("account/get.php", 503, 0), ("account/get.php", 503, 1),
+        ("account/token.php", 200, 0), ("account/get.php", 200, 3)]
@@ -0,0 +1,78 @@
+import asyncio
+from collections import Counter
+
+import pytest
+
+from toodledo import (
+    Context,
+    FakeToodledoServer,
+    Folder,
+    JsonBackend,
+    OrjsonBackend,
+    Task,
+    ToodledoError,
+)
+from toodledo.json_backend import orjson
+
+
+class _CountingBackend(JsonBackend):
+    def __init__(self):
+        self.calls = Counter()
+
+    def Loads(self, data):
+        self.calls["Loads"] += 1
+        return super().Loads(data)
+
+    def Dumps(self, value):
+        self.calls["Dumps"] += 1
+        return super().Dumps(value)
+
+
+@pytest.fixture(name="server")
+def fixture_server():
+    with FakeToodledoServer() as fake:
+        yield fake
+
+
+def test_json_backend_parses_once(server):
+    backend = _CountingBackend()
+    toodledo = server.Client(jsonBackend=backend)
+    folder = toodledo.AddFolder(Folder(name="folder", private=False))
+    toodledo.DeleteFolder(folder)
+    context = toodledo.AddContext(Context(name="context", private=False))
+    toodledo.DeleteContext(context)
+    tasks = toodledo.AddTasks([Task(title=str(i)) for i in range(60)])
+    toodledo.DeleteTasks(tasks)
+    assert toodledo.GetTasks() == []
+    with pytest.raises(ToodledoError):
+        toodledo.AddFolder(Folder(name="", private=False))
+    assert backend.calls == {"Loads": sum(server.requests.values()),
+                             "Dumps": 4}
+
+
+def test_json_backend_async(server):
+    backend = _CountingBackend()
+
+    async def Run():
+        async with server.AsyncClient(jsonBackend=backend) as toodledo:
+            tasks = await toodledo.AddTasks([Task(title="a")])
+            await toodledo.DeleteTasks(tasks)
+            return await toodledo.GetTasks()
+
+    assert asyncio.run(Run()) == []
+    assert backend.calls == {"Loads": sum(server.requests.values()),
+                             "Dumps": 2}
+
+
+@pytest.mark.skipif(orjson is None, reason="orjson is not installed")
+def test_orjson_backend(server):
+    server.AddTasks({"title": f"tâche {i}", "note": "☃"}
+                    for i in range(10))
+    tasks = server.Client(jsonBackend=OrjsonBackend()).GetTasks(
+        fields="note")
+    expected = server.Client(jsonBackend=JsonBackend()).GetTasks(
+        fields="note")
+    assert [t.AsDict() for t in tasks] == [t.AsDict() for t in expected]
+    value = [{"title": "☃", "duedate": 1700000000.0, "star": 1}]
+    backend = OrjsonBackend()
+    assert backend.Loads(backend.Dumps(value)) == value
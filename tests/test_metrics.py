@@ -0,0 +1,43 @@
+from toodledo import InMemoryMetrics, PrometheusText
+
+
+def test_metrics_per_endpoint():
+    metrics = InMemoryMetrics(buckets=(0.1, 1.0))
+    metrics.Record("https://api.toodledo.com/3/tasks/get.php", 200, 100, 0.05)
+    metrics.Record("https://api.toodledo.com/3/tasks/get.php", 200, 50, 0.5,
+                   refreshes=1)
+    metrics.Record("https://api.toodledo.com/3/tasks/edit.php", 200, 20, 2,
+                   error=True)
+    metrics.Record("https://api.toodledo.com/3/folders/get.php", 0, 0, 0.01)
+    snapshot = metrics.Snapshot()
+    assert sorted(snapshot) == ["folders/get.php", "tasks/edit.php",
+                                "tasks/get.php"]
+    tasks = snapshot["tasks/get.php"]
+    assert tasks.requests == 2
+    assert tasks.bytes == 150
+    assert tasks.errors == 0
+    assert tasks.refreshes == 1
+    assert tasks.buckets == [1, 1, 0]
+    assert snapshot["tasks/edit.php"].errors == 1
+    assert snapshot["tasks/edit.php"].buckets == [0, 0, 1]
+    assert snapshot["folders/get.php"].errors == 1
+    metrics.Reset()
+    assert not metrics.Snapshot()
+
+
+def test_metrics_prometheus_text():
+    metrics = InMemoryMetrics(buckets=(0.1, 1.0))
+    metrics.Record("https://api.toodledo.com/3/tasks/get.php", 200, 100, 0.05)
+    metrics.Record("https://api.toodledo.com/3/tasks/get.php", 200, 50, 0.5)
+    lines = PrometheusText(metrics).splitlines()
+    assert 'toodledo_requests_total{endpoint="tasks/get.php"} 2' in lines
+    assert 'toodledo_response_bytes_total{endpoint="tasks/get.php"} 150' \
+        in lines
+    assert ('toodledo_request_duration_seconds_bucket'
+            '{endpoint="tasks/get.php",le="0.1"} 1') in lines
+    assert ('toodledo_request_duration_seconds_bucket'
+            '{endpoint="tasks/get.php",le="1.0"} 2') in lines
+    assert ('toodledo_request_duration_seconds_bucket'
+            '{endpoint="tasks/get.php",le="+Inf"} 2') in lines
+    assert ('toodledo_request_duration_seconds_count'
+            '{endpoint="tasks/get.php"} 2') in lines
@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+from toodledo import FakeToodledoServer, TokenBucketRateLimiter
+
+
+class FakeClock:  # pylint: disable=too-few-public-methods
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_rate_limit_burst_then_wait():
+    clock = FakeClock()
+    limiter = TokenBucketRateLimiter(10, period=1.0, burst=2, clock=clock)
+    assert limiter.budget == 2
+    assert limiter.reserve() == 0
+    assert limiter.reserve() == 0
+    assert limiter.reserve() == pytest.approx(0.1)
+    assert limiter.budget == pytest.approx(-1)
+    clock.now = 0.2
+    assert limiter.budget == pytest.approx(1)
+
+
+def test_rate_limit_refill_capped_at_burst():
+    clock = FakeClock()
+    limiter = TokenBucketRateLimiter(100, period=3600, clock=clock)
+    for _ in range(100):
+        assert limiter.reserve() == 0
+    assert limiter.reserve() == pytest.approx(36)
+    clock.now = 1000000
+    assert limiter.budget == 100
+
+
+class ReserveOnly:  # pylint: disable=too-few-public-methods
+    """A rate limiter with only the method the API objects need"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def reserve(self):
+        self.calls += 1
+        return 0.01
+
+
+def test_rate_limit_reserve_only():
+    limiter = ReserveOnly()
+    with FakeToodledoServer() as server:
+        server.Client(rateLimiter=limiter).GetAccount()
+        assert limiter.calls == 1
+
+        async def run():
+            async with server.AsyncClient(rateLimiter=limiter) as toodledo:
+                await toodledo.GetAccount()
+        asyncio.run(run())
+        assert limiter.calls == 2
+
+
+def test_rate_limit_invalid():
+    with pytest.raises(ValueError):
+        TokenBucketRateLimiter(0)
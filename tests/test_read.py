@@ -12,6 +12,12 @@ def test_get_tasks(toodledo):
     assert isinstance(tasks, list)
 
 
+def test_iter_tasks(toodledo):
+    tasks = toodledo.GetTasks()
+    iterated = list(toodledo.IterTasks())
+    assert sorted(t.id_ for t in iterated) == sorted(t.id_ for t in tasks)
+
+
 def test_get_tasks_with_known_folders(toodledo):
     folders = toodledo.GetFolders()
     privateFolderId = [f.id_ for f in folders
@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+from toodledo import FakeToodledoServer, RetryPolicy, Task
+
+
+def test_retry_backoff_doubles_and_caps():
+    policy = RetryPolicy(retries=5, backoff=1, maxBackoff=5, jitter=False)
+    delays = [policy.Delay(attempt, "http_503") for attempt in range(6)]
+    assert delays == [1, 2, 4, 5, 5, None]
+    assert policy.counters["http_503"] == 5
+    assert policy.counters["retries"] == 5
+    assert policy.counters["delay"] == 17
+    assert policy.counters["exhausted"] == 1
+
+
+def test_retry_jitter_within_backoff():
+    policy = RetryPolicy(backoff=2)
+    for _ in range(100):
+        assert 0 <= policy.Delay(1, "timeout") <= 4
+
+
+def test_retry_honors_retry_after():
+    policy = RetryPolicy(maxBackoff=10)
+    assert policy.Delay(0, "http_503", "7") == 7
+    assert policy.Delay(0, "http_503", "3600") == 10
+    assert policy.Delay(0, "http_503",
+                        "Wed, 21 Oct 2015 07:28:00 GMT") == 0
+
+
+@pytest.fixture(name="server")
+def fixture_server():
+    with FakeToodledoServer() as fake:
+        yield fake
+
+
+@pytest.fixture(name="sleeps")
+def fixture_sleeps(monkeypatch):
+    sleeps = []
+    realSleep = asyncio.sleep
+
+    async def AsyncSleep(delay):
+        sleeps.append(delay)
+        await realSleep(0)
+
+    monkeypatch.setattr("toodledo.transport.time.sleep", sleeps.append)
+    monkeypatch.setattr("toodledo.async_transport.asyncio.sleep", AsyncSleep)
+    return sleeps
+
+
+def _GetTasksAsync(server, **kwargs):
+    async def run():
+        async with server.AsyncClient(**kwargs) as toodledo:
+            return await toodledo.GetTasks()
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("client", ["sync", "async"])
+def test_retry_after_from_server(server, sleeps, client):
+    # A 503 with Retry-After, then success: one retry, after the requested
+    # delay rather than the backoff
+    server.AddTasks([{"title": "task"}])
+    policy = RetryPolicy(backoff=100, maxBackoff=1000)
+    server.InjectFailures(status=503, retryAfter=7)
+    if client == "sync":
+        tasks = server.Client(retryPolicy=policy).GetTasks()
+    else:
+        tasks = _GetTasksAsync(server, retryPolicy=policy)
+    assert [task.title for task in tasks] == ["task"]
+    assert server.requests["tasks/get.php"] == 2
+    assert sleeps == [7]
+    assert policy.counters["http_503"] == policy.counters["retries"] == 1
+    assert policy.counters["delay"] == 7
+
+
+@pytest.mark.parametrize("client", ["sync", "async"])
+def test_retry_api_offline_from_server(server, sleeps, client):
+    # Toodledo error code 4 in a 200 response is retried with backoff
+    policy = RetryPolicy(backoff=2, jitter=False)
+    server.InjectFailures(status=200, errorCode=4, count=2)
+    if client == "sync":
+        tasks = server.Client(retryPolicy=policy).GetTasks()
+    else:
+        tasks = _GetTasksAsync(server, retryPolicy=policy)
+    assert tasks == []
+    assert server.requests["tasks/get.php"] == 3
+    assert sleeps == [2, 4]
+    assert policy.counters["api_offline"] == 2
+
+
+def test_retry_writes_not_retried(server, sleeps):
+    # Only reads are retried; a failed write is raised at once
+    toodledo = server.Client(retryPolicy=RetryPolicy())
+    server.InjectFailures(status=503, retryAfter=0)
+    with pytest.raises(Exception):
+        toodledo.AddTasks([Task(title="task")])
+    assert server.requests["tasks/add.php"] == 1
+    assert not sleeps
+    assert not server.Tasks()
@@ -0,0 +1,130 @@
+# pylint: disable=protected-access
+import asyncio
+import itertools
+import threading
+import time
+
+import pytest
+from requests.adapters import HTTPAdapter
+
+from toodledo import FakeToodledoServer
+
+
+@pytest.fixture(name="server")
+def fixture_server():
+    with FakeToodledoServer() as fake:
+        yield fake
+
+
+@pytest.fixture(name="sent")
+def fixture_sent(monkeypatch):
+    """The requests sent by requests, with the keyword arguments"""
+    sent = []
+    send = HTTPAdapter.send
+
+    def Send(self, request, **kwargs):
+        sent.append((request, kwargs))
+        return send(self, request, **kwargs)
+    monkeypatch.setattr(HTTPAdapter, "send", Send)
+    return sent
+
+
+def test_session_pool_size(server):
+    session = server.Client(poolSize=7)._session
+    for url in (server.baseUrl, "https://api.toodledo.com/3/"):
+        adapter = session.get_adapter(url)
+        assert adapter._pool_connections == adapter._pool_maxsize == 7
+    session = server.Client()._session
+    assert session.get_adapter(server.baseUrl)._pool_maxsize == 10
+
+
+def test_session_timeout(server, sent):
+    toodledo = server.Client(timeout=(2, 5))
+    toodledo.GetAccount()
+    toodledo._session.get(toodledo.getAccountUrl, timeout=1)
+    assert [kwargs["timeout"] for _, kwargs in sent] == [(2, 5), 1]
+    sent.clear()
+    server.Client().GetAccount()
+    assert sent[0][1]["timeout"] is None
+
+
+def test_session_keep_alive(server, sent):
+    server.Client().GetAccount()
+    server.Client(keepAlive=False).GetAccount()
+    assert [request.headers.get("Connection") for request, _ in sent] == \
+        ["keep-alive", "close"]
+
+
+def _Requests(toodledo):
+    return [record.url.rpartition("/3/")[2]
+            for record in reversed(toodledo._history)]
+
+
+def _GetAccountAsync(toodledo):
+    async def run():
+        async with toodledo:
+            await toodledo.GetAccount()
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("client", ["Client", "AsyncClient"])
+@pytest.mark.parametrize("expiresIn, refreshed", [
+    (30, True), (7200, False), (None, False)])
+def test_session_refresh_margin(server, client, expiresIn, refreshed):
+    toodledo = getattr(server, client)(historyCount=10, refreshMargin=60)
+    token = toodledo._session.token
+    if expiresIn is None:
+        del token["expires_at"]
+    else:
+        token["expires_at"] = time.time() + expiresIn
+    if client == "Client":
+        toodledo.GetAccount()
+    else:
+        _GetAccountAsync(toodledo)
+    if refreshed:
+        assert _Requests(toodledo) == ["account/token.php",
+                                       "account/get.php"]
+        assert toodledo._session.token["access_token"] != \
+            token["access_token"]
+    else:
+        assert _Requests(toodledo) == ["account/get.php"]
+    # The request was sent once, and never got a 429
+    assert [record.status for record in toodledo._history] == \
+        [200] * len(toodledo._history)
+    assert toodledo._history[0].retries == 0
+    assert toodledo.metrics.Snapshot()["account/get.php"].refreshes == 0
+
+
+def test_session_single_refresh(server):
+    # Every thread sends its request with the stale token before any of them
+    # refreshes it, then they all get 429 errors and want to refresh it.
+    threads = 8
+    barrier = threading.Barrier(threads)
+    waiting = itertools.count()
+
+    def Latency(endpoint):
+        if endpoint == "account/get.php" and next(waiting) < threads:
+            barrier.wait()
+        return 0
+
+    toodledo = server.Client(refreshMargin=None)
+    stale = toodledo._session.token
+    server.latency = Latency
+    server.requestsPerToken = threads
+    server._accessTokens[stale["access_token"]]["requests"] = threads
+    results = []
+
+    def GetAccount():
+        results.append(toodledo.GetAccount())
+
+    workers = [threading.Thread(target=GetAccount) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert len(results) == threads
+    assert server.requests["account/token.php"] == 1
+    assert server.requests["account/get.php"] == 2 * threads
+    assert toodledo._session.token["access_token"] != stale["access_token"]
+    assert toodledo.tokenStorage.Load() == toodledo._session.token
+    assert toodledo.metrics.Snapshot()["account/get.php"].refreshes == threads
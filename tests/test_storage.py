@@ -0,0 +1,59 @@
+import os
+from tempfile import TemporaryDirectory
+import threading
+import time
+
+from toodledo import TokenStorageFile
+
+
+def test_storage_round_trip():
+    with TemporaryDirectory() as directory:
+        storage = TokenStorageFile(os.path.join(directory, "token.json"))
+        assert storage.Load() is None
+        storage.Save({"access_token": "a", "refresh_token": "r"})
+        assert storage.Load() == {"access_token": "a", "refresh_token": "r"}
+
+
+def test_storage_sees_changes_by_others():
+    with TemporaryDirectory() as directory:
+        path = os.path.join(directory, "token.json")
+        storage = TokenStorageFile(path)
+        other = TokenStorageFile(path)
+        storage.Save({"access_token": "a"})
+        assert other.Load() == {"access_token": "a"}
+        other.Save({"access_token": "b"})
+        assert storage.Load() == {"access_token": "b"}
+        os.unlink(path)
+        assert storage.Load() is None
+        assert os.listdir(directory) == []
+
+
+def test_storage_load_returns_copy():
+    with TemporaryDirectory() as directory:
+        storage = TokenStorageFile(os.path.join(directory, "token.json"))
+        storage.Save({"access_token": "a"})
+        storage.Load()["access_token"] = "changed"
+        assert storage.Load() == {"access_token": "a"}
+
+
+def test_storage_lock_is_exclusive():
+    with TemporaryDirectory() as directory:
+        path = os.path.join(directory, "token.json")
+        holders = []
+        overlaps = []
+
+        def hold():
+            # Separate storage objects, as in separate processes
+            with TokenStorageFile(path).Lock():
+                holders.append(1)
+                if len(holders) > 1:
+                    overlaps.append(1)
+                time.sleep(0.01)
+                holders.pop()
+
+        threads = [threading.Thread(target=hold) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert not overlaps
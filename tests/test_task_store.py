@@ -0,0 +1,172 @@
+# pylint: disable=protected-access
+from collections import Counter
+import datetime
+import os
+import sqlite3
+
+from benchmarks.accounts import PopulateServer
+from toodledo import (
+    FakeToodledoServer,
+    JournaledTaskStore,
+    JsonBackend,
+    PickleTaskStore,
+    ReadOnlyTask,
+    SqliteTaskStore,
+    Task,
+    TaskCache,
+)
+from toodledo.task import _StoredTask
+
+FIELDS = "folder,context,duedate,length,note,priority,star,status,tag"
+
+
+class _CountingBackend(JsonBackend):
+    def __init__(self):
+        self.calls = Counter()
+
+    def Dumps(self, value):
+        self.calls["Dumps"] += 1
+        return super().Dumps(value)
+
+
+class _SnapshotStore(PickleTaskStore):
+    """Remembers what was in the journal when the snapshot was written"""
+    journal = None
+
+    def Save(self, path, cache):
+        super().Save(path, cache)
+        with open(path + ".journal", "rb") as f:
+            self.journal = f.read()
+
+
+def _Tasks(cache):
+    return sorted((t.AsDict() for t in cache.cache["tasks"]),
+                  key=lambda t: t["id_"])
+
+
+def test_sqlite_task_store(tmp_path):
+    path = str(tmp_path / "cache.db")
+    backend = _CountingBackend()
+    with FakeToodledoServer() as server:
+        PopulateServer(server, 200)
+        toodledo = server.Client()
+        cache = TaskCache(toodledo, path, fields=FIELDS,
+                          store=SqliteTaskStore(backend))
+        assert backend.calls["Dumps"] == 200
+        with sqlite3.connect(path) as connection:
+            assert connection.execute(
+                "SELECT COUNT(*) FROM tasks").fetchone() == (200,)
+        reopened = TaskCache(toodledo, path, fields=FIELDS, update=False,
+                             store=SqliteTaskStore())
+        assert {type(t) for t in reopened.cache["tasks"]} == {_StoredTask}
+        assert _Tasks(reopened) == _Tasks(cache)
+        assert reopened.cache["newest"] == cache.cache["newest"]
+        assert reopened.GetAccount().lastEditTask == cache.cache["newest"]
+
+        # Only the tasks that changed are written
+        backend.calls.clear()
+        added = cache.AddTasks([Task(title="new")])[0]
+        cache.EditTasks([Task(id_=cache[0].id_, note="changed")])
+        cache.DeleteTasks([cache[1], added])
+        cache.save()
+        assert backend.calls["Dumps"] == 1
+        toodledo.EditTasks([Task(id_=cache[2].id_, star=True)])
+        cache.update()
+        reopened = TaskCache(toodledo, path, fields=FIELDS,
+                             store=SqliteTaskStore())
+        assert _Tasks(reopened) == _Tasks(cache)
+        assert len(reopened) == 199
+        reopened.update()
+        assert _Tasks(reopened) == _Tasks(cache)
+
+        # Saving somewhere else writes everything
+        backend.calls.clear()
+        cache.dump_to_path(str(tmp_path / "other.db"))
+        assert backend.calls["Dumps"] == 199
+
+
+def test_sqlite_task_store_lazy(tmp_path):
+    path = str(tmp_path / "cache.db")
+    newest = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    tasks = [ReadOnlyTask(id_=1, title="x", note=None, star=True),
+             ReadOnlyTask(id_=2, tags=["a", "b"], length=None,
+                          dueDate=datetime.date(2024, 2, 1))]
+    SqliteTaskStore().Save(path, {"tasks": tasks, "newest": newest,
+                                  "comp": None, "fields": "note,tag"})
+    cache = SqliteTaskStore().Load(path)
+    assert cache["newest"] == newest and cache["comp"] is None
+    task = cache["tasks"][0]
+    assert "title" in task._raw
+    assert task.title == "x"
+    assert "title" not in task._raw and "note" in task._raw
+    assert [t.AsDict() for t in cache["tasks"]] == \
+        [t.AsDict() for t in tasks]
+    assert task.ReadOnly() is task
+
+
+def test_journaled_task_store(tmp_path):
+    path = str(tmp_path / "cache")
+    journal = path + ".journal"
+    with FakeToodledoServer() as server:
+        PopulateServer(server, 100)
+        toodledo = server.Client()
+
+        def Reopen(**kwargs):
+            return TaskCache(toodledo, path, fields=FIELDS, update=False,
+                             store=JournaledTaskStore(**kwargs))
+
+        cache = TaskCache(toodledo, path, fields=FIELDS, autosave=False,
+                          store=JournaledTaskStore())
+        assert os.path.getsize(journal) == 0
+        # Changes are journaled without saving
+        added = cache.AddTasks([Task(title="new")])[0]
+        cache.EditTasks([Task(id_=cache[0].id_, note="changed")])
+        cache.DeleteTasks([cache[1]])
+        toodledo.EditTasks([Task(id_=cache[2].id_, star=True)])
+        cache.update()
+        assert os.path.getsize(journal) > 0
+        reopened = Reopen()
+        assert _Tasks(reopened) == _Tasks(cache)
+        assert reopened.cache["newest"] == cache.cache["newest"]
+        assert added.id_ in [t.id_ for t in reopened]
+
+        # A partially written record is ignored and discarded
+        size = os.path.getsize(journal)
+        with open(journal, "ab") as f:
+            f.write(b"\x40\x00\x00\x00\x00\x00\x00\x00partial")
+        reopened = Reopen()
+        assert _Tasks(reopened) == _Tasks(cache)
+        assert os.path.getsize(journal) == size
+        reopened.EditTasks([Task(id_=added.id_, title="renamed")])
+        assert _Tasks(Reopen()) == _Tasks(reopened)
+
+        # The journal is folded into the snapshot when it gets too big
+        snapshotStore = _SnapshotStore()
+        reopened = Reopen(compactSize=1, snapshotStore=snapshotStore)
+        reopened.DeleteTasks([Task(id_=added.id_)])
+        assert os.path.getsize(journal) == 0 and snapshotStore.journal
+        assert _Tasks(Reopen()) == _Tasks(reopened)
+        # If the journal wasn't emptied after the snapshot was written,
+        # replaying it changes nothing.
+        with open(journal, "wb") as f:
+            f.write(snapshotStore.journal)
+        assert _Tasks(Reopen()) == _Tasks(reopened)
+
+
+def test_journaled_task_store_changes(tmp_path):
+    # Only the tasks TaskCache says have changed are journaled; with None,
+    # the whole cache is compared with what was stored.
+    path = str(tmp_path / "cache")
+    store = JournaledTaskStore()
+    store.Save(path, {"tasks": [ReadOnlyTask(id_=i, title=str(i))
+                                for i in range(3)], "newest": 1})
+    edited = ReadOnlyTask(id_=0, title="edited")
+    cache = {"tasks": [edited, ReadOnlyTask(id_=1, title="unreported")],
+             "newest": 2}
+    store.Changed(path, cache, [edited], {2, 3})
+    loaded = JournaledTaskStore().Load(path)
+    assert [t.title for t in loaded["tasks"]] == ["edited", "1"]
+    assert loaded["newest"] == 2
+    store.Changed(path, cache, None, None)
+    assert [t.title for t in JournaledTaskStore().Load(path)["tasks"]] == \
+        ["edited", "unreported"]
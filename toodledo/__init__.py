@@ -1,11 +1,25 @@
 """Python wrapper for the Toodledo v3 API which is documented at
 http://api.toodledo.com/3/"""
 
+from .async_transport import AsyncToodledo
 from .authorization import CommandLineAuthorization
 from .context import Context
+from .errors import ToodledoBulkError
+from .fake_server import FakeToodledoServer
 from .folder import Folder
+from .history import HistoryRecord
+from .json_backend import JsonBackend, OrjsonBackend
+from .metrics import InMemoryMetrics, PrometheusText
+from .rate_limit import TokenBucketRateLimiter
+from .retry import RetryPolicy
 from .storage import TokenStorageFile
-from .task import Task
+from .task import LazyTask, ReadOnlyTask, Task
 from .task_cache import TaskCache
+from .task_store import (
+    JournaledTaskStore,
+    PickleTaskStore,
+    SqliteTaskStore,
+    TaskStore,
+)
 from .transport import AuthorizationNeeded, Toodledo, ToodledoError
 from .types import DueDateModifier, Priority, Status
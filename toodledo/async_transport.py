@@ -0,0 +1,628 @@
+"""asyncio implementation"""
+
+import asyncio
+from collections import deque
+from contextlib import contextmanager
+import datetime
+from itertools import islice
+from json import dumps, loads
+import logging
+import time
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from .account import _AccountSchema
+from .context import _ContextSchema
+from .deleted_task import _DeletedTaskSchema
+from .folder import _FolderSchema
+from .history import RequestHistory
+from .json_backend import DefaultJsonBackend
+from .metrics import InMemoryMetrics
+from .task import _DumpTaskList
+from .transport import (
+    AuthorizationNeeded,
+    Toodledo,
+    _CheckError,
+    _CheckTaskErrors,
+    _ChunkResults,
+    _GetTasksParams,
+    _IsOffline,
+    _LoadTasks,
+    _SetBaseUrl,
+    _TaskPageOffsets,
+)
+
+
+async def _AcquireInExecutor(lock):
+    """Enter a blocking context manager lock without blocking the loop.
+
+    Waiting for another process blocks, so it's done in the executor. If
+    we're cancelled while waiting, the worker still gets the lock, so it's
+    released as soon as the worker has it."""
+    acquire = asyncio.get_running_loop().run_in_executor(
+        None, lock.__enter__)
+    try:
+        await asyncio.shield(acquire)
+    except asyncio.CancelledError:
+        def release(future):
+            if not future.cancelled() and future.exception() is None:
+                lock.__exit__(None, None, None)
+        acquire.add_done_callback(release)
+        raise
+
+
+class AsyncToodledoSession:
+    """Minimal OAuth2 session on top of aiohttp.
+
+    Like ToodledoSession, refreshes the token and retries when we get a 429
+    error."""
+
+    def __init__(self, clientId, clientSecret, token, tokenUpdater,
+                 historyCount=None, poolSize=100, rateLimiter=None,
+                 timeout=None, keepAlive=True, refreshMargin=None,
+                 tokenStorage=None, historyBodies="failures", metrics=None,
+                 tokenUrl=Toodledo.tokenUrl):
+        self.toodledo_logger = logging.getLogger(__name__)
+        self.toodledo_history = RequestHistory(historyCount, historyBodies)
+        self.clientId = clientId
+        self.clientSecret = clientSecret
+        self.token = token
+        self.tokenUpdater = tokenUpdater
+        self.poolSize = poolSize
+        self.rateLimiter = rateLimiter
+        self.timeout = timeout
+        self.keepAlive = keepAlive
+        self.refreshMargin = refreshMargin
+        self.tokenStorage = tokenStorage
+        self.metrics = metrics
+        self.tokenUrl = tokenUrl
+        self.__session = None
+        self.__refreshLock = None
+
+    @property
+    def _client(self):
+        # Created lazily because aiohttp sessions must be created inside the
+        # running event loop.
+        if self.__session is None:
+            if isinstance(self.timeout, tuple):
+                connectTimeout, readTimeout = self.timeout
+                timeout = aiohttp.ClientTimeout(
+                    total=None, sock_connect=connectTimeout,
+                    sock_read=readTimeout)
+            else:
+                timeout = aiohttp.ClientTimeout(total=self.timeout)
+            self.__session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.poolSize, force_close=not self.keepAlive),
+                timeout=timeout)
+        return self.__session
+
+    async def close(self):
+        """Close the underlying HTTP connections"""
+        if self.__session is not None:
+            await self.__session.close()
+            self.__session = None
+
+    @property
+    def toodledo_history_count(self):
+        return self.toodledo_history.maxlen
+
+    @toodledo_history_count.setter
+    def toodledo_history_count(self, count):
+        # Newest first, so keep the first `count` records
+        self.toodledo_history = RequestHistory(
+            count, self.toodledo_history.bodies,
+            islice(self.toodledo_history, count or 0))
+
+    def toodledo_save(self, response, body, started, retries, refreshes,
+                      method, url, params=None, **kwargs):
+        elapsed = time.perf_counter() - started
+        self.toodledo_history.Record(
+            method, url, response.status, body, elapsed, retries + refreshes,
+            params)
+        if self.metrics:
+            self.metrics.Record(url, response.status, len(body), elapsed,
+                                refreshes, b'"errorCode"' in body)
+
+    async def _wait(self):
+        if self.rateLimiter:
+            delay = self.rateLimiter.reserve()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+    async def _send(self, method, url, withholdToken=False, **kwargs):
+        await self._wait()
+        # The token request is authenticated by the client credentials in it
+        headers = {} if withholdToken else \
+            {"Authorization": f"Bearer {self.token['access_token']}"}
+        started = time.perf_counter()
+        try:
+            async with self._client.request(
+                    method, url, headers=headers, **kwargs) as response:
+                # Read the body before the connection is released so that
+                # the caller can still decode it afterward.
+                body = await response.read()
+        except Exception:
+            # See ToodledoSession.toodledo_send
+            if self.metrics:
+                self.metrics.Record(url, 0, 0, time.perf_counter() - started)
+            raise
+        return response, body
+
+    async def refresh_token(self, oldToken=None):
+        """Fetch a new token using the refresh token and save it.
+
+        If `oldToken` is specified and has already been replaced by the time
+        we get our turn to refresh, the new token is used instead. As in
+        ToodledoSession, if the token storage can be locked then the refresh
+        is coordinated with other processes sharing the storage."""
+        if self.__refreshLock is None:
+            self.__refreshLock = asyncio.Lock()
+        if oldToken is None:
+            oldToken = self.token
+        async with self.__refreshLock:
+            if self.token.get("access_token") != oldToken.get("access_token"):
+                # Somebody else refreshed it while we were waiting.
+                return self.token
+            storageLock = getattr(self.tokenStorage, "Lock", None)
+            if storageLock is None:
+                return await self._refresh_token()
+            lock = storageLock()  # pylint: disable=not-callable
+            await _AcquireInExecutor(lock)
+            try:
+                stored = self.tokenStorage.Load()
+                if stored and stored.get("access_token") != \
+                   oldToken.get("access_token"):
+                    self.toodledo_logger.debug(
+                        "Using token refreshed by another process")
+                    self.token = stored
+                    return stored
+                return await self._refresh_token()
+            finally:
+                lock.__exit__(None, None, None)
+
+    async def _refresh_token(self):
+        started = time.perf_counter()
+        response, body = await self._send(
+            "POST", self.tokenUrl, withholdToken=True,
+            data={
+                "grant_type": "refresh_token",
+                "refresh_token": self.token["refresh_token"],
+                "client_id": self.clientId,
+                "client_secret": self.clientSecret
+            })
+        # Recorded like any other request, as ToodledoSession does, so that
+        # refreshes and failed refreshes show up in the history and metrics
+        self.toodledo_save(response, body, started, 0, 0, "POST",
+                           self.tokenUrl)
+        response.raise_for_status()
+        token = loads(body)
+        _CheckError(self.toodledo_logger, token)
+        if "expires_in" in token:
+            token["expires_at"] = time.time() + int(token["expires_in"])
+        self.token = token
+        self.tokenUpdater(token)
+        return token
+
+    def expiring(self):
+        """See ToodledoSession.toodledo_expiring."""
+        if self.refreshMargin is None:
+            return False
+        expiresAt = self.token.get('expires_at')
+        if expiresAt is None:
+            return False
+        return time.time() + self.refreshMargin >= float(expiresAt)
+
+    async def request(self, method, url, toodledo_retries=0, **kwargs):
+        """Send a request, refreshing the token and retrying on a 429.
+
+        `toodledo_retries` is the number of times the caller has already
+        retried this request, for the history."""
+        started = time.perf_counter()
+        token = self.token
+        if self.expiring():
+            self.toodledo_logger.debug(
+                "Token expires at %s - refreshing", self.token['expires_at'])
+            await self.refresh_token(token)
+            token = self.token
+        response, body = await self._send(method, url, **kwargs)
+        if response.status != 429:
+            self.toodledo_save(response, body, started, toodledo_retries, 0,
+                               method, url, **kwargs)
+            return response
+        self.toodledo_logger.warning(
+            "Received 429 error - refreshing token and retrying")
+        await self.refresh_token(token)
+        response, body = await self._send(method, url, **kwargs)
+        self.toodledo_save(response, body, started, toodledo_retries, 1,
+                           method, url, **kwargs)
+        if response.status == 429:
+            response.raise_for_status()
+        return response
+
+    async def get(self, url, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request("POST", url, **kwargs)
+
+
+class AsyncToodledo:  # pylint: disable=too-many-public-methods
+    """asyncio wrapper for the Toodledo v3 API.
+
+    Has the same methods as the `Toodledo` class, but they are coroutines, so
+    many API calls can be in flight at once on a single event loop. Requires
+    the optional `aiohttp` dependency. Call `close()` (or use the object as an
+    async context manager) when you're done with it.
+
+    The constructor takes the same arguments as `Toodledo`, except that
+    `poolSize` defaults to 100."""
+    baseUrl = Toodledo.baseUrl
+    tokenUrl = Toodledo.tokenUrl
+    getAccountUrl = Toodledo.getAccountUrl
+    getTasksUrl = Toodledo.getTasksUrl
+    deleteTasksUrl = Toodledo.deleteTasksUrl
+    getDeletedTasksUrl = Toodledo.getDeletedTasksUrl
+    addTasksUrl = Toodledo.addTasksUrl
+    editTasksUrl = Toodledo.editTasksUrl
+    getFoldersUrl = Toodledo.getFoldersUrl
+    addFolderUrl = Toodledo.addFolderUrl
+    deleteFolderUrl = Toodledo.deleteFolderUrl
+    editFolderUrl = Toodledo.editFolderUrl
+    getContextsUrl = Toodledo.getContextsUrl
+    addContextUrl = Toodledo.addContextUrl
+    editContextUrl = Toodledo.editContextUrl
+    deleteContextUrl = Toodledo.deleteContextUrl
+
+    def __init__(  # pylint: disable=too-many-locals
+            self, clientId, clientSecret, tokenStorage, scope,
+            pageConcurrency=None, writeConcurrency=None, rateLimiter=None,
+            retryPolicy=None, poolSize=100, timeout=None, keepAlive=True,
+            refreshMargin=60, historyCount=None, historyBodies="failures",
+            metrics=None, baseUrl=None, jsonBackend=None,
+            lazyTasks=False):
+        if aiohttp is None:
+            raise ImportError(
+                "AsyncToodledo requires aiohttp; install toodledo[async]")
+        self.logger = logging.getLogger(__name__)
+        self.tokenStorage = tokenStorage
+        self.clientId = clientId
+        self.clientSecret = clientSecret
+        self.scope = scope
+        self.pageConcurrency = pageConcurrency
+        self.writeConcurrency = writeConcurrency
+        self.rateLimiter = rateLimiter
+        self.retryPolicy = retryPolicy
+        self.poolSize = poolSize
+        self.timeout = timeout
+        self.keepAlive = keepAlive
+        self.refreshMargin = refreshMargin
+        self.historyCount = historyCount
+        self.historyBodies = historyBodies
+        self.metrics = InMemoryMetrics() if metrics is None else metrics
+        self.jsonBackend = DefaultJsonBackend() if jsonBackend is None \
+            else jsonBackend
+        self.lazyTasks = lazyTasks
+        if baseUrl is not None:
+            _SetBaseUrl(self, baseUrl)
+        self.__session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def close(self):
+        """Close the underlying HTTP connections"""
+        if self.__session:
+            await self.__session.close()
+
+    @property
+    def _session(self):
+        if self.__session:
+            return self.__session
+        self.__session = self._Session()
+        return self.__session
+
+    def _Session(self):
+        token = self.tokenStorage.Load()
+        if token is None:
+            raise AuthorizationNeeded("No token in storage")
+
+        return AsyncToodledoSession(
+            self.clientId, self.clientSecret, token, self.tokenStorage.Save,
+            poolSize=self.poolSize,
+            rateLimiter=self.rateLimiter,
+            timeout=self.timeout,
+            keepAlive=self.keepAlive,
+            refreshMargin=self.refreshMargin,
+            tokenStorage=self.tokenStorage,
+            historyCount=self.historyCount,
+            historyBodies=self.historyBodies,
+            metrics=self.metrics,
+            tokenUrl=self.tokenUrl)
+
+    @property
+    def _history(self):
+        return self._session.toodledo_history
+
+    async def _Decode(self, response):
+        return await response.json(content_type=None,
+                                   loads=self.jsonBackend.Loads)
+
+    async def _Get(self, url, params=None):
+        """See Toodledo._Get."""
+        attempt = 0
+        while True:
+            retryAfter = None
+            try:
+                response = await self._session.get(
+                    url, params=params, toodledo_retries=attempt)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                reason = "timeout" if isinstance(e, asyncio.TimeoutError) \
+                    else "connection_error"
+                delay = self._RetryDelay(attempt, reason)
+                if delay is None:
+                    raise
+            else:
+                if self.retryPolicy and \
+                   response.status in self.retryPolicy.retryStatuses:
+                    reason = f"http_{response.status}"
+                    retryAfter = response.headers.get("Retry-After")
+                    delay = self._RetryDelay(attempt, reason, retryAfter)
+                    if delay is None:
+                        response.raise_for_status()
+                else:
+                    response.raise_for_status()
+                    jsonResponse = await self._Decode(response)
+                    if not _IsOffline(jsonResponse):
+                        return jsonResponse
+                    reason = "api_offline"
+                    delay = self._RetryDelay(attempt, reason)
+                    if delay is None:
+                        return jsonResponse
+            self.logger.warning("Retrying %s in %.1f seconds (%s)",
+                                url, delay, reason)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def _RetryDelay(self, attempt, reason, retryAfter=None):
+        if not self.retryPolicy:
+            return None
+        return self.retryPolicy.Delay(attempt, reason, retryAfter)
+
+    async def _Post(self, url, data):
+        response = await self._session.post(url, data=data)
+        response.raise_for_status()
+        return await self._Decode(response)
+
+    async def GetFolders(self):
+        """Get all the folders as folder objects"""
+        folders = await self._Get(self.getFoldersUrl)
+        schema = _FolderSchema()
+        return [schema.load(x) for x in folders]
+
+    async def AddFolder(self, folder):
+        """Add folder, return the created folder"""
+        jsonResponse = await self._Post(
+            self.addFolderUrl,
+            data={
+                "name": folder.name,
+                "private": 1 if folder.private else 0
+            })
+        _CheckError(self.logger, jsonResponse)
+        return _FolderSchema().load(jsonResponse[0])
+
+    async def DeleteFolder(self, folder):
+        """Delete folder"""
+        jsonResponse = await self._Post(self.deleteFolderUrl,
+                                        data={"id": folder.id_})
+        _CheckError(self.logger, jsonResponse)
+        assert jsonResponse == {"deleted": folder.id_}, dumps(jsonResponse)
+
+    async def EditFolder(self, folder):
+        """Edits the given folder to have the given properties"""
+        folderData = _FolderSchema().dump(folder)
+        jsonResponse = await self._Post(self.editFolderUrl,
+                                        data=folderData)
+        _CheckError(self.logger, jsonResponse)
+        return _FolderSchema().load(jsonResponse[0])
+
+    async def GetContexts(self):
+        """Get all the contexts as context objects"""
+        contexts = await self._Get(self.getContextsUrl)
+        schema = _ContextSchema()
+        return [schema.load(x) for x in contexts]
+
+    async def AddContext(self, context):
+        """Add context, return the created context"""
+        jsonResponse = await self._Post(
+            self.addContextUrl,
+            data={
+                "name": context.name,
+                "private": 1 if context.private else 0
+            })
+        _CheckError(self.logger, jsonResponse)
+        return _ContextSchema().load(jsonResponse[0])
+
+    async def DeleteContext(self, context):
+        """Delete context"""
+        jsonResponse = await self._Post(self.deleteContextUrl,
+                                        data={"id": context.id_})
+        _CheckError(self.logger, jsonResponse)
+        assert jsonResponse == {"deleted": context.id_}, dumps(jsonResponse)
+
+    async def EditContext(self, context):
+        """Edits the given context to have the given properties"""
+        contextData = _ContextSchema().dump(context)
+        jsonResponse = await self._Post(self.editContextUrl,
+                                        data=contextData)
+        _CheckError(self.logger, jsonResponse)
+        return _ContextSchema().load(jsonResponse[0])
+
+    async def GetAccount(self):
+        """Get the Toodledo account"""
+        accountInfo = await self._Get(self.getAccountUrl)
+        return _AccountSchema().load(accountInfo)
+
+    async def GetTasks(self, params=None, before=None, after=None, comp=None,
+                       id_=None, fields=None):
+        """See Toodledo.GetTasks."""
+        return [task async for task in self.IterTasks(
+            params, before, after, comp, id_, fields)]
+
+    async def IterTasks(  # pylint: disable=too-many-branches
+            self, params=None, before=None, after=None, comp=None, id_=None,
+            fields=None):
+        """See Toodledo.IterTasks."""
+        params = _GetTasksParams(params, before, after, comp, id_, fields)
+        # aiohttp, unlike requests, doesn't accept floats in params
+        params = {k: str(v) for k, v in params.items()}
+        limit = 1000  # single request limit
+        tasks = await self._GetTasksPage(params, 0, limit)
+        offsets = _TaskPageOffsets(tasks, limit)
+        if offsets and self.pageConcurrency:
+            offsets = iter(offsets)
+            pending = deque(
+                asyncio.ensure_future(
+                    self._GetTasksPage(params, start, limit))
+                for start in islice(offsets, self.pageConcurrency))
+            try:
+                for task in _LoadTasks(tasks[1:], self.lazyTasks):
+                    yield task
+                while pending:
+                    tasks = await pending.popleft()
+                    # Keep pageConcurrency requests in flight while the
+                    # caller is working on this page.
+                    for start in islice(offsets, 1):
+                        pending.append(asyncio.ensure_future(
+                            self._GetTasksPage(params, start, limit)))
+                    for task in _LoadTasks(tasks[1:], self.lazyTasks):
+                        yield task
+            finally:
+                for future in pending:
+                    future.cancel()
+            return
+        for task in _LoadTasks(tasks[1:], self.lazyTasks):
+            yield task
+        if offsets:
+            for start in offsets:
+                tasks = await self._GetTasksPage(params, start, limit)
+                for task in _LoadTasks(tasks[1:], self.lazyTasks):
+                    yield task
+        elif offsets is None:
+            start = 0
+            while len(tasks) - 1 == limit:
+                start += limit
+                tasks = await self._GetTasksPage(params, start, limit)
+                for task in _LoadTasks(tasks[1:], self.lazyTasks):
+                    yield task
+
+    async def _GetTasksPage(self, params, start, limit):
+        self.logger.debug("Start: %d", start)
+        params = dict(params, start=str(start), num=str(limit))
+        tasks = await self._Get(self.getTasksUrl, params=params)
+        _CheckError(self.logger, tasks)
+        # the first field contains the count or the error code
+        self.logger.debug("Retrieved %d tasks", len(tasks) - 1)
+        return tasks
+
+    async def GetDeletedTasks(self, after):
+        """See Toodledo.GetDeletedTasks."""
+        if isinstance(after, datetime.datetime):
+            after = after.timestamp()
+        deleted = await self._Get(self.getDeletedTasksUrl,
+                                  params={'after': str(after)})
+        _CheckError(self.logger, deleted)
+        # the first field contains the count or the error code
+        self.logger.debug("Retrieved %d deleted tasks", len(deleted) - 1)
+        schema = _DeletedTaskSchema()
+        return [schema.load(x) for x in deleted[1:]]
+
+    async def _WriteTasks(self, url, taskList):
+        taskList = iter(taskList)  # See Toodledo.EditTasks
+        limit = 50  # single request limit
+        chunks = iter(lambda: _DumpTaskList(list(islice(taskList, limit))),
+                      [])
+        responses = []
+        for response in await self._PostChunks(
+                lambda listDump: self._PostTasks(url, listDump), chunks):
+            responses.extend(response)
+        return responses
+
+    async def _PostTasks(self, url, listDump):
+        taskResponse = await self._Post(
+            url, data={"tasks": self.jsonBackend.Dumps(listDump)})
+        _CheckTaskErrors(taskResponse)
+        return _LoadTasks(taskResponse)
+
+    async def EditTasks(self, taskList):
+        """See Toodledo.EditTasks."""
+        return await self._WriteTasks(self.editTasksUrl, taskList)
+
+    async def AddTasks(self, taskList):
+        """See Toodledo.AddTasks."""
+        return await self._WriteTasks(self.addTasksUrl, taskList)
+
+    async def DeleteTasks(self, taskList):
+        """See Toodledo.DeleteTasks."""
+        if len(taskList) == 0:
+            return
+        taskIdList = [task.id_ for task in taskList]
+        limit = 50  # single request limit
+        chunks = (taskIdList[start:start + limit]
+                  for start in range(0, len(taskIdList), limit))
+        await self._PostChunks(self._DeleteTasks, chunks)
+
+    async def _DeleteTasks(self, taskIdList):
+        jsonResponse = await self._Post(
+            self.deleteTasksUrl,
+            data={"tasks": self.jsonBackend.Dumps(taskIdList)})
+        _CheckError(self.logger, jsonResponse)
+
+    async def _PostChunks(self, post, chunks):
+        """See Toodledo._PostChunks."""
+        if not self.writeConcurrency:
+            results = []
+            start = 0
+            for chunk in chunks:
+                self.logger.debug("Start: %d", start)
+                results.append(await post(chunk))
+                start += len(chunk)
+            return results
+        chunks = list(chunks)
+        semaphore = asyncio.Semaphore(self.writeConcurrency)
+
+        async def postChunk(chunk):
+            async with semaphore:
+                return await post(chunk)
+
+        outcomes = await asyncio.gather(
+            *(postChunk(chunk) for chunk in chunks), return_exceptions=True)
+        failed = [isinstance(outcome, Exception) for outcome in outcomes]
+        return _ChunkResults(
+            chunks,
+            [outcome if fail else None
+             for outcome, fail in zip(outcomes, failed)],
+            [None if fail else outcome
+             for outcome, fail in zip(outcomes, failed)])
+
+    async def save(self):
+        """No-op for drop-in compatibility with TaskCache"""
+
+    async def load_from_path(self, path=None):
+        """No-op for drop-in compatibility with TaskCache"""
+
+    async def dump_to_path(self, path=None):
+        """No-op for drop-in compatibility with TaskCache"""
+
+    @contextmanager
+    def caching_everything(self):
+        yield
+
+    async def update(self):
+        """No-op for drop-in compatibility with TaskCache"""
@@ -0,0 +1,291 @@
+"""Fast conversion between raw API dicts and objects, bypassing marshmallow
+
+A _SchemaCodec generates and compiles a specialized load function for each
+set of keys it sees in raw dicts, and a dump function for the schema's
+objects. The generated functions check all the values and convert them in
+a single pass. If any value is one they don't
+handle exactly as the schema would, e.g. because it's invalid, the schema
+itself is used instead, so the results, and the errors, are always the same
+as the schema's.
+"""
+
+from datetime import date, datetime, timezone
+from functools import lru_cache, partial
+
+from marshmallow import fields
+from marshmallow.validate import Length
+
+from .custom_fields import (
+    _ToodledoBoolean,
+    _ToodledoDate,
+    _ToodledoDatetime,
+    _ToodledoDueDateModifier,
+    _ToodledoFloatingDatetime,
+    _ToodledoInteger,
+    _ToodledoListId,
+    _ToodledoPriority,
+    _ToodledoRemind,
+    _ToodledoStatus,
+    _ToodledoTags,
+)
+from .types import DueDateModifier, Priority, Status
+
+# Most distinct key sets a codec compiles load functions for; any others are
+# handled by the schema
+MAX_COMPILED = 256
+
+_UNSET = object()
+
+
+@lru_cache(maxsize=4096)
+def _LoadDate(value):
+    # Dates are all noon timestamps, so there are few distinct ones
+    if value == 0:
+        return None
+    return datetime.utcfromtimestamp(float(value)).date()
+
+
+def _LoadDatetime(value):
+    if value == 0:
+        return None
+    return datetime.utcfromtimestamp(float(value)).replace(
+        tzinfo=timezone.utc)
+
+
+def _LoadFloatingDatetime(value):
+    if value == 0:
+        return None
+    return datetime.utcfromtimestamp(float(value))
+
+
+def _LoadTags(value):
+    if value == "":
+        return []
+    return [x.strip() for x in value.split(",")]
+
+
+@lru_cache(maxsize=4096)
+def _DumpDate(value):
+    if value is None:
+        return 0
+    return datetime(year=value.year, month=value.month, day=value.day,
+                    hour=12, minute=0, tzinfo=timezone.utc).timestamp()
+
+
+def _DumpDatetime(value):
+    if value is None:
+        return 0
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+
+_NAMESPACE = {
+    "_NUMBERS": frozenset((int, float)),
+    "_date": date,
+    "_datetime": datetime,
+    "_LoadDate": _LoadDate,
+    "_LoadDatetime": _LoadDatetime,
+    "_LoadFloatingDatetime": _LoadFloatingDatetime,
+    "_LoadTags": _LoadTags,
+    "_DumpDate": _DumpDate,
+    "_DumpDatetime": _DumpDatetime,
+    "_Priority": Priority,
+    "_DueDateModifier": DueDateModifier,
+    "_Status": Status,
+    "_PRIORITIES": {member.value: member for member in Priority},
+    "_DUE_DATE_MODIFIERS": {member.value: member
+                            for member in DueDateModifier},
+    "_STATUSES": {member.value: member for member in Status},
+}
+
+# For each field class, the condition under which the generated code can
+# convert a value, and the expression that converts it, for loading and for
+# dumping. Only exact classes are looked up, since subclasses behave
+# differently.
+_LOAD = {
+    fields.Integer: ("type({v}) is int", "{v}"),
+    fields.String: ("type({v}) is str", "{v}"),
+    _ToodledoTags: ("type({v}) is str", "_LoadTags({v})"),
+    _ToodledoDate: ("type({v}) in _NUMBERS", "_LoadDate({v})"),
+    _ToodledoDatetime: ("type({v}) in _NUMBERS", "_LoadDatetime({v})"),
+    _ToodledoFloatingDatetime: ("type({v}) in _NUMBERS",
+                                "_LoadFloatingDatetime({v})"),
+    _ToodledoBoolean: ("type({v}) is int and 0 <= {v} <= 1", "{v} == 1"),
+    _ToodledoListId: ("type({v}) is int", "{v} or None"),
+    _ToodledoPriority: ("type({v}) is int and {v} in _PRIORITIES",
+                        "_PRIORITIES[{v}]"),
+    _ToodledoDueDateModifier: (
+        "type({v}) is int and {v} in _DUE_DATE_MODIFIERS",
+        "_DUE_DATE_MODIFIERS[{v}]"),
+    _ToodledoStatus: ("type({v}) is int and {v} in _STATUSES",
+                      "_STATUSES[{v}]"),
+    _ToodledoInteger: ("{v} is not None", "None if {v} == 0 else {v}"),
+    _ToodledoRemind: ("type({v}) is int and {v} >= 0", "{v}"),
+}
+
+_DUMP = {
+    fields.Integer: ("{v} is None or type({v}) is int", "{v}"),
+    fields.String: ("{v} is None or type({v}) is str", "{v}"),
+    _ToodledoTags: ("type({v}) is list", "', '.join(sorted({v}))"),
+    _ToodledoDate: ("{v} is None or type({v}) is _date", "_DumpDate({v})"),
+    _ToodledoDatetime: ("{v} is None or type({v}) is _datetime",
+                        "_DumpDatetime({v})"),
+    _ToodledoFloatingDatetime: ("{v} is None or type({v}) is _datetime",
+                                "_DumpDatetime({v})"),
+    _ToodledoBoolean: ("type({v}) is bool", "1 if {v} else 0"),
+    _ToodledoListId: ("{v} is None or type({v}) is int",
+                      "0 if {v} is None else {v}"),
+    _ToodledoPriority: ("type({v}) is _Priority", "{v}.value"),
+    _ToodledoDueDateModifier: ("type({v}) is _DueDateModifier", "{v}.value"),
+    _ToodledoStatus: ("type({v}) is _Status", "{v}.value"),
+    _ToodledoInteger: ("{v} is None or type({v}) is int",
+                       "0 if {v} is None else {v}"),
+    _ToodledoRemind: ("type({v}) is int and {v} >= 0", "{v}"),
+}
+
+
+def _LoadCondition(field):
+    """Return the load condition for a field, including its validators and
+    whether it allows None, or None if the field can't be compiled"""
+    if type(field) not in _LOAD:  # pylint: disable=unidiomatic-typecheck
+        return None
+    condition = _LOAD[type(field)][0]
+    for validator in field.validators:
+        if not isinstance(validator, Length) or validator.equal is not None:
+            return None
+        if validator.min is not None:
+            condition += f" and len({{v}}) >= {validator.min}"
+        if validator.max is not None:
+            condition += f" and len({{v}}) <= {validator.max}"
+    if field.allow_none:
+        condition = f"{{v}} is None or ({condition})"
+    return condition
+
+
+class _SchemaCodec:
+    """Load and dump objects like a schema does, but faster.
+
+    Required arguments:
+    schema -- marshmallow schema instance, which must create objects of
+              `cls` in a post_load hook
+    cls -- class of the loaded objects, which must take the loaded fields
+           as keyword arguments
+    """
+
+    def __init__(self, schema, cls):
+        self.schema = schema
+        self.cls = cls
+        # (attribute, key, field) in the order the schema processes them
+        self._fields = [(field.attribute or name, field.data_key or name,
+                         field)
+                        for name, field in schema.fields.items()]
+        self._loaders = {}
+        self._dumper = None
+
+    def _Compile(self, name, lines, fallback):
+        source = "\n".join(lines)
+        namespace = dict(_NAMESPACE, _cls=self.cls, _fallback=fallback,
+                         _getattr=getattr, _UNSET=_UNSET)
+        exec(compile(  # pylint: disable=exec-used
+            source, f"<{type(self).__name__} {name}>", "exec"), namespace)
+        return namespace[name]
+
+    def _CompileLoader(self, keys):
+        if not keys <= {key for _, key, _ in self._fields}:
+            # The schema raises an error about the unknown keys
+            return self.schema.load
+        lines = ["def load(raw):"]
+        conditions = []
+        arguments = []
+        for i, (attribute, key, field) in enumerate(self._fields):
+            if key not in keys:
+                continue
+            condition = _LoadCondition(field)
+            if condition is None:
+                return self.schema.load
+            expression = _LOAD[type(field)][1]
+            if field.allow_none:
+                expression = f"None if {{v}} is None else {expression}"
+            lines.append(f"    v{i} = raw[{key!r}]")
+            conditions.append(f"({condition.format(v=f'v{i}')})")
+            arguments.append(
+                f"{attribute}=({expression.format(v=f'v{i}')})")
+        if conditions:
+            lines.append(f"    if not ({' and '.join(conditions)}):")
+            lines.append("        return _fallback(raw)")
+        lines.append(f"    return _cls({', '.join(arguments)})")
+        return self._Compile("load", lines, self.schema.load)
+
+    def _CompileDumper(self):
+        # Attributes are read with getattr, as the schema does, and those
+        # that aren't set are left out.
+        lines = ["def dump(obj):", "    out = {}"]
+        for i, (attribute, key, field) in enumerate(self._fields):
+            if type(field) not in _DUMP:
+                return self.schema.dump
+            condition, expression = _DUMP[type(field)]
+            value = f"v{i}"
+            lines.extend([
+                f"    {value} = _getattr(obj, {attribute!r}, _UNSET)",
+                f"    if {value} is not _UNSET:",
+                f"        if not ({condition.format(v=value)}):",
+                "            return _fallback(obj)",
+                f"        out[{key!r}] = {expression.format(v=value)}"])
+        lines.append("    return out")
+        return self._Compile("dump", lines, self.schema.dump)
+
+    def FieldLoaders(self):
+        """Return a dict mapping each attribute to its key in raw dicts and a
+        function that converts a raw value of it as the schema would"""
+        loaders = {}
+        for attribute, key, field in self._fields:
+            fallback = partial(self._LoadField, attribute, key)
+            condition = _LoadCondition(field)
+            if condition is None:
+                loaders[attribute] = (key, fallback)
+                continue
+            expression = _LOAD[type(field)][1]
+            if field.allow_none:
+                expression = f"None if {{v}} is None else {expression}"
+            lines = ["def load(v):",
+                     f"    if not ({condition.format(v='v')}):",
+                     "        return _fallback(v)",
+                     f"    return {expression.format(v='v')}"]
+            loaders[attribute] = (key, self._Compile("load", lines, fallback))
+        return loaders
+
+    def _LoadField(self, attribute, key, value):
+        # Loading the field on its own raises the same errors as loading it
+        # with the rest of the object
+        return getattr(self.schema.load({key: value}), attribute)
+
+    def Load(self, raw):
+        """Convert a raw dict to an object, like `schema.load`"""
+        if type(raw) is not dict:  # pylint: disable=unidiomatic-typecheck
+            return self.schema.load(raw)
+        keys = frozenset(raw)
+        try:
+            loader = self._loaders[keys]
+        except KeyError:
+            if len(self._loaders) >= MAX_COMPILED:
+                return self.schema.load(raw)
+            loader = self._loaders[keys] = self._CompileLoader(keys)
+        return loader(raw)
+
+    def LoadMany(self, rawList):
+        """Convert raw dicts to objects"""
+        load = self.Load
+        return [load(raw) for raw in rawList]
+
+    def Dump(self, obj):
+        """Convert an object to a dict, like `schema.dump`"""
+        # The schema reads mappings by key rather than by attribute.
+        if not isinstance(obj, self.cls) or hasattr(obj, "__getitem__"):
+            return self.schema.dump(obj)
+        if self._dumper is None:
+            self._dumper = self._CompileDumper()
+        return self._dumper(obj)
+
+    def DumpMany(self, objList):
+        """Convert objects to dicts"""
+        dump = self.Dump
+        return [dump(obj) for obj in objList]
@@ -102,11 +102,7 @@ class _ToodledoPriority(fields.Field):
     def _deserialize(self, value, attr, data, partial=True, **kwargs):
         assert isinstance(value, int)
         assert -1 <= value <= 3
-        for enumValue in Priority:
-            if enumValue.value == value:
-                return enumValue
-        assert False, "Bad incoming integer for priority enum"
-        return None
+        return Priority(value)
 
 
 class _ToodledoDueDateModifier(fields.Field):
@@ -117,11 +113,7 @@ class _ToodledoDueDateModifier(fields.Field):
     def _deserialize(self, value, attr, data, partial=True, **kwargs):
         assert isinstance(value, int)
         assert 0 <= value <= 3
-        for enumValue in DueDateModifier:
-            if enumValue.value == value:
-                return enumValue
-        assert False, "Bad incoming integer for due date modifier enum"
-        return None
+        return DueDateModifier(value)
 
 
 class _ToodledoStatus(fields.Field):
@@ -132,11 +124,7 @@ class _ToodledoStatus(fields.Field):
     def _deserialize(self, value, attr, data, partial=True, **kwargs):
         assert isinstance(value, int)
         assert 0 <= value <= 10
-        for enumValue in Status:
-            if enumValue.value == value:
-                return enumValue
-        assert False, "Bad incoming integer for status enum"
-        return None
+        return Status(value)
 
 
 class _ToodledoInteger(fields.Integer):
@@ -48,3 +48,23 @@ class ToodledoError(Exception):
         errorMessage = ToodledoError.errorCodeToMessage.get(
             errorCode, "Unknown error")
         super().__init__(errorMessage, errorCode)
+
+
+class ToodledoBulkError(Exception):
+    """Raised when some of the chunks of a parallel bulk write fail.
+
+    `errors` maps the index in the input of the first task in each failed
+    chunk to the exception for that chunk, and `ends` maps it to the index
+    of the last task in the chunk. `results` has one entry per chunk, in
+    input order: the chunk's result if it succeeded, or None if it failed.
+    """
+
+    def __init__(self, errors, results, ends):
+        self.errors = errors
+        self.results = results
+        self.ends = ends
+        failures = "; ".join(
+            f"tasks {start}-{ends[start]}: {error!r}"
+            for start, error in sorted(errors.items()))
+        super().__init__(
+            f"{len(errors)} of {len(results)} chunks failed: {failures}")
@@ -0,0 +1,649 @@
+"""Fake Toodledo API server for offline testing and benchmarking"""
+
+import calendar
+from collections import Counter, deque
+import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import count
+from json import dumps, loads
+import os
+import random
+import secrets
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+
+from .async_transport import AsyncToodledo
+from .errors import ToodledoError
+from .transport import Toodledo
+
+# Every field stored for a task, with the value the API uses for "not set"
+_TASK_FIELDS = {
+    "title": "", "tag": "", "folder": 0, "context": 0, "startdate": 0,
+    "duedate": 0, "duedatemod": 0, "starttime": 0, "duetime": 0,
+    "remind": 0, "repeat": "", "status": 0, "star": 0, "priority": 0,
+    "length": 0, "note": "", "parent": 0, "meta": "", "completed": 0,
+    "modified": 0,
+}
+_TEXT_FIELDS = frozenset(("title", "tag", "repeat", "note", "meta"))
+# Fields the API always returns for a task
+_STANDARD_FIELDS = ("id", "title", "modified", "completed")
+# Fields that move with the due date when a repeating task is rescheduled
+_DATE_FIELDS = ("startdate", "duedate", "starttime", "duetime")
+# Maximum number of tasks per write and per page
+_WRITE_LIMIT = 50
+_PAGE_LIMIT = 1000
+# Error codes of the list types are offset from these
+_LIST_ERRORS = {"folder": 200, "context": 300}
+
+
+class _ApiError(Exception):
+    def __init__(self, code, status=200):
+        super().__init__(code)
+        self.code = code
+        self.status = status
+
+    def Response(self, **extra):
+        return {"errorCode": self.code,
+                "errorDesc": ToodledoError.errorCodeToMessage.get(
+                    self.code, "Unknown error"),
+                **extra}
+
+
+def _Int(value):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError) as e:
+        raise _ApiError(611) from e
+
+
+def _DateOf(stamp):
+    return datetime.datetime.fromtimestamp(
+        stamp, datetime.timezone.utc).date()
+
+
+def _AddMonths(date, months):
+    month = date.month - 1 + months
+    year = date.year + month // 12
+    month = month % 12 + 1
+    return date.replace(year=year, month=month,
+                        day=min(date.day, calendar.monthrange(year, month)[1]))
+
+
+def _NextDate(repeat, date):
+    """Return the occurrence of a repeat rule after `date`, or None if the
+    rule isn't understood.
+
+    Understands the FREQ and INTERVAL parts of iCalendar rules, e.g.
+    "FREQ=WEEKLY;INTERVAL=2", as well as bare frequencies such as "DAILY"."""
+    parts = repeat.upper().replace(" ", "").split(";")
+    rule = dict(part.split("=", 1) for part in parts if "=" in part)
+    frequency = rule.get("FREQ", parts[0])
+    try:
+        interval = int(rule.get("INTERVAL", 1))
+    except ValueError:
+        return None
+    if frequency == "DAILY":
+        return date + datetime.timedelta(days=interval)
+    if frequency == "WEEKLY":
+        return date + datetime.timedelta(weeks=interval)
+    if frequency == "MONTHLY":
+        return _AddMonths(date, interval)
+    if frequency == "YEARLY":
+        return _AddMonths(date, 12 * interval)
+    return None
+
+
+def _TaskView(task, fields):
+    return {name: task[name] for name in _STANDARD_FIELDS + fields}
+
+
+class _TokenStorage:
+    """Keeps the token issued by the fake server in memory"""
+
+    def __init__(self, token):
+        self.token = token
+
+    def Load(self):
+        return self.token
+
+    def Save(self, token):
+        self.token = token
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # The headers and body are sent separately, so without this every
+    # response would wait for a delayed ACK from the client.
+    disable_nagle_algorithm = True
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        url = urlsplit(self.path)
+        params = parse_qs(url.query, keep_blank_values=True)
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            for name, values in parse_qs(
+                    self.rfile.read(length).decode("utf-8"),
+                    keep_blank_values=True).items():
+                params.setdefault(name, []).extend(values)
+        status, body, headers = self.server.toodledo.Respond(
+            url.path, {name: values[-1] for name, values in params.items()},
+            self.headers.get("Authorization"))
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_POST = do_GET
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Enough for load tests with many concurrent connections
+    request_queue_size = 128
+
+    def __init__(self, address, toodledo):
+        self.toodledo = toodledo
+        super().__init__(address, _Handler)
+
+
+class FakeToodledoServer:  # pylint: disable=too-many-public-methods
+    """In-process stand-in for the Toodledo v3 API.
+
+    Serves the endpoints used by `Toodledo` and `AsyncToodledo` over HTTP on
+    the loopback interface, from an in-memory account, so that the clients
+    and caches can be tested and benchmarked offline. It emulates
+    pagination, the 50-task write limit, the API's error codes, the
+    `lastedit_*` watermarks, rescheduling of repeating tasks, and the
+    per-token request limit. Latency and failures can be injected.
+
+    Use it as a context manager, or call `Start` and `Stop`. `Client` and
+    `AsyncClient` return API objects connected to the server. Since the
+    server doesn't use TLS, starting it sets OAUTHLIB_INSECURE_TRANSPORT in
+    the environment so that oauthlib will talk to it.
+
+    Timestamps are whole seconds, as in the API, but every write gets a
+    timestamp later than the previous write, so `after` queries against a
+    watermark never miss a write made in the same second."""
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0,
+                 failureRate=0.0, requestsPerToken=None, tokenLifetime=7200,
+                 clock=time.time):
+        """Initialize a new fake server.
+
+        Keyword arguments:
+        host -- address to listen on (default: "127.0.0.1")
+        port -- port to listen on (default: any free port)
+        latency -- seconds to wait before handling each request, or a
+                   function that takes the endpoint, e.g. "tasks/get.php",
+                   and returns the number of seconds (default: 0)
+        failureRate -- fraction of API requests, chosen at random, that
+                       fail with a 429 error (default: 0)
+        requestsPerToken -- (int) number of API requests allowed per access
+                            token before the server returns 429 errors, as
+                            the real API does (default: unlimited)
+        tokenLifetime -- seconds until access tokens expire (default: 7200)
+        clock -- function returning the current time in seconds
+                 (default: time.time)
+        """
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.failureRate = failureRate
+        self.requestsPerToken = requestsPerToken
+        self.tokenLifetime = tokenLifetime
+        self.clock = clock
+        # Number of requests received, by endpoint
+        self.requests = Counter()
+        self._lock = threading.Lock()
+        self._failures = deque()
+        self._ids = count(1)
+        self._accessTokens = {}
+        self._refreshTokens = set()
+        self._tasks = {}
+        self._deleted = []
+        self._lists = {"folder": {}, "context": {}}
+        now = self._lastStamp = int(clock())
+        self._account = {
+            "userid": "td0fake0user", "alias": "fake", "email":
+            "fake@example.com", "pro": 1, "dateformat": 0, "timezone": 0,
+            "hidemonths": 0, "hotlistpriority": 3, "hotlistduedate": 2,
+            "hotliststar": 0, "hotliststatus": 0, "showtabnums": 1,
+            "lastedit_task": now, "lastdelete_task": now,
+            "lastedit_folder": now, "lastedit_context": now,
+            "lastedit_goal": now, "lastedit_location": now,
+            "lastedit_note": now, "lastdelete_note": now,
+            "lastedit_list": now, "lastedit_outline": now,
+        }
+        self._endpoints = {
+            "account/token.php": self._Token,
+            "account/get.php": lambda params: dict(self._account),
+            "tasks/get.php": self._GetTasks,
+            "tasks/add.php": self._AddTasks,
+            "tasks/edit.php": self._EditTasks,
+            "tasks/delete.php": self._DeleteTasks,
+            "tasks/deleted.php": self._GetDeletedTasks,
+            "folders/get.php": lambda params: self._GetList("folder"),
+            "folders/add.php": lambda params: self._AddList("folder", params),
+            "folders/edit.php":
+            lambda params: self._EditList("folder", params),
+            "folders/delete.php":
+            lambda params: self._DeleteList("folder", params),
+            "contexts/get.php": lambda params: self._GetList("context"),
+            "contexts/add.php":
+            lambda params: self._AddList("context", params),
+            "contexts/edit.php":
+            lambda params: self._EditList("context", params),
+            "contexts/delete.php":
+            lambda params: self._DeleteList("context", params),
+        }
+        self._server = None
+        self._thread = None
+
+    def __enter__(self):
+        return self.Start()
+
+    def __exit__(self, *args):
+        self.Stop()
+
+    def Start(self):
+        """Start serving requests in a background thread"""
+        os.environ.setdefault("OAUTHLIB_INSECURE_TRANSPORT", "1")
+        self._server = _Server((self.host, self.port), self)
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="FakeToodledoServer",
+            daemon=True)
+        self._thread.start()
+        return self
+
+    def Stop(self):
+        """Stop serving requests"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = self._thread = None
+
+    @property
+    def baseUrl(self):
+        """Base URL of the API, to pass as `baseUrl` to the clients"""
+        return f"http://{self.host}:{self.port}/3/"
+
+    def IssueToken(self, scope="basic tasks notes folders write"):
+        """Return a new token for the account, as returned by the token
+        endpoint plus the `expires_at` time that oauthlib adds"""
+        token = self._NewToken(scope)
+        token["expires_at"] = self.clock() + token["expires_in"]
+        return token
+
+    def Client(self, **kwargs):
+        """Return a `Toodledo` object connected to this server.
+
+        The keyword arguments are passed to `Toodledo`; clientId,
+        clientSecret, tokenStorage, and scope have defaults."""
+        return Toodledo(**self._ClientArgs(kwargs))
+
+    def AsyncClient(self, **kwargs):
+        """Return an `AsyncToodledo` object connected to this server, as for
+        `Client`"""
+        return AsyncToodledo(**self._ClientArgs(kwargs))
+
+    def _ClientArgs(self, kwargs):
+        kwargs.setdefault("clientId", "fake")
+        kwargs.setdefault("clientSecret", "fake")
+        kwargs.setdefault("scope", "basic tasks notes folders write")
+        if "tokenStorage" not in kwargs:
+            kwargs["tokenStorage"] = _TokenStorage(
+                self.IssueToken(kwargs["scope"]))
+        kwargs["baseUrl"] = self.baseUrl
+        return kwargs
+
+    def InjectFailures(self, count=1,  # pylint: disable=redefined-outer-name
+                       status=429, errorCode=None, retryAfter=None):
+        """Make the next `count` API requests fail.
+
+        Keyword arguments:
+        count -- number of requests to fail (default: 1)
+        status -- HTTP status of the failed responses (default: 429)
+        errorCode -- Toodledo error code to return in the body of the failed
+                     responses, e.g. 4 for "API offline" (default: none for
+                     5xx statuses, 3 for 429 errors)
+        retryAfter -- value of the Retry-After header of the failed
+                      responses (default: no header)
+        """
+        if errorCode is None and status == 429:
+            errorCode = 3
+        with self._lock:
+            self._failures.extend([(status, errorCode, retryAfter)] * count)
+
+    def AddTasks(self, tasks):
+        """Add tasks directly to the account, bypassing the write limit, and
+        return their ids.
+
+        Required arguments:
+        tasks -- iterable of task dicts in the form sent to the API
+        """
+        with self._lock:
+            stamp = self._Stamp()
+            ids = []
+            for raw in tasks:
+                task = dict(_TASK_FIELDS, modified=stamp)
+                task.update(self._TaskValues(raw))
+                task["id"] = next(self._ids)
+                self._tasks[task["id"]] = task
+                ids.append(task["id"])
+            self._account["lastedit_task"] = stamp
+            return ids
+
+    def AddFolder(self, name, private=False, archived=False):
+        """Add a folder directly to the account and return its id"""
+        with self._lock:
+            folder = self._AddList("folder", {"name": name,
+                                              "private": int(private)})[0]
+            folder["archived"] = int(archived)
+            return folder["id"]
+
+    def AddContext(self, name, private=False):
+        """Add a context directly to the account and return its id"""
+        with self._lock:
+            return self._AddList("context", {"name": name,
+                                             "private": int(private)})[0]["id"]
+
+    def Tasks(self):
+        """Return copies of the tasks in the account, as dicts in the form
+        returned by the API with all fields"""
+        with self._lock:
+            return [dict(task) for task in self._tasks.values()]
+
+    def Respond(self, path, params, authorization=None):
+        """Handle a request and return the status, body, and headers of the
+        response. Called by the HTTP request handler."""
+        endpoint = path.rpartition("/3/")[2]
+        handler = self._endpoints.get(endpoint)
+        if handler is None:
+            return 404, b"", {}
+        # Requests are handled in threads of their own
+        with self._lock:
+            self.requests[endpoint] += 1
+        delay = self.latency(endpoint) if callable(self.latency) \
+            else self.latency
+        if delay:
+            time.sleep(delay)
+        with self._lock:
+            try:
+                if endpoint != "account/token.php":
+                    failure = self._Failure()
+                    if failure:
+                        return failure
+                    self._Authorize(params, authorization)
+                body = handler(params)
+            except _ApiError as e:
+                return e.status, dumps(e.Response()).encode("utf-8"), {}
+        return 200, dumps(body).encode("utf-8"), {}
+
+    def _Failure(self):
+        if self._failures:
+            status, errorCode, retryAfter = self._failures.popleft()
+        elif self.failureRate and random.random() < self.failureRate:
+            status, errorCode, retryAfter = 429, 3, None
+        else:
+            return None
+        body = b"" if errorCode is None else \
+            dumps(_ApiError(errorCode).Response()).encode("utf-8")
+        headers = {} if retryAfter is None else \
+            {"Retry-After": str(retryAfter)}
+        return status, body, headers
+
+    def _Authorize(self, params, authorization):
+        accessToken = params.get("access_token")
+        if authorization and authorization.startswith("Bearer "):
+            accessToken = authorization[len("Bearer "):]
+        if not accessToken:
+            raise _ApiError(1)
+        token = self._accessTokens.get(accessToken)
+        if token is None or token["expires"] <= self.clock():
+            raise _ApiError(2)
+        token["requests"] += 1
+        if self.requestsPerToken is not None and \
+           token["requests"] > self.requestsPerToken:
+            raise _ApiError(3, status=429)
+
+    def _NewToken(self, scope):
+        accessToken = secrets.token_hex(20)
+        refreshToken = secrets.token_hex(20)
+        self._accessTokens[accessToken] = {
+            "expires": self.clock() + self.tokenLifetime, "requests": 0}
+        self._refreshTokens.add(refreshToken)
+        return {"access_token": accessToken, "expires_in": self.tokenLifetime,
+                "token_type": "Bearer", "scope": scope,
+                "refresh_token": refreshToken}
+
+    def _Token(self, params):
+        grantType = params.get("grant_type")
+        if grantType == "refresh_token":
+            # Refresh tokens can only be used once
+            try:
+                self._refreshTokens.remove(params.get("refresh_token"))
+            except KeyError as e:
+                raise _ApiError(102, status=400) from e
+        elif grantType != "authorization_code" or not params.get("code"):
+            raise _ApiError(102, status=400)
+        return self._NewToken(
+            params.get("scope", "basic tasks notes folders write"))
+
+    def _Stamp(self):
+        self._lastStamp = max(int(self.clock()), self._lastStamp + 1)
+        return self._lastStamp
+
+    def _TaskValues(self, raw):
+        """Validate and convert the task fields in a task sent to the API"""
+        values = {}
+        for name, value in raw.items():
+            if name not in _TASK_FIELDS or name == "modified":
+                continue
+            if name in _TEXT_FIELDS:
+                values[name] = "" if value is None else str(value)
+            else:
+                values[name] = _Int(value)
+        for name, code in (("folder", 607), ("context", 608)):
+            if values.get(name) and \
+               values[name] not in self._lists[name]:
+                raise _ApiError(code)
+        if values.get("parent") and values["parent"] not in self._tasks:
+            raise _ApiError(612)
+        return values
+
+    @staticmethod
+    def _TaskList(params, limit=_WRITE_LIMIT):
+        try:
+            tasks = loads(params["tasks"])
+        except (KeyError, ValueError) as e:
+            raise _ApiError(611) from e
+        if not isinstance(tasks, list):
+            raise _ApiError(611)
+        if len(tasks) > limit:
+            raise _ApiError(602)
+        return tasks
+
+    @staticmethod
+    def _Fields(params):
+        return tuple(name for name in params.get("fields", "").split(",")
+                     if name in _TASK_FIELDS and name not in _STANDARD_FIELDS)
+
+    def _GetTasks(self, params):
+        fields = self._Fields(params)
+        start = _Int(params.get("start", 0))
+        num = min(_Int(params.get("num", _PAGE_LIMIT)), _PAGE_LIMIT)
+        if params.get("id"):
+            task = self._tasks.get(_Int(params["id"]))
+            tasks = [task] if task else []
+        else:
+            comp = _Int(params.get("comp", -1))
+            before = float(_Int(params.get("before") or 0))
+            after = float(_Int(params.get("after") or 0))
+            tasks = [task for task in self._tasks.values()
+                     if (comp == -1 or comp == bool(task["completed"])) and
+                     (not before or task["modified"] < before) and
+                     task["modified"] > after]
+        page = tasks[start:start + num]
+        return [{"num": len(page), "total": len(tasks)}] + \
+            [_TaskView(task, fields) for task in page]
+
+    def _AddTasks(self, params):
+        tasks = self._TaskList(params)
+        fields = self._Fields(params)
+        stamp = self._Stamp()
+        results = []
+        for raw in tasks:
+            try:
+                if not isinstance(raw, dict):
+                    raise _ApiError(611)
+                values = self._TaskValues(raw)
+                if not values.get("title"):
+                    raise _ApiError(601)
+            except _ApiError as e:
+                results.append(e.Response(ref=raw.get("ref"))
+                               if isinstance(raw, dict) else e.Response())
+                continue
+            task = dict(_TASK_FIELDS, modified=stamp, **values)
+            task["id"] = next(self._ids)
+            self._tasks[task["id"]] = task
+            results.append(_TaskView(task, fields))
+        self._account["lastedit_task"] = stamp
+        return results
+
+    def _EditTasks(self, params):
+        tasks = self._TaskList(params)
+        fields = self._Fields(params)
+        stamp = self._Stamp()
+        results = []
+        for raw in tasks:
+            try:
+                if not isinstance(raw, dict) or not raw.get("id"):
+                    raise _ApiError(604)
+                task = self._tasks.get(_Int(raw["id"]))
+                if task is None:
+                    raise _ApiError(605)
+                values = self._TaskValues(raw)
+                if not values and not raw.get("reschedule"):
+                    raise _ApiError(606)
+            except _ApiError as e:
+                results.append(e.Response(id=raw.get("id"))
+                               if isinstance(raw, dict) else e.Response())
+                continue
+            task.update(values, modified=stamp)
+            if raw.get("reschedule") and task["completed"]:
+                self._Reschedule(task, stamp)
+            results.append(_TaskView(
+                task, fields + tuple(name for name in values
+                                     if name not in _STANDARD_FIELDS)))
+        self._account["lastedit_task"] = stamp
+        return results
+
+    def _Reschedule(self, task, stamp):
+        """Reschedule a repeating task that was just completed.
+
+        As in the API, a completed copy of the task is added, and the task
+        itself is marked incomplete and moved to its next occurrence."""
+        completed = _DateOf(task["completed"])
+        fromCompletion = "FROMCOMP" in task["repeat"].upper() or \
+            not task["duedate"]
+        current = completed if fromCompletion else _DateOf(task["duedate"])
+        following = _NextDate(task["repeat"], current)
+        if following is None:
+            return
+        clone = dict(task, id=next(self._ids))
+        self._tasks[clone["id"]] = clone
+        shift = (following - current).days * 86400
+        for name in _DATE_FIELDS:
+            if task[name]:
+                task[name] += shift
+        if not task["duedate"]:
+            task["duedate"] = calendar.timegm(following.timetuple()) + 43200
+        task["completed"] = 0
+        task["modified"] = stamp
+
+    def _DeleteTasks(self, params):
+        ids = self._TaskList(params)
+        stamp = self._Stamp()
+        results = []
+        for id_ in ids:
+            try:
+                task = self._tasks.pop(_Int(id_))
+            except (_ApiError, KeyError):
+                results.append(_ApiError(605).Response(id=id_))
+                continue
+            self._deleted.append((task["id"], stamp))
+            results.append({"id": task["id"]})
+        self._account["lastdelete_task"] = stamp
+        return results
+
+    def _GetDeletedTasks(self, params):
+        after = float(_Int(params.get("after") or 0))
+        deleted = [{"id": id_, "stamp": stamp}
+                   for id_, stamp in self._deleted if stamp > after]
+        return [{"num": len(deleted)}] + deleted
+
+    def _GetList(self, kind):
+        return sorted(self._lists[kind].values(),
+                      key=lambda item: item.get("ord", item["id"]))
+
+    def _CheckName(self, kind, name, id_=None):
+        errors = _LIST_ERRORS[kind]
+        if not name:
+            raise _ApiError(errors + 1)
+        if any(item["name"] == name and item["id"] != id_
+               for item in self._lists[kind].values()):
+            raise _ApiError(errors + 2)
+
+    def _ListItem(self, kind, params):
+        errors = _LIST_ERRORS[kind]
+        if not params.get("id"):
+            raise _ApiError(errors + 4)
+        item = self._lists[kind].get(_Int(params["id"]))
+        if item is None:
+            raise _ApiError(errors + 5)
+        return item
+
+    def _AddList(self, kind, params):
+        name = params.get("name", "")
+        self._CheckName(kind, name)
+        item = {"id": next(self._ids), "name": name,
+                "private": _Int(params.get("private", 0))}
+        if kind == "folder":
+            item["archived"] = 0
+            item["ord"] = len(self._lists[kind]) + 1
+        self._lists[kind][item["id"]] = item
+        self._account[f"lastedit_{kind}"] = self._Stamp()
+        return [item]
+
+    def _EditList(self, kind, params):
+        item = self._ListItem(kind, params)
+        changes = {}
+        if "name" in params:
+            self._CheckName(kind, params["name"], item["id"])
+            changes["name"] = params["name"]
+        for name in ("private", "archived"):
+            if name in params and name in item:
+                changes[name] = _Int(params[name])
+        if not changes:
+            raise _ApiError(_LIST_ERRORS[kind] + 6)
+        item.update(changes)
+        self._account[f"lastedit_{kind}"] = self._Stamp()
+        return [item]
+
+    def _DeleteList(self, kind, params):
+        item = self._ListItem(kind, params)
+        del self._lists[kind][item["id"]]
+        for task in self._tasks.values():
+            if task[kind] == item["id"]:
+                task[kind] = 0
+        self._account[f"lastedit_{kind}"] = self._Stamp()
+        return {"deleted": item["id"]}
@@ -0,0 +1,53 @@
+"""Request history"""
+
+from collections import deque, namedtuple
+
+HistoryRecord = namedtuple(
+    "HistoryRecord",
+    ("method", "url", "status", "bytes", "elapsed", "retries", "start",
+     "body"))
+HistoryRecord.__doc__ = """One attempt at a request in the history.
+
+Each attempt made by a RetryPolicy is a record of its own.
+
+method -- HTTP method
+url -- URL of the endpoint, without query parameters
+status -- HTTP status of the final response
+bytes -- size of the final response body
+elapsed -- wall time in seconds of this attempt, including refreshing the
+           token and resending the request after a 429 error, but not
+           earlier attempts
+retries -- number of earlier attempts by the RetryPolicy, plus one if the
+           request was resent after refreshing the token
+start -- page offset for paged requests, otherwise None
+body -- response body, if bodies are being kept for this request,
+        otherwise None
+"""
+
+
+class RequestHistory(deque):
+    """Ring buffer of the most recent requests, newest first.
+
+    `bodies` controls which response bodies are kept: True for all of them,
+    False for none of them, or "failures" for only the responses with an
+    HTTP error status or a Toodledo error code."""
+
+    def __init__(self, count=None, bodies="failures", records=()):
+        super().__init__(records, maxlen=count or 0)
+        self.bodies = bodies
+
+    def Record(self, method, url, status, body, elapsed, retries=0,
+               params=None):
+        """Add a request to the history"""
+        if not self.maxlen:
+            return
+        if self.bodies == "failures":
+            keep = status >= 400 or b'"errorCode"' in body
+        else:
+            keep = self.bodies
+        start = params.get("start") if isinstance(params, dict) else None
+        if start is not None:
+            start = int(start)
+        self.appendleft(HistoryRecord(
+            method, url, status, len(body), elapsed, retries, start,
+            body if keep else None))
@@ -0,0 +1,45 @@
+"""Pluggable JSON decoding and encoding"""
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class JsonBackend:
+    """JSON backend using the standard library's json module.
+
+    `Toodledo` and `AsyncToodledo` use their `jsonBackend` to decode every
+    response and to encode the task lists they send. Any object with `Loads`
+    and `Dumps` methods like these can be used."""
+
+    def Loads(self, data):
+        """Decode a JSON document from bytes or a string"""
+        return json.loads(data)
+
+    def Dumps(self, value):
+        """Encode a value as a JSON string"""
+        return json.dumps(value)
+
+
+class OrjsonBackend(JsonBackend):
+    """JSON backend using orjson, which is several times faster than the
+    standard library. Requires the optional `orjson` dependency."""
+
+    def __init__(self):
+        if orjson is None:
+            raise ImportError(
+                "OrjsonBackend requires orjson; install toodledo[fast]")
+
+    def Loads(self, data):
+        return orjson.loads(data)
+
+    def Dumps(self, value):
+        return orjson.dumps(value).decode("utf-8")
+
+
+def DefaultJsonBackend():
+    """Return an OrjsonBackend if orjson is installed, or a JsonBackend"""
+    return JsonBackend() if orjson is None else OrjsonBackend()
@@ -0,0 +1,127 @@
+"""Per-endpoint request metrics"""
+
+from bisect import bisect_left
+from copy import deepcopy
+import threading
+from urllib.parse import urlsplit
+
+# Upper bounds in seconds of the latency histogram buckets
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _Endpoint(url):
+    """Return the endpoint name for a URL, e.g. "tasks/get.php" """
+    path = urlsplit(url).path
+    return "/".join(path.rstrip("/").split("/")[-2:])
+
+
+class EndpointMetrics:  # pylint: disable=too-few-public-methods
+    """Metrics for a single endpoint.
+
+    `buckets` holds the number of requests whose latency was at most the
+    corresponding bound in `bounds`, not counting faster ones, plus a final
+    bucket for requests slower than all the bounds."""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.requests = 0
+        self.errors = 0
+        self.bytes = 0
+        self.refreshes = 0
+        self.seconds = 0.0
+        self.buckets = [0] * (len(bounds) + 1)
+
+    def Record(self, status, size, elapsed, refreshes, error):
+        """See InMemoryMetrics.Record."""
+        self.requests += 1
+        self.errors += 1 if error or not status or status >= 400 else 0
+        self.bytes += size
+        self.refreshes += refreshes
+        self.seconds += elapsed
+        self.buckets[bisect_left(self.bounds, elapsed)] += 1
+
+
+class InMemoryMetrics:
+    """Default metrics sink, which aggregates metrics in memory.
+
+    Any object with a `Record` method with the same signature as this one
+    can be used as a metrics sink by `Toodledo` and `AsyncToodledo`, e.g. to
+    forward metrics to a monitoring system. Use `PrometheusText` to export
+    the metrics collected by this sink."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.bounds = tuple(sorted(buckets))
+        self.endpoints = {}
+        self._lock = threading.Lock()
+
+    def Record(self, url, status, size, elapsed, refreshes=0, error=False):
+        """Record a request.
+
+        Required arguments:
+        url -- URL of the endpoint
+        status -- HTTP status of the response, or 0 if there wasn't one
+        size -- size in bytes of the response body
+        elapsed -- wall time of the request in seconds
+
+        Keyword arguments:
+        refreshes -- number of times the token was refreshed because of 429
+                     errors while sending the request (default: 0)
+        error -- whether the response contained a Toodledo error code
+                 (default: False)
+        """
+        endpoint = _Endpoint(url)
+        with self._lock:
+            try:
+                metrics = self.endpoints[endpoint]
+            except KeyError:
+                metrics = self.endpoints[endpoint] = \
+                    EndpointMetrics(self.bounds)
+            metrics.Record(status, size, elapsed, refreshes, error)
+
+    def Snapshot(self):
+        """Return a copy of the metrics, as a dict mapping endpoint names to
+        EndpointMetrics objects"""
+        with self._lock:
+            return {endpoint: deepcopy(metrics)
+                    for endpoint, metrics in self.endpoints.items()}
+
+    def Reset(self):
+        """Forget all collected metrics"""
+        with self._lock:
+            self.endpoints = {}
+
+
+def PrometheusText(metrics, prefix="toodledo"):
+    """Return the metrics in an InMemoryMetrics object in the Prometheus text
+    exposition format"""
+    endpoints = sorted(metrics.Snapshot().items())
+    lines = []
+    for name, kind, help_, attribute in (
+            ("requests_total", "counter", "Requests sent", "requests"),
+            ("request_errors_total", "counter",
+             "Requests that failed or returned an error", "errors"),
+            ("response_bytes_total", "counter",
+             "Bytes of response bodies received", "bytes"),
+            ("token_refreshes_total", "counter",
+             "Token refreshes caused by 429 errors", "refreshes")):
+        lines.append(f"# HELP {prefix}_{name} {help_}")
+        lines.append(f"# TYPE {prefix}_{name} {kind}")
+        for endpoint, endpointMetrics in endpoints:
+            lines.append(f'{prefix}_{name}{{endpoint="{endpoint}"}} '
+                         f'{getattr(endpointMetrics, attribute)}')
+    name = f"{prefix}_request_duration_seconds"
+    lines.append(f"# HELP {name} Request latency")
+    lines.append(f"# TYPE {name} histogram")
+    for endpoint, endpointMetrics in endpoints:
+        total = 0
+        bounds = [repr(float(b)) for b in endpointMetrics.bounds]
+        for bound, count in zip(bounds + ["+Inf"],
+                                endpointMetrics.buckets):
+            total += count
+            lines.append(f'{name}_bucket{{endpoint="{endpoint}",'
+                         f'le="{bound}"}} {total}')
+        lines.append(f'{name}_sum{{endpoint="{endpoint}"}} '
+                     f'{endpointMetrics.seconds}')
+        lines.append(f'{name}_count{{endpoint="{endpoint}"}} '
+                     f'{endpointMetrics.requests}')
+    return "\n".join(lines) + "\n"
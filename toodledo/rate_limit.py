@@ -0,0 +1,72 @@
+"""Client-side rate limiting"""
+
+import threading
+import time
+
+
+class TokenBucketRateLimiter:
+    """Token bucket for holding API requests under a rate limit.
+
+    Any object with a `reserve()` method that returns the number of seconds
+    the caller should wait before sending a request can be used as a rate
+    limiter by `Toodledo` and `AsyncToodledo`; this is the default
+    implementation. Share a single limiter between all the API objects that
+    use the same account so that they draw from the same budget. Its
+    `acquire()` method is for other code that wants to wait on the limiter
+    too; the API objects don't need it.
+    """
+
+    def __init__(self, requests, period=1.0, burst=None,
+                 clock=time.monotonic):
+        """Initialize a new rate limiter.
+
+        Required arguments:
+        requests -- number of requests allowed per `period`
+
+        Keyword arguments:
+        period -- length in seconds of the rate-limiting period (default: 1)
+        burst -- maximum number of requests that can be sent back-to-back
+                 after the limiter has been idle (default: `requests`)
+        clock -- function returning the current time in seconds
+                 (default: time.monotonic)
+        """
+        if requests <= 0 or period <= 0:
+            raise ValueError("requests and period must be positive")
+        self.rate = requests / period
+        self.capacity = float(burst if burst is not None else requests)
+        self.clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self._tokens = min(self.capacity,
+                           self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    @property
+    def budget(self):
+        """Number of requests that can be sent right now without waiting.
+
+        Negative if requests have been reserved ahead of time by callers that
+        are waiting to send them."""
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    def reserve(self, count=1):
+        """Reserve `count` requests and return how long to wait to send them.
+        """
+        with self._lock:
+            self._refill()
+            self._tokens -= count
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self, count=1):
+        """Block until `count` requests can be sent."""
+        delay = self.reserve(count)
+        if delay > 0:
+            time.sleep(delay)
@@ -0,0 +1,85 @@
+"""Retrying transient failures"""
+
+from collections import Counter
+from email.utils import parsedate_to_datetime
+import datetime
+import random
+import threading
+
+
+class RetryPolicy:  # pylint: disable=too-few-public-methods
+    """Exponential backoff with jitter for retrying idempotent reads.
+
+    `Toodledo` and `AsyncToodledo` consult the policy when a read fails with
+    a connection error, a timeout, one of the `retryStatuses` HTTP statuses,
+    or Toodledo error code 4 (API offline for maintenance). The `counters`
+    attribute counts the retries by reason, plus the total number of
+    `retries` and the total `delay` in seconds they added.
+    """
+
+    def __init__(self, retries=3, backoff=0.5, maxBackoff=30.0, jitter=True,
+                 retryStatuses=(500, 502, 503, 504)):
+        """Initialize a new retry policy.
+
+        Keyword arguments:
+        retries -- maximum number of times to retry a request (default: 3)
+        backoff -- delay in seconds before the first retry, doubled for each
+                   subsequent retry (default: 0.5)
+        maxBackoff -- maximum delay in seconds between retries, including
+                      delays requested by the server (default: 30)
+        jitter -- randomize delays between zero and the computed backoff so
+                  that clients retrying at the same time spread out
+                  (default: True)
+        retryStatuses -- HTTP statuses to retry (default: 500, 502, 503, 504)
+        """
+        self.retries = retries
+        self.backoff = backoff
+        self.maxBackoff = maxBackoff
+        self.jitter = jitter
+        self.retryStatuses = frozenset(retryStatuses)
+        self.counters = Counter()
+        self._lock = threading.Lock()
+
+    def Delay(self, attempt, reason, retryAfter=None):
+        """Return how long to wait before retrying, or None to give up.
+
+        Required arguments:
+        attempt -- number of retries of this request so far
+        reason -- short string describing the failure, used as a counter name
+
+        Keyword arguments:
+        retryAfter -- value of the Retry-After header of the response, if any
+        """
+        if attempt >= self.retries:
+            with self._lock:
+                self.counters["exhausted"] += 1
+            return None
+        delay = _ParseRetryAfter(retryAfter)
+        if delay is None:
+            delay = min(self.maxBackoff, self.backoff * 2 ** attempt)
+            if self.jitter:
+                delay = random.uniform(0, delay)
+        delay = min(self.maxBackoff, delay)
+        with self._lock:
+            self.counters[reason] += 1
+            self.counters["retries"] += 1
+            self.counters["delay"] += delay
+        return delay
+
+
+def _ParseRetryAfter(retryAfter):
+    """Convert a Retry-After header to a number of seconds, or None"""
+    if not retryAfter:
+        return None
+    try:
+        return max(0.0, float(retryAfter))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(retryAfter)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, (when - datetime.datetime.now(datetime.timezone.utc))
+               .total_seconds())
@@ -1,23 +1,82 @@
 """Token storage"""
 
+from contextlib import contextmanager
 from json import dump, load
+import os
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows
+    fcntl = None
 
 
 class TokenStorageFile:
-    """Stores the API tokens as a file"""
+    """Stores the API tokens as a file.
+
+    The token is kept in memory and only read from the file again when the
+    file changes. Saves write a temporary file and rename it over the token
+    file, so readers never see a partially written token."""
 
     def __init__(self, path):
         self.path = path
+        self._token = None
+        self._signature = None
+        self._lock = threading.Lock()
+
+    def _Signature(self):
+        # The inode changes whenever the file is replaced by Save, so this
+        # detects changes even within the resolution of the mtime.
+        stat = os.stat(self.path)
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
 
     def Save(self, token):
         """Save the given token. Called by Toodledo class"""
-        with open(self.path, "w", encoding="ascii") as f:
-            dump(token, f)
+        directory = os.path.dirname(os.path.abspath(self.path))
+        with self._lock:
+            fd, tempPath = tempfile.mkstemp(
+                dir=directory, prefix=os.path.basename(self.path) + ".",
+                suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="ascii") as f:
+                    dump(token, f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tempPath, self.path)
+            except BaseException:
+                os.unlink(tempPath)
+                raise
+            self._token = dict(token)
+            self._signature = self._Signature()
 
     def Load(self):
         """Load and return the token. Called by Toodledo class"""
-        try:
-            with open(self.path, "r", encoding="ascii") as f:
-                return load(f)
-        except FileNotFoundError:
-            return None
+        with self._lock:
+            try:
+                signature = self._Signature()
+                if signature != self._signature:
+                    with open(self.path, "r", encoding="ascii") as f:
+                        self._token = load(f)
+                    self._signature = signature
+            except FileNotFoundError:
+                self._token = self._signature = None
+                return None
+            return dict(self._token)
+
+    @contextmanager
+    def Lock(self):
+        """Hold an exclusive lock on the token while refreshing it.
+
+        Called by Toodledo class, so that only one process sharing this file
+        refreshes the token at a time. The lock is held on a separate file
+        next to the token file. On platforms without `fcntl` it does nothing.
+        """
+        with open(self.path + ".lock", "a", encoding="ascii") as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
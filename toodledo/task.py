@@ -3,6 +3,7 @@
 from marshmallow import fields, post_load, Schema
 from marshmallow.validate import Length
 
+from .codec import _SchemaCodec
 from .custom_fields import (
     _ToodledoBoolean,
     _ToodledoDate,
@@ -18,8 +19,21 @@ from .custom_fields import (
 )
 
 
+# Marks attributes that aren't set
+_UNSET = object()
+
+
 class Task:
-    """Represents a single task"""
+    """Represents a single task.
+
+    Tasks have a fixed set of attributes, those of _TaskSchema. An attribute
+    that hasn't been set is missing, i.e. accessing it raises
+    AttributeError, which is different from it being set to None."""
+    __slots__ = ("id_", "title", "tags", "startDate", "dueDate", "dueTime",
+                 "startTime", "modified", "completedDate", "star", "priority",
+                 "dueDateModifier", "status", "length", "note", "repeat",
+                 "parent", "folderId", "contextId", "meta", "remind",
+                 "reschedule")
 
     def __init__(self, **data):
         for name, item in data.items():
@@ -27,14 +41,79 @@ class Task:
 
     def __repr__(self):
         attributes = sorted([f"{name}={item}"
-                             for name, item in self.__dict__.items()])
+                             for name, item in self.AsDict().items()])
         return f"<Task {', '.join(attributes)}>"
 
+    def __setstate__(self, state):
+        # Pickled tasks' state is a (None, slots dict) tuple, or the
+        # __dict__ of tasks pickled before Task had slots.
+        if isinstance(state, tuple):
+            state = state[1]
+        for name, item in state.items():
+            object.__setattr__(self, name, item)
+
+    def AsDict(self):
+        """Return the attributes that are set as a dict"""
+        data = {}
+        for name in Task.__slots__:
+            item = getattr(self, name, _UNSET)
+            if item is not _UNSET:
+                data[name] = item
+        return data
+
+    def Copy(self):
+        """Return a modifiable copy of this task"""
+        task = Task.__new__(Task)
+        for name in Task.__slots__:
+            item = getattr(self, name, _UNSET)
+            if item is not _UNSET:
+                setattr(task, name, item)
+        return task
+
+    def ReadOnly(self):
+        """Return a read-only copy of this task, or the task itself if it's
+        already read-only"""
+        task = self.Copy()
+        task.__class__ = ReadOnlyTask
+        return task
+
     def IsComplete(self):
         """Indicate whether this task is complete"""
         return self.completedDate is not None  # pylint: disable=no-member
 
 
+class ReadOnlyTask(Task):
+    """A task whose attributes can't be changed.
+
+    TaskCache stores its tasks as ReadOnlyTasks, so that it can hand them out
+    without copying them when it's created with `read_only=True`. Use
+    `Copy()` to get a task that can be modified. Note that the values of
+    attributes, such as the `tags` list, must not be modified either."""
+    __slots__ = ()
+
+    def __init__(self, **data):  # pylint: disable=super-init-not-called
+        for name, item in data.items():
+            object.__setattr__(self, name, item)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"Can't set {name} of a read-only task")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"Can't delete {name} of a read-only task")
+
+    def ReadOnly(self):
+        return self
+
+
+def _Freeze(task):
+    """Make a task read-only in place, without copying it. Only for tasks
+    nothing else holds on to."""
+    if type(task) is Task:  # pylint: disable=unidiomatic-typecheck
+        task.__class__ = ReadOnlyTask
+        return task
+    return task.ReadOnly()
+
+
 class _TaskSchema(Schema):
     id_ = fields.Integer(data_key="id")
     title = fields.String(validate=Length(max=255))
@@ -66,7 +145,90 @@ class _TaskSchema(Schema):
         return Task(**data)
 
 
+# Converts tasks faster than _TaskSchema, which it falls back on
+_TASK_CODEC = _SchemaCodec(_TaskSchema(), Task)
+
+
 def _DumpTaskList(taskList):
-    # TODO - pass many=True to the schema instead of this custom stuff
-    schema = _TaskSchema()
-    return [schema.dump(task) for task in taskList]
+    return _TASK_CODEC.DumpMany(taskList)
+
+
+# Maps each attribute to its key in the raw data and a function decoding it
+_LAZY_FIELDS = _TASK_CODEC.FieldLoaders()
+_LAZY_KEYS = frozenset(key for key, _ in _LAZY_FIELDS.values())
+
+
+class LazyTask(Task):
+    """A task which decodes each of its fields from the API's raw data the
+    first time it's accessed.
+
+    `Toodledo.GetTasks` and `Toodledo.IterTasks` return these if the API
+    object was created with `lazyTasks=True`, so that code which only looks
+    at a few fields of each task doesn't pay for decoding the rest. An
+    invalid value in the raw data raises an error when its field is first
+    accessed rather than when the task is fetched."""
+    __slots__ = ("_raw",)
+    _fields = _LAZY_FIELDS
+
+    def __getattr__(self, name):
+        # Only called for attributes that haven't been set or decoded yet
+        try:
+            key, load = self._fields[name]
+            value = self._raw[key]
+        except (AttributeError, KeyError):
+            raise AttributeError(
+                f"'{type(self).__name__}' object has no attribute "
+                f"'{name}'") from None
+        value = load(value)
+        object.__setattr__(self, name, value)
+        self._raw.pop(key, None)
+        return value
+
+    def __setattr__(self, name, value):
+        self._Forget(name)
+        object.__setattr__(self, name, value)
+
+    def __delattr__(self, name):
+        if not self._Forget(name):
+            object.__delattr__(self, name)
+
+    def _Forget(self, name):
+        """Discard the raw value of a field that's being set or deleted, so
+        that it isn't decoded later. Return whether there was one."""
+        try:
+            return self._raw.pop(self._fields[name][0], _UNSET) \
+                is not _UNSET
+        except (AttributeError, KeyError):
+            return False
+
+
+def _LoadOrNone(load):
+    return lambda value: None if value is None else load(value)
+
+
+class _StoredTask(ReadOnlyTask, LazyTask):
+    """A read-only task loaded from a SqliteTaskStore, which decodes each of
+    its fields the first time it's accessed.
+
+    The stored data is what `_TASK_CODEC.Dump` returned for the task, so
+    unlike in API data, null values are decoded as None even for fields
+    that don't allow them."""
+    __slots__ = ()
+    _fields = {attribute: (key, _LoadOrNone(load))
+               for attribute, (key, load) in _LAZY_FIELDS.items()}
+
+    def __init__(self, raw):  # pylint: disable=super-init-not-called
+        object.__setattr__(self, "_raw", raw)
+
+
+def _LoadLazyTasks(rawTasks):
+    tasks = []
+    for raw in rawTasks:
+        if not raw.keys() <= _LAZY_KEYS:
+            # Raises the same error about unknown fields as a non-lazy load
+            tasks.append(_TASK_CODEC.Load(raw))
+            continue
+        task = LazyTask.__new__(LazyTask)
+        object.__setattr__(task, "_raw", raw)
+        tasks.append(task)
+    return tasks
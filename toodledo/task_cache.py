@@ -1,14 +1,88 @@
+from bisect import bisect_left, bisect_right, insort
+from collections.abc import Sequence
 from contextlib import contextmanager
 import datetime
 import logging
+import math
 import os
-import pickle
+import time
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows
+    fcntl = None
 
 from toodledo.types import DueDateModifier, Priority, Status
-from toodledo.task import _TaskSchema, Task
+from toodledo.task import _Freeze, _TaskSchema, ReadOnlyTask
+from toodledo.task_columns import _SortKey, _TaskColumns
+from toodledo.task_store import PickleTaskStore
+
+
+def _Update(task, other):
+    """Set the attributes of `task` that are set in `other`"""
+    for name, item in other.AsDict().items():
+        setattr(task, name, item)
+
+
+def _ModifiedKey(task):
+    """Return the key by which a task is sorted in the modified-time index"""
+    return (task.modified, task.id_)
+
+
+def _NetChanges(moved):
+    """Return the tasks that were added or replaced and the ids of the ones
+    that were deleted, given the (old, new) pairs of tasks replaced in a
+    TaskCache's index. A task that was deleted and then added again is in
+    both."""
+    changed = {}
+    deleted = set()
+    for old, new in moved:
+        if new is None:
+            changed.pop(old.id_, None)
+            deleted.add(old.id_)
+        else:
+            changed[new.id_] = new
+    return list(changed.values()), deleted
+
+
+class _TaskList(Sequence):
+    """The tasks in a TaskCache's index, in its cache dict's 'tasks' entry.
+
+    The index is what's kept up to date when tasks change; the list of its
+    tasks is only built when something asks for it, e.g. when the cache is
+    saved or iterated over, or a task is looked up by position. It's
+    pickled as a plain list."""
 
+    def __init__(self, index):
+        self._index = index
+        self._tasks = None
 
-class TaskCache:
+    def _list(self):
+        if self._tasks is None:
+            self._tasks = list(self._index.values())
+        return self._tasks
+
+    def __getitem__(self, item):
+        return self._list()[item]
+
+    def __iter__(self):
+        # Over the list rather than the index, so that the cache can be
+        # changed while iterating over it
+        return iter(self._list())
+
+    def __len__(self):
+        return len(self._index)
+
+    def __eq__(self, other):
+        if not isinstance(other, Sequence):
+            return NotImplemented
+        return self._list() == list(other)
+
+    def __reduce__(self):
+        return (list, (self._list(),))
+
+
+class TaskCache:  # pylint: disable=too-many-public-methods
     """Automatically maintained local cache of tasks in a Toodledo account.
 
     A loaded task cache can be treated as a read-only list to access the tasks
@@ -32,7 +106,20 @@ class TaskCache:
 
     Call `save()` on the cache object to write it to disk. This happens
     automatically when you call `update()` unless you specify `autosave=False`
-    when instantiating the cache.
+    when instantiating the cache. The cache is stored as a pickle file unless
+    you specify another `store`, e.g. `store=SqliteTaskStore()`, which only
+    writes the tasks that have changed, or `store=JournaledTaskStore()`,
+    which writes every change to disk as soon as it's made, whether or not
+    `autosave` is set.
+
+    If several processes use caches with the same path, specify `shared=True`
+    in all of them. Then only one process at a time creates or updates the
+    cache, holding a lock on it, and the others wait for it and then load
+    the cache it saved instead of fetching updates from Toodledo themselves.
+    Each process only saves the cache if no other process has saved it since
+    it last loaded it, so that it doesn't lose their changes; changes made
+    through the cache are made in Toodledo too, so they're picked up by the
+    next update in any process.
 
     if you specify `comp=0` or `comp=1` when instantiating the cache, then
     you can use the `caching_everything()` context manager on the cache object
@@ -47,13 +134,30 @@ class TaskCache:
     The `Toodledo` session class has a no-op `caching_everything()`
     context manager to preserve the ability to use the session and
     cache objects interchangeably.
+
+    The cache stores its tasks as ReadOnlyTask objects. By default it hands
+    out modifiable copies of them, like the tasks `Toodledo` returns. If you
+    specify `read_only=True`, it hands out the cached tasks themselves, which
+    is faster for large caches but means that you have to call `Copy()` on a
+    task before modifying it.
+
+    The cached tasks are indexed by id and by modification time, so
+    `GetTasks` with `id_`, `before` or `after` only looks at the tasks it
+    returns. Tasks fetched with `before` or `after` are returned in the order
+    in which they were modified.
+
+    If you specify `columnar=True`, the cache also keeps the numeric and date
+    fields of the cached tasks in numpy arrays, so that filtering and
+    sorting large caches are done with array operations instead of by
+    looking at every task. This requires numpy.
     """
     schema = _TaskSchema()
     fields_map = {f.data_key or k: k for k, f in schema.fields.items()}
 
     def __init__(self, toodledo, path,  # pylint: disable=too-many-branches
                  update=True, autosave=True, comp=None, fields='',
-                 clear=False):
+                 clear=False, read_only=False, columnar=False, store=None,
+                 shared=False):
         """Initialize a new TaskCache object.
 
         Required arguments:
@@ -68,6 +172,14 @@ class TaskCache:
         fields -- (string) optional fields to fetch and cache as per API
                   documentation
         clear -- clear the cache and reload from server (default: False)
+        read_only -- return the cached ReadOnlyTask objects instead of
+                     modifiable copies of them (default: False)
+        columnar -- keep the numeric and date fields of the cached tasks in
+                    numpy arrays for faster filtering and sorting
+                    (default: False)
+        store -- TaskStore used to load and save the cache (default:
+                 PickleTaskStore())
+        shared -- share the cache with other processes (default: False)
 
         If you change the values of the keyword arguments between
         instantiations of the same cache, then newly fetched tasks will reflect
@@ -82,6 +194,22 @@ class TaskCache:
         self.logger = logging.getLogger(__name__)
         self.path = path
         self.autosave = autosave
+        self.store = store or PickleTaskStore()
+        self.shared = shared
+        # The store's signature of the cache when this process last loaded
+        # or saved it, and the lock file while the lock is held
+        self._signature = None
+        self._lock_file = None
+        self.cache = None
+        # The cached tasks by id, in the same order as in self.cache['tasks'],
+        # the sorted _ModifiedKey of each of them, and the (old, new) pairs
+        # of tasks replaced in the index since the keys were last updated,
+        # or None if all of them were
+        self._index = {}
+        self._modified = []
+        self._moved = []
+        self.read_only = read_only
+        self._columns = _TaskColumns() if columnar else None
         self.toodledo = toodledo
         if comp is not None and comp != 0 and comp != 1:
             raise ValueError(f'"comp" should be 0 or 1, not "{comp}"')
@@ -91,9 +219,17 @@ class TaskCache:
         self.fields = fields
         if self.fields:
             self._check_fields(self.fields)
-        if clear or not os.path.exists(path):
+        started = time.time()
+        with self._locked():
+            if self._open(clear) and update:
+                self._refresh(started)
+
+    def _open(self, clear):
+        """Load the cache, or create it. Returns whether it was loaded."""
+        if clear or not os.path.exists(self.path):
+            self._signature = self.store.Signature(self.path)
             self._new_cache()
-            return
+            return False
         self.load_from_path()
         if self.cache.get('version', None) is None:
             self.cache['version'] = 1
@@ -111,7 +247,7 @@ class TaskCache:
                     'Saved cache incompatible with current code; '
                     'reloading cache')
                 self._new_cache()
-                return
+                return False
         if self.cache['comp'] != self.comp:
             if self.cache['comp'] is not None:
                 raise ValueError(
@@ -131,8 +267,7 @@ class TaskCache:
                     f"that weren't requested when cache was created")
             # Safe to downgrade fields
             self.cache['fields'] = self.fields
-        if update:
-            self.update()
+        return True
 
     def _missing_fields(self, want_fields, cache_fields=None):
         if cache_fields is None:
@@ -141,9 +276,39 @@ class TaskCache:
         want_fields = (want_fields.split(',') if want_fields else [])
         return sorted(set(want_fields) - set(cache_fields))
 
+    @contextmanager
+    def _locked(self):
+        """Hold an exclusive lock on the cache if it's shared. The lock is
+        held on a separate file next to the cache file. On platforms without
+        `fcntl` it does nothing."""
+        if not self.shared or fcntl is None or self._lock_file is not None:
+            yield
+            return
+        with open(self.path + '.lock', 'a', encoding='ascii') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            self._lock_file = f
+            try:
+                yield
+            finally:
+                self._lock_file = None
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _write(self, write):
+        # If the cache is shared, only write it if no other process has
+        # saved it since this one last loaded or saved it.
+        if not self.shared:
+            write()
+            return
+        with self._locked():
+            if self.store.Signature(self.path) != self._signature:
+                self.logger.debug('Not saving cache saved by another process')
+                return
+            write()
+            self._signature = self.store.Signature(self.path)
+
     def save(self):
         """Save the cache to disk."""
-        self.dump_to_path()
+        self._write(self.dump_to_path)
 
     def load_from_path(self, path=None):
         """Load the cache from a file path.
@@ -152,8 +317,13 @@ class TaskCache:
         path -- path to use instead of the one specified on initialziation
         """
         path = path or self.path
-        with open(path, 'rb') as f:
-            self.cache = pickle.load(f)
+        if self.shared:
+            self._signature = self.store.Signature(path)
+        self.cache = self.store.Load(path)
+        # Caches saved by older versions contain modifiable tasks.
+        for task in self.cache['tasks']:
+            _Freeze(task)
+        self._tasks_loaded()
         self.logger.debug(
             'Loaded %d tasks from {path}', len(self.cache['tasks']))
 
@@ -164,8 +334,7 @@ class TaskCache:
         path -- path to use instead of the one specified on initialziation
         """
         path = os.path.realpath(path or self.path)
-        with open(path, 'wb') as f:
-            pickle.dump(self.cache, f)
+        self.store.Save(path, self.cache)
         self.logger.debug('Dumped to %s', path)
 
     @contextmanager
@@ -176,12 +345,13 @@ class TaskCache:
                 self.comp = None
             yield
             if old_comp is not None:
-                self.cache['tasks'] = [
-                    t for t in self.cache['tasks']
+                self._index_tasks(
+                    t for t in self._index.values()
                     if (getattr(t, 'completedDate', None) and
                         old_comp == 1) or
                     (not getattr(t, 'completedDate', None) and
-                     old_comp == 0)]
+                     old_comp == 0))
+                self._tasks_changed()
         finally:
             self.comp = old_comp
 
@@ -195,9 +365,9 @@ class TaskCache:
         elif 'repeat' not in self.fields.split(','):
             self.fields = 'repeat,' + self.fields
         params['fields'] = self.fields
-        cache['tasks'] = self.toodledo.GetTasks(params)
-        if cache['tasks']:
-            cache['newest'] = max(t.modified for t in cache['tasks'])
+        tasks = [_Freeze(t) for t in self.toodledo.GetTasks(params)]
+        if tasks:
+            cache['newest'] = max(t.modified for t in tasks)
         else:
             cache['newest'] = datetime.datetime(1970, 1, 2,  # So we can -1 it
                                                 tzinfo=datetime.timezone.utc)
@@ -206,23 +376,47 @@ class TaskCache:
         cache['comp'] = self.comp
         cache['fields'] = self.fields
         cache['version'] = 4
+        cache['refreshed'] = time.time()
         self.cache = cache
+        self._index_tasks(tasks)
+        self._tasks_changed()
         self.logger.debug('Initialized new (newest: %s)', cache['newest'])
-        if self.autosave:
+        if self.autosave or self.shared:
             self.save()
 
     def update(self):
         """Fetch updates from Toodledo."""
+        self._refresh(time.time())
+
+    def _refresh(self, since):
+        # If the cache is shared and another process has updated it since
+        # `since`, e.g. while this one was waiting for the lock, load what
+        # it saved instead of fetching updates.
+        with self._locked():
+            if self.shared:
+                if self.store.Signature(self.path) != self._signature:
+                    self.load_from_path()
+                if self.cache.get('refreshed', 0) >= since:
+                    self.logger.debug('Using cache updated by another process')
+                    return
+            self._fetch_updates()
+
+    def _fetch_updates(self):
         # N.B. We fetch all tasks even if `comp` is set because otherwise we
         # won't know about tasks that have been completed or uncompleted.
         # - 1 to avoid race conditions
         after = self.cache['newest_delete'].timestamp() - 1
-        mapped = {t.id_: t for t in self}
         deleted_tasks = self.toodledo.GetDeletedTasks(after)
+        after = self.cache['newest'].timestamp() - 1
+        params = {'after': after}
+        if self.fields:
+            params['fields'] = self.fields
+        updated_tasks = self.toodledo.GetTasks(params)
+        # Both fetches are done before the index is changed, so that it's
+        # left alone if either of them fails.
         delete_count = 0
         for t in deleted_tasks:
-            if t.id_ in mapped:
-                del mapped[t.id_]
+            if self._pop_task(t.id_):
                 delete_count += 1
         if deleted_tasks:
             self.cache['newest_delete'] = max(t.stamp for t in deleted_tasks)
@@ -231,24 +425,17 @@ class TaskCache:
                               self.cache['newest_delete'])
         self.logger.debug('Fetched %d deleted tasks, removed %d from cache',
                           deleted_tasks, delete_count)
-        after = self.cache['newest'].timestamp() - 1
-        params = {'after': after}
-        if self.fields:
-            params['fields'] = self.fields
-        updated_tasks = self.toodledo.GetTasks(params)
         comp_count = 0
         update_count = 0
         for t in updated_tasks:
             if self.comp == 0 and t.IsComplete():
-                if t.id_ in mapped:
-                    del mapped[t.id_]
+                if self._pop_task(t.id_):
                     comp_count += 1
             elif self.comp and not t.IsComplete():
-                if t.id_ in mapped:
-                    del mapped[t.id_]
+                if self._pop_task(t.id_):
                     comp_count += 1
             else:
-                mapped[t.id_] = t
+                self._set_task(_Freeze(t))
                 update_count += 1
         if updated_tasks:
             self.cache['newest'] = max(t.modified for t in updated_tasks)
@@ -257,8 +444,9 @@ class TaskCache:
                               'comp=%d, updated %d in cache',
                               len(updated_tasks), comp_count, self.comp,
                               update_count)
-        self.cache['tasks'] = list(mapped.values())
-        if self.autosave:
+        self.cache['refreshed'] = time.time()
+        self._tasks_changed()
+        if self.autosave or self.shared:
             self.save()
 
     def _check_fields(self, fields):
@@ -270,7 +458,90 @@ class TaskCache:
             raise ValueError(
                 f"Fields not supported by this library: {missing}")
 
-    def _filter_tasks(self, params):
+    def _tasks_loaded(self):
+        # Called whenever self.cache['tasks'] has been replaced
+        self._index_tasks(self.cache['tasks'])
+        self._moved = []
+        self._sync_modified(None)
+        self._sync_columns(None, None)
+
+    def _index_tasks(self, tasks):
+        # Replace all the tasks in the index
+        self._index = {t.id_: t for t in tasks}
+        self._moved = None
+
+    def _set_task(self, task):
+        # Add a task to the index or replace the one with the same id
+        if self._moved is not None:
+            self._moved.append((self._index.get(task.id_), task))
+        self._index[task.id_] = task
+
+    def _pop_task(self, id_):
+        # Remove a task from the index, returning whether it was there
+        task = self._index.pop(id_, None)
+        if task is None:
+            return False
+        if self._moved is not None:
+            self._moved.append((task, None))
+        return True
+
+    def _sync_modified(self, moved):
+        # Update the modified-time index with the tasks that were replaced,
+        # or all of them if moved is None. Each insertion or removal moves
+        # the keys after it, so if there are many, it's faster to sort them
+        # all again.
+        if moved is None or len(moved) > len(self._modified) // 8:
+            self._modified = sorted(
+                _ModifiedKey(t) for t in self._index.values())
+            return
+        keys = self._modified
+        for old, new in moved:
+            if old is not None:
+                del keys[bisect_left(keys, _ModifiedKey(old))]
+            if new is not None:
+                insort(keys, _ModifiedKey(new))
+
+    def _modified_range(self, params):
+        # The tasks modified after params['after'] and before
+        # params['before'], in the order in which they were modified
+        keys = self._modified
+        start = bisect_right(keys, (params['after'], math.inf)) \
+            if 'after' in params else 0
+        end = bisect_left(keys, (params['before'],)) \
+            if 'before' in params else len(keys)
+        index = self._index
+        return [index[id_] for _, id_ in keys[start:end]]
+
+    def _sync_columns(self, changed, deleted):
+        # Update the columns with the tasks that were added, replaced or
+        # deleted, or all of them if changed is None
+        if self._columns is None:
+            return
+        if changed is None:
+            self._columns.Sync(self._index.values())
+        else:
+            self._columns.Update(changed, deleted)
+
+    def _tasks_changed(self):
+        # Called when the tasks in self._index have changed
+        moved, self._moved = self._moved, []
+        changed, deleted = (None, None) if moved is None \
+            else _NetChanges(moved)
+        self.cache['tasks'] = _TaskList(self._index)
+        self._write(lambda: self.store.Changed(self.path, self.cache,
+                                               changed, deleted))
+        self._sync_modified(moved)
+        self._sync_columns(changed, deleted)
+
+    def _select_tasks(self, params, tasks):
+        for task in tasks:
+            if params.get('comp', None) == 0 and task.completedDate:
+                continue
+            if params.get('comp', None) == 1 and not task.completedDate:
+                continue
+            yield task
+
+    def _filter_tasks(self, params, sort_by=None, reverse=False):
         params = params.copy()
         want_fields = params.get('fields', None)
         want_fields = want_fields.split(',') if want_fields else []
@@ -279,36 +550,64 @@ class TaskCache:
             self.cache['fields'],
             params.get('fields', None) or '')
         filter_fields = [self.fields_map[f] for f in filter_fields]
-        for task in self:
-            if 'id' in params:
-                if task.id_ == params['id']:
-                    yield task
-                    return
-                continue
-            if params.get('comp', None) == 0 and task.completedDate:
-                continue
-            if params.get('comp', None) == 1 and not task.completedDate:
-                continue
-            if 'before' in params and task.modified >= params['before']:
-                continue
-            if 'after' in params and task.modified <= params['after']:
-                continue
-            if filter_fields or want_fields:
-                task = Task(**task.__dict__)
-            if filter_fields:
+        if 'id' in params:
+            task = self._index.get(params['id'])
+            tasks = [] if task is None else [task]
+        elif 'before' in params or 'after' in params:
+            tasks = self._select_tasks(params, self._modified_range(params))
+        elif self._columns is None:
+            tasks = self._select_tasks(params, self._index.values())
+        else:
+            rows = self._columns.Select(params)
+            if sort_by in self._columns.columns:
+                rows = self._columns.Sort(rows, sort_by, reverse)
+                sort_by = None
+            tasks = self._columns.Tasks(rows)
+        if sort_by:
+            tasks = sorted(tasks, key=_SortKey(sort_by), reverse=reverse)
+        for task in tasks:
+            # Only copy the task if it has fields to remove or is missing
+            # fields to add.
+            if any(hasattr(task, f) for f in filter_fields) or \
+               not all(hasattr(task, f) for f in want_fields):
+                task = task.Copy()
                 for f in filter_fields:
                     try:
                         delattr(task, f)
                     except AttributeError:
                         pass
-            for field in want_fields:
-                setattr(task, field, getattr(task, field, None))
+                for field in want_fields:
+                    setattr(task, field, getattr(task, field, None))
             yield task
 
-    # pylint: disable=too-many-branches,too-many-locals,too-many-statements
     def GetTasks(self, params=None, before=None, after=None, comp=None,
                  id_=None, fields=None):
         """See Toodledo.GetTasks."""
+        return self._get_tasks(params, before, after, comp, id_, fields)
+
+    def GetSortedTasks(self, sort_by, reverse=False, params=None,
+                       before=None, after=None, comp=None, id_=None,
+                       fields=None):
+        """Get tasks from the cache sorted by one of their attributes.
+
+        Tasks in which the attribute is unset or None sort before all the
+        others, so they come first, or last if `reverse` is true. Tasks with
+        equal values stay in the order they're in in the cache either way.
+
+        Required arguments:
+        sort_by -- name of the Task attribute to sort by, e.g. "dueDate"
+
+        Keyword arguments:
+        reverse -- sort in descending order (default: False)
+
+        The other arguments are the same as GetTasks's.
+        """
+        return self._get_tasks(params, before, after, comp, id_, fields,
+                               sort_by, reverse)
+
+    # pylint: disable=too-many-branches,too-many-locals,too-many-statements
+    def _get_tasks(self, params, before, after, comp, id_, fields,
+                   sort_by=None, reverse=False):
         if params is None:
             params = {}
         if before:
@@ -344,19 +643,19 @@ class TaskCache:
             if missing_fields:
                 raise ValueError(
                     f'Requested fields {missing_fields} are not in cache')
-        from_cache = list(self._filter_tasks(filter_params))
+        from_cache = list(self._filter_tasks(filter_params, sort_by, reverse))
         if self._paranoid:
             from_toodledo = self.toodledo.GetTasks(params)
-            from_cache.sort(key=lambda t: t.id_)
+            by_id = sorted(from_cache, key=lambda t: t.id_)
             from_toodledo.sort(key=lambda t: t.id_)
-            assert len(from_cache) == len(from_toodledo)
-            for i, t in enumerate(from_cache):
-                t1 = t.__dict__.copy()
-                t2 = from_toodledo[i].__dict__.copy()
+            assert len(by_id) == len(from_toodledo)
+            for i, t in enumerate(by_id):
+                t1 = t.AsDict()
+                t2 = from_toodledo[i].AsDict()
                 if t1.get('tags', None):
-                    t1['tags'].sort()
+                    t1['tags'] = sorted(t1['tags'])
                 if t2.get('tags', None):
-                    t2['tags'].sort()
+                    t2['tags'] = sorted(t2['tags'])
                 # Server is not always consistent
                 del t1['modified']
                 del t2['modified']
@@ -366,9 +665,14 @@ class TaskCache:
                 check_fields = [self.fields_map[f] for f in check_fields]
                 for field in check_fields:
                     assert t1[field] == t2[field]
-        return [Task(**t.__dict__) for t in from_cache]
+        return [self._HandOut(t) for t in from_cache]
     # pylint: enable=too-many-branches,too-many-locals,too-many-statements
 
+    def IterTasks(self, params=None, before=None, after=None, comp=None,
+                  id_=None, fields=None):
+        """See Toodledo.IterTasks."""
+        yield from self.GetTasks(params, before, after, comp, id_, fields)
+
     def GetDeletedTasks(self, after, update_cache=True):
         """Get tasks deleted after the specified timestamp.
 
@@ -382,21 +686,21 @@ class TaskCache:
         """
         deleted_tasks = self.toodledo.GetDeletedTasks(after)
         if update_cache:
-            deleted_ids = [t.id_ for t in deleted_tasks]
-            self.cache['tasks'] = [t for t in self.cache['tasks']
-                                   if t.id_ not in deleted_ids]
+            for t in deleted_tasks:
+                self._pop_task(t.id_)
             self.cache['newest_delete'] = max(t.stamp for t in deleted_tasks)
+            self._tasks_changed()
         return deleted_tasks
 
     def AddTasks(self, tasks):
         """Add the specified tasks and update the cache to reflect them."""
         added_tasks = self.toodledo.AddTasks(tasks)
         # Copy so we can modify
-        tasks = [Task(**task.__dict__) for task in tasks]
+        tasks = [task.Copy() for task in tasks]
         split_fields = self.fields.split(',')
         for i, t in enumerate(tasks):
             # Update from fields returned by server
-            t.__dict__.update(added_tasks[i].__dict__)
+            _Update(t, added_tasks[i])
             # Default values
             if 'duedatemod' in split_fields and \
                getattr(t, 'dueDateModifier', None) is None:
@@ -423,17 +727,20 @@ class TaskCache:
                t.dueDate != t.dueTime.date():
                 t.dueTime = datetime.datetime.combine(
                     t.dueDate, t.dueTime.timetz())
-        self.cache['tasks'].extend(
-            t for t in tasks
-            if self.comp is None or
-            self.comp == 0 and not getattr(t, 'completedDate', None) or
-            self.comp == 1 and getattr(t, 'completedDate', None))
-        return [Task(**t.__dict__) for t in added_tasks]
+        for t in tasks:
+            if self.comp is None or \
+               self.comp == 0 and not getattr(t, 'completedDate', None) or \
+               self.comp == 1 and getattr(t, 'completedDate', None):
+                self._set_task(_Freeze(t))
+        self._tasks_changed()
+        # These aren't in the cache, so they don't need to be copied.
+        return added_tasks
 
     def EditTasks(self, tasks):  # pylint: disable=too-many-branches
         """Edit the specified tasks and update the cache to reflect them.
 
         See Toodledo.EditTasks for more information."""
+        # pylint: disable=too-many-locals
         #
         # The most complicated logic in this function is that we have to handle
         # tasks that are rescheduled by the server. That means:
@@ -445,7 +752,6 @@ class TaskCache:
         #   created tasks from the rescheduling, we need to update/add them to
         #   the cache.
         #
-        cache_map = {t.id_: t for t in self.cache['tasks']}
         rescheduling = [
             t for t in tasks
             if getattr(t, 'reschedule', False) and
@@ -456,8 +762,13 @@ class TaskCache:
             account = self.toodledo.GetAccount()
 
         edited_tasks = self.toodledo.EditTasks(tasks)
+        if rescheduling:
+            # Fetched before the cache is changed, so that it's left alone if
+            # this fails.
+            new_tasks = self.toodledo.GetTasks(
+                fields=self.fields, after=account.lastEditTask.timestamp() - 1)
         # Copy so we can modify
-        tasks = [Task(**task.__dict__) for task in tasks]
+        tasks = [task.Copy() for task in tasks]
 
         for t in tasks:
             try:
@@ -467,7 +778,7 @@ class TaskCache:
 
         # Update from fields returned by server
         for i, t in enumerate(tasks):
-            t.__dict__.update(edited_tasks[i].__dict__)
+            _Update(t, edited_tasks[i])
         # Figure out which tasks to update in cache and which to remove
         if self.comp is None:
             wanted = tasks
@@ -482,7 +793,7 @@ class TaskCache:
             unwanted = incomplete if self.comp == 1 else complete
         # Remove unwanted tasks
         for t in unwanted:
-            cache_map.pop(t.id_, None)
+            self._pop_task(t.id_)
 
         # Update wanted tasks
         for t in wanted:
@@ -493,21 +804,23 @@ class TaskCache:
                 t.dueTime = datetime.datetime.combine(
                     t.dueDate, t.dueTime.timetz())
 
-            if t.id_ in cache_map:
-                cache_map[t.id_].__dict__.update(t.__dict__)
+            if t.id_ in self._index:
+                # Cached tasks are read-only, so replace the cached task with
+                # an updated copy.
+                cached = self._index[t.id_].Copy()
+                _Update(cached, t)
+                self._set_task(_Freeze(cached))
             else:
                 # The task wasn't in the cache before because it transitioned
                 # from complete to incomplete or vice versa asnd the cache is
                 # only storing the other type.
-                cache_map[t.id_] = t
+                self._set_task(_Freeze(t))
 
         if rescheduling:
             # Add to the cache any modified tasks whose ids (complete) or
             # titles (incomplete) match the ones being rescheduled.
             ids = set(t.id_ for t in rescheduling)
             titles = set()
-            new_tasks = self.toodledo.GetTasks(
-                fields=self.fields, after=account.lastEditTask.timestamp() - 1)
             # Assumes ids go in in increasing order by when they're created
             new_tasks.sort(key=lambda t: t.id_)
             for t in new_tasks:
@@ -517,18 +830,19 @@ class TaskCache:
                     if ((self.comp is None or
                          (not t.completedDate and self.comp == 0) or
                          (t.completedDate and self.comp == 1))):
-                        cache_map[t.id_] = t
+                        self._set_task(_Freeze(t))
 
-        self.cache['tasks'] = list(cache_map.values())
+        self._tasks_changed()
 
-        return [Task(**t.__dict__) for t in edited_tasks]
+        # These aren't in the cache, so they don't need to be copied.
+        return edited_tasks
 
     def DeleteTasks(self, tasks):
         """Delete the specified tasks and update the cache to reflect them."""
         self.toodledo.DeleteTasks(tasks)
-        deleted_ids = [t.id_ for t in tasks]
-        self.cache['tasks'] = [t for t in self.cache['tasks']
-                               if t.id_ not in deleted_ids]
+        for t in tasks:
+            self._pop_task(t.id_)
+        self._tasks_changed()
 
     # Passthrough functions so that the cache object can be a drop-in
     # replacement for the session object.
@@ -563,8 +877,23 @@ class TaskCache:
         account.latDeleteTask = self.cache['newest_delete']
         return account
 
+    def _HandOut(self, task):
+        """Return a task from the cache the way the caller asked for"""
+        if self.read_only:
+            return _Freeze(task)
+        if isinstance(task, ReadOnlyTask):
+            return task.Copy()
+        # Already a copy made by _filter_tasks
+        return task
+
     def __getitem__(self, item):
-        return Task(**self.cache['tasks'][item].__dict__)
+        if isinstance(item, slice):
+            return [self._HandOut(t) for t in self.cache['tasks'][item]]
+        return self._HandOut(self.cache['tasks'][item])
+
+    def __iter__(self):
+        for task in self.cache['tasks']:
+            yield self._HandOut(task)
 
     def __len__(self):
         return len(self.cache['tasks'])
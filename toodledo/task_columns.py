@@ -0,0 +1,188 @@
+"""Columnar storage of the numeric and date fields of cached tasks"""
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Encoded value of fields that are unset or None, so that they sort first
+_MISSING = float("-inf")
+
+
+def _Timestamp(value):
+    return value.timestamp()
+
+
+def _Ordinal(value):
+    return value.toordinal()
+
+
+def _EnumValue(value):
+    return value.value
+
+
+# The task attributes that are stored in columns, and how to convert their
+# values to numbers that sort the same way
+_ENCODERS = {
+    "id_": float,
+    "modified": _Timestamp,
+    "dueDate": _Ordinal,
+    "startDate": _Ordinal,
+    "completedDate": _Ordinal,
+    "priority": _EnumValue,
+    "status": _EnumValue,
+    "folderId": float,
+    "contextId": float,
+    "parent": float,
+    "length": float,
+    "star": float,
+}
+
+
+def _Encode(task, attribute, convert):
+    value = getattr(task, attribute, None)
+    return _MISSING if value is None else convert(value)
+
+
+def _SortKey(attribute):
+    """Return a key function that sorts tasks by an attribute, with the
+    tasks in which it's unset or None first"""
+    convert = _ENCODERS.get(attribute)
+    if convert is not None:
+        return lambda task: _Encode(task, attribute, convert)
+
+    def key(task):
+        value = getattr(task, attribute, None)
+        return (value is not None, value)
+    return key
+
+
+class _TaskColumns:
+    """The numeric and date fields of a list of tasks, in numpy arrays.
+
+    `columns` maps each attribute in _ENCODERS to a float64 array with an
+    entry for each row in `tasks`, which is -inf if the attribute is unset
+    or None in the task. Strings and the other fields are only in the tasks
+    themselves.
+
+    Rows of deleted tasks are None in `tasks` and False in `live` until
+    there are enough of them to be worth compacting away, and the arrays
+    have room for more rows than are in use, so that tasks can be added,
+    replaced and deleted without copying the columns. The live rows are in
+    the order in which the tasks were first added.
+    """
+
+    def __init__(self):
+        if numpy is None:
+            raise ImportError(
+                "TaskCache(columnar=True) requires numpy; "
+                "install toodledo[columnar]")
+        self.tasks = []
+        self.rows = {}
+        self.live = numpy.empty(0, dtype=bool)
+        self.columns = {attribute: numpy.empty(0) for attribute in _ENCODERS}
+        self._deleted = 0
+
+    def Sync(self, tasks):
+        """Update the columns to match a list of tasks.
+
+        Only the tasks that weren't in the list the columns were last
+        synced with, i.e. that aren't the very same objects, are encoded;
+        the rest are assumed not to have been modified, as the cache's
+        ReadOnlyTask objects can't be.
+
+        Required arguments:
+        tasks -- the new list of tasks
+        """
+        tasks = list(tasks)
+        rows = {id(task): row for row, task in enumerate(self.tasks)
+                if task is not None}
+        old = numpy.fromiter((rows.get(id(task), -1) for task in tasks),
+                             numpy.intp, len(tasks))
+        new = numpy.flatnonzero(old < 0)
+        added = [tasks[row] for row in new.tolist()]
+        for attribute, convert in _ENCODERS.items():
+            # Rows of new tasks are filled in below
+            column = self.columns[attribute][old] if len(self.tasks) else \
+                numpy.empty(len(tasks))
+            column[new] = numpy.fromiter(
+                (_Encode(task, attribute, convert) for task in added),
+                numpy.float64, len(added))
+            self.columns[attribute] = column
+        self.tasks = tasks
+        self.rows = {task.id_: row for row, task in enumerate(tasks)}
+        self.live = numpy.ones(len(tasks), dtype=bool)
+        self._deleted = 0
+
+    def Update(self, changed, deleted):
+        """Update the rows of the tasks that were added, replaced or
+        deleted, leaving the others alone.
+
+        Deleted tasks are removed before the changed ones are added, so a
+        task that was deleted and added again gets a new row at the end.
+
+        Required arguments:
+        changed -- the new and replaced tasks
+        deleted -- the ids of the deleted tasks
+        """
+        for id_ in deleted:
+            row = self.rows.pop(id_, None)
+            if row is not None:
+                self.tasks[row] = None
+                self.live[row] = False
+                self._deleted += 1
+        rows = []
+        for task in changed:
+            row = self.rows.get(task.id_)
+            if row is None:
+                row = self.rows[task.id_] = len(self.tasks)
+                self.tasks.append(task)
+            else:
+                self.tasks[row] = task
+            rows.append(row)
+        self._Reserve(len(self.tasks))
+        for attribute, convert in _ENCODERS.items():
+            self.columns[attribute][rows] = numpy.fromiter(
+                (_Encode(task, attribute, convert) for task in changed),
+                numpy.float64, len(changed))
+        self.live[rows] = True
+        if self._deleted > len(self.tasks) // 2:
+            self.Sync(task for task in self.tasks if task is not None)
+
+    def _Reserve(self, count):
+        # Make room for count rows, doubling the arrays when they grow so
+        # that adding tasks one at a time doesn't copy them every time.
+        capacity = len(self.live)
+        if count <= capacity:
+            return
+        size = max(count, 2 * capacity, 16)
+        for attribute, column in self.columns.items():
+            grown = numpy.empty(size)
+            grown[:capacity] = column
+            self.columns[attribute] = grown
+        live = numpy.zeros(size, dtype=bool)
+        live[:capacity] = self.live
+        self.live = live
+
+    def Select(self, params):
+        """Return the rows of the tasks matching the `comp` filter
+        parameter, as a numpy array"""
+        count = len(self.tasks)
+        mask = self.live[:count].copy()
+        completed = self.columns['completedDate'][:count]
+        if params.get('comp', None) == 0:
+            mask &= completed == _MISSING
+        elif params.get('comp', None) == 1:
+            mask &= completed != _MISSING
+        return numpy.flatnonzero(mask)
+
+    def Sort(self, rows, attribute, reverse=False):
+        """Sort rows by a column, keeping rows with equal values in order"""
+        values = self.columns[attribute][rows]
+        return rows[numpy.argsort(-values if reverse else values,
+                                  kind="stable")]
+
+    def Tasks(self, rows):
+        """Return the tasks in rows"""
+        tasks = self.tasks
+        return [tasks[row] for row in rows.tolist()]
@@ -0,0 +1,339 @@
+"""Storage of TaskCache contents on disk"""
+
+from contextlib import closing
+import os
+import pickle
+import sqlite3
+import struct
+import tempfile
+import zlib
+
+from .json_backend import DefaultJsonBackend
+from .task import _StoredTask, _TASK_CODEC
+
+
+class TaskStore:
+    """Stores the contents of a TaskCache on disk.
+
+    The contents are a dict with a list of tasks in its 'tasks' entry.
+    PickleTaskStore and SqliteTaskStore are the implementations."""
+
+    def Load(self, path):
+        """Return the cache dict stored at path
+
+        Required arguments:
+        path -- path of the stored cache
+        """
+        raise NotImplementedError()
+
+    def Save(self, path, cache):
+        """Store the cache dict at path
+
+        Required arguments:
+        path -- path of the stored cache
+        cache -- the cache dict
+        """
+        raise NotImplementedError()
+
+    def Signature(self, path):
+        """Return a value which changes whenever the cache stored at path is
+        written, or None if there's no cache there. TaskCache uses it to
+        tell when another process has saved a shared cache.
+
+        Required arguments:
+        path -- path of the stored cache
+        """
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def Changed(self, path, cache, changed, deleted):
+        """Called by TaskCache whenever the cache has changed. Stores that
+        persist every change, rather than only when the cache is saved, do
+        so here.
+
+        Required arguments:
+        path -- path of the stored cache
+        cache -- the cache dict
+        changed -- list of the tasks that were added or replaced since the
+                   last call, or None if any of them may have been
+        deleted -- collection of the ids of the tasks that were deleted
+                   since the last call, or None if `changed` is None; a
+                   task that was deleted and added again is in both
+        """
+
+
+def _Changes(stored, cache):
+    """Compare the tasks in a cache dict with the ones last stored.
+
+    Tasks are compared by identity, which relies on the cache replacing
+    tasks rather than modifying them when they change.
+
+    Required arguments:
+    stored -- dict mapping ids to the tasks last stored
+    cache -- the cache dict
+
+    Returns a dict mapping ids to the tasks in the cache, a list of the ones
+    that are new or changed, and a list of the ids of deleted tasks.
+    """
+    tasks = {task.id_: task for task in cache['tasks']}
+    changed = [task for id_, task in tasks.items()
+               if stored.get(id_) is not task]
+    return tasks, changed, list(stored.keys() - tasks.keys())
+
+
+class PickleTaskStore(TaskStore):
+    """Stores a task cache as a pickle file, which is rewritten in full
+    every time the cache is saved. This is the default.
+
+    The pickle is written to a temporary file which is then renamed over
+    the cache file, so the file is never left partially written."""
+
+    def Load(self, path):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    def Save(self, path, cache):
+        fd, tempPath = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(path)),
+            prefix=os.path.basename(path) + ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(cache, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tempPath, path)
+        except BaseException:
+            os.unlink(tempPath)
+            raise
+
+
+class SqliteTaskStore(TaskStore):
+    """Stores a task cache in an SQLite database.
+
+    Each task is a row in the `tasks` table, as the JSON the API would send
+    for it, and the cache's other entries, such as `newest`, `newest_delete`,
+    `comp` and `fields`, are pickled in rows of the `metadata` table.
+
+    Saving writes only the tasks that have been added, changed or deleted
+    since the cache was last loaded or saved by this store, so it's much
+    faster than rewriting a pickle for large caches. This relies on cached
+    tasks being replaced rather than modified when they change, as TaskCache
+    does. Loaded tasks are read-only and decode each field the first time
+    it's accessed.
+    """
+
+    def __init__(self, jsonBackend=None):
+        """Initialize a new SqliteTaskStore object.
+
+        Keyword arguments:
+        jsonBackend -- object with `Loads` and `Dumps` methods used to encode
+                       and decode tasks (default: OrjsonBackend if orjson is
+                       installed, otherwise JsonBackend)
+        """
+        self.jsonBackend = jsonBackend or DefaultJsonBackend()
+        # The path last loaded or saved, and the tasks stored there by id
+        self._path = None
+        self._stored = {}
+
+    def _Connect(self, path):
+        connection = sqlite3.connect(path)
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS tasks "
+            "(id INTEGER PRIMARY KEY, data TEXT NOT NULL)")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS metadata "
+            "(name TEXT PRIMARY KEY, value BLOB NOT NULL)")
+        return connection
+
+    def Signature(self, path):
+        signature = super().Signature(path)
+        if signature is None:
+            return None
+        # The file change counter in the database header changes with every
+        # transaction, even within the resolution of the mtime.
+        with open(path, 'rb') as f:
+            f.seek(24)
+            return signature + (f.read(4),)
+
+    def Load(self, path):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No task cache at {path}")
+        loads = self.jsonBackend.Loads
+        with closing(self._Connect(path)) as connection:
+            cache = {name: pickle.loads(value) for name, value in
+                     connection.execute("SELECT name, value FROM metadata")}
+            stored = {id_: _StoredTask(loads(data)) for id_, data in
+                      connection.execute("SELECT id, data FROM tasks")}
+        cache['tasks'] = list(stored.values())
+        self._path = os.path.realpath(path)
+        self._stored = stored
+        return cache
+
+    def Save(self, path, cache):
+        path = os.path.realpath(path)
+        full = path != self._path
+        tasks, changed, deleted = _Changes({} if full else self._stored,
+                                           cache)
+        with closing(self._Connect(path)) as connection:
+            with connection:  # A transaction
+                if full:
+                    connection.execute("DELETE FROM tasks")
+                connection.executemany(
+                    "DELETE FROM tasks WHERE id = ?",
+                    ((id_,) for id_ in deleted))
+                dumps = self.jsonBackend.Dumps
+                connection.executemany(
+                    "INSERT OR REPLACE INTO tasks (id, data) VALUES (?, ?)",
+                    ((task.id_, dumps(_TASK_CODEC.Dump(task)))
+                     for task in changed))
+                connection.execute("DELETE FROM metadata")
+                connection.executemany(
+                    "INSERT INTO metadata (name, value) VALUES (?, ?)",
+                    ((name, pickle.dumps(value))
+                     for name, value in cache.items() if name != 'tasks'))
+        self._path = path
+        self._stored = tasks
+
+
+# Header of each journal record: the length and CRC-32 of the pickled record
+_RECORD_HEADER = struct.Struct("<II")
+
+
+def _ReadJournal(journal):
+    """Return the records in a journal and its size. Anything after the
+    last complete record is discarded, so new records follow it."""
+    try:
+        with open(journal, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return [], 0
+    records = []
+    offset = 0
+    while offset + _RECORD_HEADER.size <= len(data):
+        length, crc = _RECORD_HEADER.unpack_from(data, offset)
+        start = offset + _RECORD_HEADER.size
+        record = data[start:start + length]
+        if len(record) < length or zlib.crc32(record) != crc:
+            break
+        records.append(pickle.loads(record))
+        offset = start + length
+    if offset < len(data):
+        os.truncate(journal, offset)
+    return records, offset
+
+
+class JournaledTaskStore(TaskStore):
+    """Stores a task cache as a snapshot and a journal of the changes made
+    to it since the snapshot was written.
+
+    Whenever the cache changes, including when tasks are added, edited or
+    deleted through it and when it's updated, a record of the changed tasks
+    and other entries is appended to the journal, which is next to the
+    snapshot with ".journal" added to its name. So changes are persisted as
+    soon as they're made, at a cost which depends on how many tasks changed
+    rather than on the size of the cache. When the journal gets bigger than
+    `compactSize`, the snapshot is rewritten and the journal emptied.
+
+    Loading the cache replays the journal on top of the snapshot. Records
+    are written with a checksum and synced to disk, and a record that was
+    only partially written, e.g. because of a crash, is ignored.
+    """
+
+    def __init__(self, snapshotStore=None, compactSize=4 * 1024 * 1024):
+        """Initialize a new JournaledTaskStore object.
+
+        Keyword arguments:
+        snapshotStore -- TaskStore used for the snapshot (default:
+                         PickleTaskStore())
+        compactSize -- size of the journal in bytes at which it's folded
+                       into the snapshot (default: 4 MiB)
+        """
+        self.snapshotStore = snapshotStore or PickleTaskStore()
+        self.compactSize = compactSize
+        # The path last loaded or saved, the tasks stored there by id, its
+        # other entries, and the size of its journal
+        self._path = None
+        self._stored = {}
+        self._metadata = {}
+        self._size = 0
+
+    def Load(self, path):
+        cache = self.snapshotStore.Load(path)
+        tasks = {task.id_: task for task in cache.pop('tasks')}
+        records, size = _ReadJournal(path + ".journal")
+        for changed, deleted, metadata in records:
+            for id_ in deleted:
+                tasks.pop(id_, None)
+            for task in changed:
+                tasks[task.id_] = task
+            cache.update(metadata)
+        self._path = os.path.realpath(path)
+        self._stored = tasks
+        self._metadata = dict(cache)
+        self._size = size
+        cache['tasks'] = list(tasks.values())
+        return cache
+
+    def Save(self, path, cache):
+        path = os.path.realpath(path)
+        if path != self._path or not os.path.exists(path):
+            self._Compact(path, cache)
+            return
+        _, changed, deleted = _Changes(self._stored, cache)
+        self._Journal(path, cache, changed, deleted)
+
+    def Changed(self, path, cache, changed, deleted):
+        # Only the tasks TaskCache says have changed are journaled, so that
+        # the cost doesn't depend on the size of the cache.
+        if changed is None:
+            self.Save(path, cache)
+            return
+        path = os.path.realpath(path)
+        if path != self._path or not os.path.exists(path):
+            self._Compact(path, cache)
+            return
+        self._Journal(path, cache, changed,
+                      [id_ for id_ in deleted if id_ in self._stored])
+
+    def _Journal(self, path, cache, changed, deleted):
+        metadata = {name: value for name, value in cache.items()
+                    if name != 'tasks' and
+                    (name not in self._metadata or
+                     self._metadata[name] != value)}
+        if not (changed or deleted or metadata):
+            return
+        record = pickle.dumps((changed, deleted, metadata))
+        with open(path + ".journal", 'ab') as f:
+            f.write(_RECORD_HEADER.pack(len(record), zlib.crc32(record)))
+            f.write(record)
+            f.flush()
+            os.fsync(f.fileno())
+        # In the same order as the journal is replayed
+        for id_ in deleted:
+            del self._stored[id_]
+        for task in changed:
+            self._stored[task.id_] = task
+        self._metadata.update(metadata)
+        self._size += _RECORD_HEADER.size + len(record)
+        if self._size >= self.compactSize:
+            self._Compact(path, cache)
+
+    def Signature(self, path):
+        return (self.snapshotStore.Signature(path),
+                super().Signature(path + ".journal"))
+
+    def _Compact(self, path, cache):
+        # Every change is in the journal before it's compacted, so if this
+        # is interrupted after the snapshot is written, replaying the
+        # journal on top of it doesn't change anything.
+        self.snapshotStore.Save(path, cache)
+        with open(path + ".journal", 'wb') as f:
+            os.fsync(f.fileno())
+        self._path = path
+        self._stored = {task.id_: task for task in cache['tasks']}
+        self._metadata = {name: value for name, value in cache.items()
+                          if name != 'tasks'}
+        self._size = 0
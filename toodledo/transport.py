@@ -1,18 +1,27 @@
 """Implementation"""
 
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 import datetime
 from itertools import islice
 from json import dumps
 import logging
+import threading
+import time
 
+from requests import ConnectionError as RequestsConnectionError, Timeout
+from requests.adapters import HTTPAdapter
 from requests_oauthlib import OAuth2Session
 
 from .account import _AccountSchema
 from .context import _ContextSchema
-from .errors import ToodledoError
+from .errors import ToodledoBulkError, ToodledoError
 from .folder import _FolderSchema
-from .task import _DumpTaskList, _TaskSchema
+from .history import RequestHistory
+from .json_backend import DefaultJsonBackend
+from .metrics import InMemoryMetrics
+from .task import _DumpTaskList, _LoadLazyTasks, _TASK_CODEC
 from .deleted_task import _DeletedTaskSchema
 
 
@@ -20,38 +29,257 @@ class AuthorizationNeeded(Exception):
     """Thrown when the token storage doesn't contain a token"""
 
 
+def _CheckError(logger, jsonResponse):
+    """Raise a ToodledoError if the decoded response is an error"""
+    if "errorCode" in jsonResponse:
+        logger.error("Toodledo error: %s", jsonResponse)
+        raise ToodledoError(jsonResponse["errorCode"])
+
+
+def _CheckTaskErrors(taskResponse):
+    """Raise the errors, if any, in a response to a task add or edit"""
+    errors = []
+    if isinstance(taskResponse, list):
+        for response in taskResponse:
+            if "errorCode" in response:
+                errors.append(ToodledoError(response["errorCode"]))
+    elif "errorCode" in taskResponse:
+        errors.append(ToodledoError(taskResponse["errorCode"]))
+    if len(errors) == 1:
+        raise errors[0]
+    if errors:
+        # pylint: disable=broad-exception-raised
+        raise Exception(str(errors))
+        # pylint: enable=broad-exception-raised
+
+
+def _GetTasksParams(params, before, after, comp, id_, fields):
+    """Combine the arguments to GetTasks into a single params dict"""
+    if params is None:
+        params = {}
+    if before:
+        params['before'] = before
+    if after:
+        params['after'] = after
+    if comp is not None:
+        params['comp'] = comp
+    if id_:
+        params['id'] = id_
+    if fields:
+        params['fields'] = fields
+    params = params.copy()
+    if 'before' in params and isinstance(params['before'],
+                                         datetime.datetime):
+        params['before'] = params['before'].timestamp()
+    if 'after' in params and isinstance(params['after'],
+                                        datetime.datetime):
+        params['after'] = params['after'].timestamp()
+    return params
+
+
+def _IsOffline(jsonResponse):
+    """Indicate whether the decoded response says the API is offline"""
+    return isinstance(jsonResponse, dict) and \
+        jsonResponse.get("errorCode") == 4
+
+
+def _TaskPageOffsets(firstPage, limit):
+    """Return the start offsets of the pages after the first one.
+
+    Returns None if the first page doesn't tell us how many tasks there are,
+    in which case the caller has to keep fetching pages until it gets a short
+    one."""
+    if len(firstPage) - 1 < limit:
+        return []
+    # the first field contains the count and total
+    total = firstPage[0].get("total") if isinstance(firstPage[0], dict) \
+        else None
+    if total is None:
+        return None
+    return list(range(limit, int(total), limit))
+
+
+def _ChunkResults(chunks, errors, results):
+    """Return the results of posting chunks of a bulk write in parallel, or
+    raise a ToodledoBulkError if any of them failed.
+
+    Required arguments:
+    chunks -- the chunks that were posted
+    errors -- the exception raised for each chunk, or None if it succeeded
+    results -- the result for each chunk, or None if it failed
+    """
+    failed = {}
+    ends = {}
+    start = 0
+    for chunk, error in zip(chunks, errors):
+        if error is not None:
+            failed[start] = error
+            ends[start] = start + len(chunk) - 1
+        start += len(chunk)
+    if failed:
+        raise ToodledoBulkError(failed, results, ends)
+    return results
+
+
+def _SetBaseUrl(api, baseUrl):
+    """Point all the endpoint URLs of an API object at another server"""
+    for name, url in vars(Toodledo).items():
+        if name.endswith("Url") and name != "baseUrl":
+            setattr(api, name, baseUrl + url[len(Toodledo.baseUrl):])
+    api.baseUrl = baseUrl
+
+
+def _LoadTasks(rawTasks, lazy=False):
+    """Convert raw task dicts from the API into Task objects, or LazyTask
+    objects if `lazy` is true"""
+    for x in rawTasks:
+        # This field is sometimes being leaked by the API and should be
+        # ignored.
+        x.pop('repeatfrom', None)
+    if lazy:
+        return _LoadLazyTasks(rawTasks)
+    return _TASK_CODEC.LoadMany(rawTasks)
+
+
 class ToodledoSession(OAuth2Session):
-    """Refresh token when we get a 429 error"""
+    """Refresh token when we get a 429 error.
+
+    Only one thread refreshes the token at a time. If the token storage has
+    a `Lock()` context manager, as TokenStorageFile does, only one process
+    sharing the storage refreshes it at a time, and the others pick up the
+    refreshed token from the storage instead of refreshing it again."""
     def __init__(self, *args, **kwargs):
         self.toodledo_logger = logging.getLogger(__name__)
-        self.toodledo_refreshing = False
-        self.toodledo_history_count = kwargs.pop('history_count', None)
-        self.toodledo_history = []
+        self.toodledo_refresh_lock = threading.Lock()
+        self.toodledo_token_storage = kwargs.pop('token_storage', None)
+        self.toodledo_history = RequestHistory(
+            kwargs.pop('history_count', None),
+            kwargs.pop('history_bodies', 'failures'))
+        self.toodledo_rate_limiter = kwargs.pop('rate_limiter', None)
+        self.toodledo_metrics = kwargs.pop('metrics', None)
+        self.toodledo_timeout = kwargs.pop('timeout', None)
+        self.toodledo_refresh_margin = kwargs.pop('refresh_margin', None)
+        pool_size = kwargs.pop('pool_size', None)
+        keep_alive = kwargs.pop('keep_alive', True)
         super().__init__(*args, **kwargs)
+        if pool_size:
+            for prefix in ('https://', 'http://'):
+                self.mount(prefix, HTTPAdapter(pool_connections=pool_size,
+                                               pool_maxsize=pool_size))
+        if not keep_alive:
+            self.headers['Connection'] = 'close'
+
+    def toodledo_send(self, *args, **kwargs):
+        if self.toodledo_rate_limiter:
+            # Only reserve() is required of rate limiters, as for
+            # AsyncToodledoSession
+            delay = self.toodledo_rate_limiter.reserve()
+            if delay > 0:
+                time.sleep(delay)
+        # OAuth2Session.refresh_token passes timeout=None explicitly
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.toodledo_timeout
+        if not self.toodledo_metrics:
+            return super().request(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return super().request(*args, **kwargs)
+        except Exception:
+            # Requests that never got a response are recorded here; the rest
+            # are recorded by toodledo_save.
+            self.toodledo_metrics.Record(
+                args[1], 0, 0, time.perf_counter() - started)
+            raise
 
-    def toodledo_save(self, response, method, url, data=None, headers=None,
-                      **kwargs):
-        if not self.toodledo_history_count:
-            return
-        self.toodledo_history.insert(0, (method, url, data, headers, response))
-        self.toodledo_history[self.toodledo_history_count:] = []
+    @property
+    def toodledo_history_count(self):
+        return self.toodledo_history.maxlen
+
+    @toodledo_history_count.setter
+    def toodledo_history_count(self, count):
+        # Newest first, so keep the first `count` records
+        self.toodledo_history = RequestHistory(
+            count, self.toodledo_history.bodies,
+            islice(self.toodledo_history, count or 0))
+
+    def toodledo_save(self, response, started, retries, refreshes, method,
+                      url, params=None, **kwargs):
+        elapsed = time.perf_counter() - started
+        body = response.content
+        self.toodledo_history.Record(
+            method, url, response.status_code, body, elapsed,
+            retries + refreshes, params)
+        if self.toodledo_metrics:
+            self.toodledo_metrics.Record(
+                url, response.status_code, len(body), elapsed, refreshes,
+                b'"errorCode"' in body)
+
+    def toodledo_expiring(self):
+        """Indicate whether the token expires within the refresh margin"""
+        if self.toodledo_refresh_margin is None:
+            return False
+        expires_at = self.token.get('expires_at')
+        if expires_at is None:
+            return False
+        return time.time() + self.toodledo_refresh_margin >= \
+            float(expires_at)
+
+    def toodledo_refresh(self, stale_token):
+        """Replace `stale_token` with a new one.
+
+        Does nothing if another thread has already replaced it, and uses the
+        token in storage if another process has already replaced it."""
+        with self.toodledo_refresh_lock:
+            if self.token.get('access_token') != \
+               stale_token.get('access_token'):
+                return
+            storage_lock = getattr(self.toodledo_token_storage, 'Lock', None)
+            if storage_lock is None:
+                self.toodledo_refresh_token()
+                return
+            with storage_lock():
+                stored = self.toodledo_token_storage.Load()
+                if stored and stored.get('access_token') != \
+                   stale_token.get('access_token'):
+                    self.toodledo_logger.debug(
+                        "Using token refreshed by another process")
+                    self.token = stored
+                    return
+                self.toodledo_refresh_token()
+
+    def toodledo_refresh_token(self):
+        token = self.refresh_token(
+            self.auto_refresh_url, **self.auto_refresh_kwargs)
+        self.token_updater(token)
 
     def request(self, *args, **kwargs):  # pylint: disable=too-many-arguments
-        response = super().request(*args, **kwargs)
+        started = time.perf_counter()
+        # Number of times the caller has already retried this request, for
+        # the history
+        retries = kwargs.pop('toodledo_retries', 0)
+        # refresh_token sends its request with withhold_token set; we mustn't
+        # try to refresh the token while refreshing it.
+        if kwargs.get('withhold_token'):
+            response = self.toodledo_send(*args, **kwargs)
+            self.toodledo_save(response, started, retries, 0, *args, **kwargs)
+            return response
+        token = self.token
+        if self.toodledo_expiring():
+            self.toodledo_logger.debug(
+                "Token expires at %s - refreshing", token['expires_at'])
+            self.toodledo_refresh(token)
+            token = self.token
+        response = self.toodledo_send(*args, **kwargs)
         if response.status_code != 429:
-            self.toodledo_refreshing = False
-            self.toodledo_save(response, *args, **kwargs)
+            self.toodledo_save(response, started, retries, 0, *args, **kwargs)
             return response
-        if self.toodledo_refreshing:
-            response.raise_for_status()
-        self.toodledo_refreshing = True
         self.toodledo_logger.warning(
             "Received 429 error - refreshing token and retrying")
-        token = self.refresh_token(
-            Toodledo.tokenUrl, **self.auto_refresh_kwargs)
-        self.token_updater(token)
-        response = super().request(*args, **kwargs)
-        self.toodledo_save(response, *args, **kwargs)
+        self.toodledo_refresh(token)
+        response = self.toodledo_send(*args, **kwargs)
+        self.toodledo_save(response, started, retries, 1, *args, **kwargs)
+        if response.status_code == 429:
+            response.raise_for_status()
         return response
 
 
@@ -74,12 +302,85 @@ class Toodledo:
     editContextUrl = baseUrl + "contexts/edit.php"
     deleteContextUrl = baseUrl + "contexts/delete.php"
 
-    def __init__(self, clientId, clientSecret, tokenStorage, scope):
+    def __init__(  # pylint: disable=too-many-locals
+            self, clientId, clientSecret, tokenStorage, scope,
+            pageConcurrency=None, writeConcurrency=None,
+            rateLimiter=None, retryPolicy=None, poolSize=None, timeout=None,
+            keepAlive=True, refreshMargin=60, historyCount=None,
+            historyBodies="failures", metrics=None, baseUrl=None,
+            jsonBackend=None, lazyTasks=False):
+        """Initialize a new Toodledo API object.
+
+        Required arguments:
+        clientId -- client ID of the registered app
+        clientSecret -- client secret of the registered app
+        tokenStorage -- object with `Load` and `Save` methods for the token
+        scope -- OAuth scope string
+
+        Keyword arguments:
+        pageConcurrency -- (int) if specified, GetTasks fetches the pages
+                           after the first one this many at a time in parallel
+                           (default: fetch pages one at a time)
+        writeConcurrency -- (int) if specified, AddTasks, EditTasks and
+                            DeleteTasks submit this many 50-task chunks at a
+                            time in parallel, and raise ToodledoBulkError if
+                            any of them fail (default: one chunk at a time)
+        rateLimiter -- object with a `reserve()` method, such as a
+                       TokenBucketRateLimiter, which every request made by
+                       this object waits on; share one between all the API
+                       objects for an account (default: no rate limiting)
+        retryPolicy -- RetryPolicy for retrying reads that fail with transient
+                       errors (default: don't retry)
+        poolSize -- (int) maximum number of connections to keep open to the
+                    API; set this to at least pageConcurrency or
+                    writeConcurrency (default: requests' default of 10)
+        timeout -- timeout in seconds for every request, either a number or
+                   a (connect timeout, read timeout) tuple
+                   (default: no timeout)
+        keepAlive -- reuse connections between requests (default: True)
+        refreshMargin -- refresh the token before sending a request if it
+                         expires within this many seconds, or None to refresh
+                         only when the API rejects it (default: 60)
+        historyCount -- (int) number of recent requests to keep in the
+                        request history (default: don't keep a history)
+        historyBodies -- which response bodies to keep in the history: True
+                         for all, False for none, or "failures" for only
+                         failed requests (default: "failures")
+        metrics -- metrics sink with a `Record` method, such as an
+                   InMemoryMetrics, to which every request is reported, or
+                   False to not collect metrics (default: a new
+                   InMemoryMetrics, available as the `metrics` attribute)
+        baseUrl -- base URL of the API, e.g. that of a FakeToodledoServer
+                   (default: "https://api.toodledo.com/3/")
+        jsonBackend -- object with `Loads` and `Dumps` methods, such as a
+                       JsonBackend or OrjsonBackend, for decoding responses
+                       and encoding task lists (default: OrjsonBackend if
+                       orjson is installed, otherwise JsonBackend)
+        lazyTasks -- GetTasks and IterTasks return LazyTask objects, which
+                     decode each field when it's first accessed
+                     (default: False)
+        """
         self.logger = logging.getLogger(__name__)
         self.tokenStorage = tokenStorage
         self.clientId = clientId
         self.clientSecret = clientSecret
         self.scope = scope
+        self.pageConcurrency = pageConcurrency
+        self.writeConcurrency = writeConcurrency
+        self.rateLimiter = rateLimiter
+        self.retryPolicy = retryPolicy
+        self.poolSize = poolSize
+        self.timeout = timeout
+        self.keepAlive = keepAlive
+        self.refreshMargin = refreshMargin
+        self.historyCount = historyCount
+        self.historyBodies = historyBodies
+        self.metrics = InMemoryMetrics() if metrics is None else metrics
+        self.jsonBackend = DefaultJsonBackend() if jsonBackend is None \
+            else jsonBackend
+        self.lazyTasks = lazyTasks
+        if baseUrl is not None:
+            _SetBaseUrl(self, baseUrl)
         self.__session = None
 
     @property
@@ -101,106 +402,147 @@ class Toodledo:
                 "client_id": self.clientId,
                 "client_secret": self.clientSecret
             },
-            auto_refresh_url=Toodledo.tokenUrl,
-            token_updater=self.tokenStorage.Save)
+            auto_refresh_url=self.tokenUrl,
+            token_updater=self.tokenStorage.Save,
+            token_storage=self.tokenStorage,
+            rate_limiter=self.rateLimiter,
+            pool_size=self.poolSize,
+            timeout=self.timeout,
+            keep_alive=self.keepAlive,
+            refresh_margin=self.refreshMargin,
+            history_count=self.historyCount,
+            history_bodies=self.historyBodies,
+            metrics=self.metrics)
 
     @property
     def _history(self):
         return self._session.toodledo_history
 
+    def _Decode(self, response):
+        return self.jsonBackend.Loads(response.content)
+
+    def _Get(self, url, params=None):
+        """Fetch and decode a read-only endpoint, retrying transient errors
+        according to retryPolicy"""
+        attempt = 0
+        while True:
+            retryAfter = None
+            try:
+                response = self._session.get(url, params=params,
+                                             toodledo_retries=attempt)
+            except (RequestsConnectionError, Timeout) as e:
+                reason = "timeout" if isinstance(e, Timeout) \
+                    else "connection_error"
+                delay = self._RetryDelay(attempt, reason)
+                if delay is None:
+                    raise
+            else:
+                if self.retryPolicy and \
+                   response.status_code in self.retryPolicy.retryStatuses:
+                    reason = f"http_{response.status_code}"
+                    retryAfter = response.headers.get("Retry-After")
+                    delay = self._RetryDelay(attempt, reason, retryAfter)
+                    if delay is None:
+                        response.raise_for_status()
+                else:
+                    response.raise_for_status()
+                    jsonResponse = self._Decode(response)
+                    if not _IsOffline(jsonResponse):
+                        return jsonResponse
+                    reason = "api_offline"
+                    delay = self._RetryDelay(attempt, reason)
+                    if delay is None:
+                        return jsonResponse
+            self.logger.warning("Retrying %s in %.1f seconds (%s)",
+                                url, delay, reason)
+            time.sleep(delay)
+            attempt += 1
+
+    def _RetryDelay(self, attempt, reason, retryAfter=None):
+        if not self.retryPolicy:
+            return None
+        return self.retryPolicy.Delay(attempt, reason, retryAfter)
+
     def GetFolders(self):
         """Get all the folders as folder objects"""
-        folders = self._session.get(Toodledo.getFoldersUrl)
-        folders.raise_for_status()
+        folders = self._Get(self.getFoldersUrl)
         schema = _FolderSchema()
-        return [schema.load(x) for x in folders.json()]
+        return [schema.load(x) for x in folders]
 
     def AddFolder(self, folder):
         """Add folder, return the created folder"""
         response = self._session.post(
-            Toodledo.addFolderUrl,
+            self.addFolderUrl,
             data={
                 "name": folder.name,
                 "private": 1 if folder.private else 0
             })
         response.raise_for_status()
-        if "errorCode" in response.json():
-            self.logger.error("Toodledo error: %s", response.json())
-            raise ToodledoError(response.json()["errorCode"])
-        return _FolderSchema().load(response.json()[0])
+        jsonResponse = self._Decode(response)
+        _CheckError(self.logger, jsonResponse)
+        return _FolderSchema().load(jsonResponse[0])
 
     def DeleteFolder(self, folder):
         """Delete folder"""
-        response = self._session.post(Toodledo.deleteFolderUrl,
+        response = self._session.post(self.deleteFolderUrl,
                                       data={"id": folder.id_})
         response.raise_for_status()
-        jsonResponse = response.json()
-        if "errorCode" in jsonResponse:
-            self.logger.error("Toodledo error: %s", jsonResponse)
-            raise ToodledoError(jsonResponse["errorCode"])
+        jsonResponse = self._Decode(response)
+        _CheckError(self.logger, jsonResponse)
         assert jsonResponse == {"deleted": folder.id_}, dumps(jsonResponse)
 
     def EditFolder(self, folder):
         """Edits the given folder to have the given properties"""
         folderData = _FolderSchema().dump(folder)
-        response = self._session.post(Toodledo.editFolderUrl,
+        response = self._session.post(self.editFolderUrl,
                                       data=folderData)
         response.raise_for_status()
-        responseAsDict = response.json()
-        if "errorCode" in responseAsDict:
-            self.logger.error("Toodledo error: %s", responseAsDict)
-            raise ToodledoError(responseAsDict["errorCode"])
+        responseAsDict = self._Decode(response)
+        _CheckError(self.logger, responseAsDict)
         return _FolderSchema().load(responseAsDict[0])
 
     def GetContexts(self):
         """Get all the contexts as context objects"""
-        contexts = self._session.get(Toodledo.getContextsUrl)
-        contexts.raise_for_status()
+        contexts = self._Get(self.getContextsUrl)
         schema = _ContextSchema()
-        return [schema.load(x) for x in contexts.json()]
+        return [schema.load(x) for x in contexts]
 
     def AddContext(self, context):
         """Add context, return the created context"""
         response = self._session.post(
-            Toodledo.addContextUrl,
+            self.addContextUrl,
             data={
                 "name": context.name,
                 "private": 1 if context.private else 0
             })
         response.raise_for_status()
-        if "errorCode" in response.json():
-            self.logger.error("Toodledo error: %s", response.json())
-            raise ToodledoError(response.json()["errorCode"])
-        return _ContextSchema().load(response.json()[0])
+        jsonResponse = self._Decode(response)
+        _CheckError(self.logger, jsonResponse)
+        return _ContextSchema().load(jsonResponse[0])
 
     def DeleteContext(self, context):
         """Delete context"""
         response = self._session.post(
-            Toodledo.deleteContextUrl, data={"id": context.id_})
+            self.deleteContextUrl, data={"id": context.id_})
         response.raise_for_status()
-        jsonResponse = response.json()
-        if "errorCode" in jsonResponse:
-            self.logger.error("Toodledo error: %s", jsonResponse)
-            raise ToodledoError(jsonResponse["errorCode"])
+        jsonResponse = self._Decode(response)
+        _CheckError(self.logger, jsonResponse)
         assert jsonResponse == {"deleted": context.id_}, dumps(jsonResponse)
 
     def EditContext(self, context):
         """Edits the given folder to have the given properties"""
         contextData = _ContextSchema().dump(context)
         response = self._session.post(
-            Toodledo.editContextUrl, data=contextData)
+            self.editContextUrl, data=contextData)
         response.raise_for_status()
-        responseAsDict = response.json()
-        if "errorCode" in responseAsDict:
-            self.logger.error("Toodledo error: %s", responseAsDict)
-            raise ToodledoError(responseAsDict["errorCode"])
+        responseAsDict = self._Decode(response)
+        _CheckError(self.logger, responseAsDict)
         return _ContextSchema().load(responseAsDict[0])
 
     def GetAccount(self):
         """Get the Toodledo account"""
-        accountInfo = self._session.get(Toodledo.getAccountUrl)
-        accountInfo.raise_for_status()
-        return _AccountSchema().load(accountInfo.json())
+        accountInfo = self._Get(self.getAccountUrl)
+        return _AccountSchema().load(accountInfo)
 
     def GetTasks(self, params=None, before=None, after=None, comp=None,
                  id_=None, fields=None):
@@ -208,51 +550,57 @@ class Toodledo:
 
         You can params in the params array as for the raw API, or in the
         `before`, `after`, `comp`, `id_`, and `fields` keywords arguments."""
-        if params is None:
-            params = {}
-        if before:
-            params['before'] = before
-        if after:
-            params['after'] = after
-        if comp is not None:
-            params['comp'] = comp
-        if id_:
-            params['id'] = id_
-        if fields:
-            params['fields'] = fields
-
-        allTasks = []
+        return list(self.IterTasks(params, before, after, comp, id_, fields))
+
+    def IterTasks(self, params=None, before=None, after=None, comp=None,
+                  id_=None, fields=None):
+        """Generate the tasks filtered by the given params.
+
+        Takes the same arguments as GetTasks, but yields the tasks a page at
+        a time as they are fetched instead of returning them all at once, so
+        only one page of tasks (or `pageConcurrency` pages, if that is set) is
+        held in memory at a time."""
+        params = _GetTasksParams(params, before, after, comp, id_, fields)
         limit = 1000  # single request limit
-        start = 0
-        params = params.copy()
-        if 'before' in params and isinstance(params['before'],
-                                             datetime.datetime):
-            params['before'] = params['before'].timestamp()
-        if 'after' in params and isinstance(params['after'],
-                                            datetime.datetime):
-            params['after'] = params['after'].timestamp()
-        while True:
-            self.logger.debug("Start: %d", start)
-            params["start"] = start
-            params["num"] = limit
-            response = self._session.get(Toodledo.getTasksUrl, params=params)
-            response.raise_for_status()
-            tasks = response.json()
-            if "errorCode" in tasks:
-                self.logger.error("Toodledo error: %s", tasks)
-                raise ToodledoError(tasks["errorCode"])
-            # the first field contains the count or the error code
-            allTasks.extend(tasks[1:])
-            self.logger.debug("Retrieved %d tasks", len(tasks) - 1)
-            if len(tasks) - 1 < limit:
-                break
-            start += limit
-        schema = _TaskSchema()
-        for x in allTasks:
-            # This field is sometimes being leaked by the API and should be
-            # ignored.
-            x.pop('repeatfrom', None)
-        return [schema.load(x) for x in allTasks]
+        tasks = self._GetTasksPage(params, 0, limit)
+        offsets = _TaskPageOffsets(tasks, limit)
+        if offsets and self.pageConcurrency:
+            offsets = iter(offsets)
+            with ThreadPoolExecutor(
+                    max_workers=self.pageConcurrency) as executor:
+                pending = deque(
+                    executor.submit(self._GetTasksPage, params, start, limit)
+                    for start in islice(offsets, self.pageConcurrency))
+                yield from _LoadTasks(tasks[1:], self.lazyTasks)
+                while pending:
+                    tasks = pending.popleft().result()
+                    # Keep pageConcurrency requests in flight while the
+                    # caller is working on this page.
+                    for start in islice(offsets, 1):
+                        pending.append(executor.submit(
+                            self._GetTasksPage, params, start, limit))
+                    yield from _LoadTasks(tasks[1:], self.lazyTasks)
+            return
+        yield from _LoadTasks(tasks[1:], self.lazyTasks)
+        if offsets:
+            for start in offsets:
+                tasks = self._GetTasksPage(params, start, limit)
+                yield from _LoadTasks(tasks[1:], self.lazyTasks)
+        elif offsets is None:
+            start = 0
+            while len(tasks) - 1 == limit:
+                start += limit
+                tasks = self._GetTasksPage(params, start, limit)
+                yield from _LoadTasks(tasks[1:], self.lazyTasks)
+
+    def _GetTasksPage(self, params, start, limit):
+        self.logger.debug("Start: %d", start)
+        params = dict(params, start=start, num=limit)
+        tasks = self._Get(self.getTasksUrl, params=params)
+        _CheckError(self.logger, tasks)
+        # the first field contains the count or the error code
+        self.logger.debug("Retrieved %d tasks", len(tasks) - 1)
+        return tasks
 
     def GetDeletedTasks(self, after):
         """Get a list of deleted tasks.
@@ -262,13 +610,9 @@ class Toodledo:
         """
         if isinstance(after, datetime.datetime):
             after = after.timestamp()
-        response = self._session.get(Toodledo.getDeletedTasksUrl,
-                                     params={'after': after})
-        response.raise_for_status()
-        deleted = response.json()
-        if "errorCode" in deleted:
-            self.logger.error("Toodledo error: %s", deleted)
-            raise ToodledoError(deleted["errorCode"])
+        deleted = self._Get(self.getDeletedTasksUrl,
+                            params={'after': after})
+        _CheckError(self.logger, deleted)
         # the first field contains the count or the error code
         self.logger.debug("Retrieved %d deleted tasks", len(deleted) - 1)
         schema = _DeletedTaskSchema()
@@ -280,67 +624,35 @@ class Toodledo:
         Only specify fields that need to be changed, except for the id_ field,
         which must always be specified. In particular, note that if you specify
         `None` for a field, that means to erase it, not to ignore it!"""
+        return self._WriteTasks(self.editTasksUrl, taskList)
+
+    def AddTasks(self, taskList):
+        """Add the given tasks"""
+        return self._WriteTasks(self.addTasksUrl, taskList)
+
+    def _WriteTasks(self, url, taskList):
         # Any iterator can be passed in, not just a list.
         # The iterator we create here remembers our place in the input as we
         # step through it in chunks using islice.
         taskList = iter(taskList)
         limit = 50  # single request limit
+        chunks = iter(lambda: _DumpTaskList(list(islice(taskList, limit))),
+                      [])
         responses = []
-        while True:
-            listDump = _DumpTaskList(list(islice(taskList, limit)))
-            if not listDump:
-                break
-            response = self._session.post(
-                Toodledo.editTasksUrl, data={"tasks": dumps(listDump)})
-            response.raise_for_status()
-            self.logger.debug("Response: %s,%s", response, response.text)
-            taskResponse = response.json()
-            errors = []
-            if isinstance(taskResponse, list):
-                for response in taskResponse:
-                    if "errorCode" in response:
-                        errors.append(ToodledoError(response["errorCode"]))
-            elif "errorCode" in taskResponse:
-                errors.append(ToodledoError(taskResponse["errorCode"]))
-            if len(errors) == 1:
-                raise errors[0]
-            if errors:
-                # pylint: disable=broad-exception-raised
-                raise Exception(str(errors))
-                # pylint: enable=broad-exception-raised
-            responses.extend(taskResponse)
-        schema = _TaskSchema()
-        return [schema.load(t) for t in responses]
+        for response in self._PostChunks(
+                lambda listDump: self._PostTasks(url, listDump), chunks):
+            responses.extend(response)
+        return responses
 
-    def AddTasks(self, taskList):
-        """Add the given tasks"""
-        taskList = iter(taskList)  # See EditTasks
-        limit = 50  # single request limit
-        responses = []
-        while True:
-            listDump = _DumpTaskList(list(islice(taskList, limit)))
-            if not listDump:
-                break
-            response = self._session.post(
-                Toodledo.addTasksUrl, data={"tasks": dumps(listDump)})
-            response.raise_for_status()
-            taskResponse = response.json()
-            errors = []
-            if isinstance(taskResponse, list):
-                for response in taskResponse:
-                    if "errorCode" in response:
-                        errors.append(ToodledoError(response["errorCode"]))
-            elif "errorCode" in taskResponse:
-                errors.append(ToodledoError(taskResponse["errorCode"]))
-            if len(errors) == 1:
-                raise errors[0]
-            if errors:
-                # pylint: disable=broad-exception-raised
-                raise Exception(str(errors))
-                # pylint: enable=broad-exception-raised
-            responses.extend(taskResponse)
-        schema = _TaskSchema()
-        return [schema.load(t) for t in responses]
+    def _PostTasks(self, url, listDump):
+        response = self._session.post(
+            url, data={"tasks": self.jsonBackend.Dumps(listDump)})
+        response.raise_for_status()
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Response: %s,%s", response, response.text)
+        taskResponse = self._Decode(response)
+        _CheckTaskErrors(taskResponse)
+        return _LoadTasks(taskResponse)
 
     def DeleteTasks(self, taskList):
         """Delete the given tasks"""
@@ -348,20 +660,42 @@ class Toodledo:
             return
         taskIdList = [task.id_ for task in taskList]
         limit = 50  # single request limit
-        start = 0
-        while True:
-            self.logger.debug("Start: %d", start)
-            response = self._session.post(
-                Toodledo.deleteTasksUrl,
-                data={
-                    "tasks": dumps(taskIdList[start:start + limit])
-                })
-            response.raise_for_status()
-            if "errorCode" in response.json():
-                raise ToodledoError(response.json()["errorCode"])
-            if len(taskIdList[start:start + limit]) < limit:
-                break
-            start += limit
+        chunks = (taskIdList[start:start + limit]
+                  for start in range(0, len(taskIdList), limit))
+        self._PostChunks(self._DeleteTasks, chunks)
+
+    def _DeleteTasks(self, taskIdList):
+        response = self._session.post(
+            self.deleteTasksUrl,
+            data={
+                "tasks": self.jsonBackend.Dumps(taskIdList)
+            })
+        response.raise_for_status()
+        _CheckError(self.logger, self._Decode(response))
+
+    def _PostChunks(self, post, chunks):
+        """Call `post` on each chunk and return the results in order.
+
+        Chunks are posted one at a time unless writeConcurrency is set."""
+        if not self.writeConcurrency:
+            results = []
+            start = 0
+            for chunk in chunks:
+                self.logger.debug("Start: %d", start)
+                results.append(post(chunk))
+                start += len(chunk)
+            return results
+        chunks = list(chunks)
+        if not chunks:
+            return []
+        with ThreadPoolExecutor(
+                max_workers=min(self.writeConcurrency,
+                                len(chunks))) as executor:
+            futures = [executor.submit(post, chunk) for chunk in chunks]
+        return _ChunkResults(
+            chunks, [future.exception() for future in futures],
+            [None if future.exception() else future.result()
+             for future in futures])
 
     def save(self):
         """No-op for drop-in compatibility with TaskCache"""